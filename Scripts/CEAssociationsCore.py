@@ -0,0 +1,1639 @@
+# --------------------------------
+# Name: CEAssociationsCore.py
+# Purpose: Shared helpers for the PrepareCE*Associations tools (and the bulk load helpers of SplitFeaturebyAttribute).
+# The geometry kernel builds the standardized
+# CityEngine street, lot, and block geometries for a whole vector of sizes at once and serializes them to
+# well-known binary so they can be written through a single cursor token.
+# Current Owner: David Wasserman
+# Last Modified: 10/18/2026
+# Copyright:   (c) Co-Adaptive- David Wasserman
+# ArcGIS Version:   10.3
+# Python Version:   2.7
+# License
+# Copyright 2015 David J. Wasserman
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# --------------------------------
+# Import Modules
+import os, sys, math, json, time, hashlib, numbers, operator, multiprocessing, arcpy, numpy
+from collections import OrderedDict
+
+# Well known ID of Web Mercator Auxiliary Sphere, the CityEngine compatible projection of every output.
+webMercatorWKID = 3857
+
+# Largest relative difference of the east and north scale factors at the anchor for which the outputs are written
+# in Web Mercator directly. Sources that distort more are projected feature by feature (see directWebMercatorSupported).
+conformalScaleTolerance = 1e-6
+
+# Cursor token used to write kernel output. Geometries are passed as OGC WKB byte arrays.
+geometryToken = "SHAPE@WKB"
+
+# Order of the 7 lines produced for each block template, matching the CEStreetName values written by the tool.
+blockPartNames = ["MainStreet", "LeftMainStreet", "RightMainStreet", "BottomLeftSideSt", "BottomRightSideSt",
+                  "TopLeftSideSt", "TopRightSideSt"]
+
+# Unit corner offsets of the lot square, listed in ring order and closed back on the first corner.
+_lotRingSigns = numpy.array([[-1, -1], [-1, 1], [1, 1], [1, -1], [-1, -1]], dtype="f8")
+
+# Unit (block width, street length) multipliers for the start and end vertex of each block part.
+_blockPartFactors = numpy.array([[[0, 0], [0, 1]],  # MainStreet
+                                 [[-1, 0], [-1, 1]],  # LeftMainStreet
+                                 [[1, 0], [1, 1]],  # RightMainStreet
+                                 [[0, 0], [-1, 0]],  # BottomLeftSideSt
+                                 [[0, 0], [1, 0]],  # BottomRightSideSt
+                                 [[0, 1], [-1, 1]],  # TopLeftSideSt
+                                 [[0, 1], [1, 1]]], dtype="f8")  # TopRightSideSt
+
+# Key linking the geometries of a slim output to its normalized attribute table, and that table's name suffix.
+slimKeyField = "UniqueFeatID"
+attributeTableSuffix = "_Attributes"
+
+# Codes of the size validation pre-pass. Rows with a repair code are written with the corrected size, and rows with a
+# reject code are written to the reject table (named with rejectTableSuffix) instead of the output.
+sizeRepairReasons = {1: "NEGATIVE", 2: "NUMERIC_TEXT"}
+sizeRejectReasons = {3: "NULL", 4: "NOT_NUMERIC", 5: "ZERO", 6: "NOT_FINITE"}
+rejectTableSuffix = "_Rejects"
+
+# Fields written by the grid layout mode: the shelf (row) and position on it (column) of each feature, and the offset
+# from the anchor it was moved by, in output units. Subtracting the offset restores the stacked layout.
+gridLayoutFields = [("GridRow", "LONG"), ("GridColumn", "LONG"), ("GridOffsetX", "DOUBLE"), ("GridOffsetY", "DOUBLE")]
+
+# Options of the intermediate workspace parameter, and the output row count above which MEMORY spills to the scratch
+# geodatabase (in memory feature classes are held in RAM for the whole run).
+intermediateWorkspaceModes = ("MEMORY", "SCRATCH", "OUTPUT")
+memorySpillRows = 1000000
+
+# Fields of the cross section deduplication: the digest of each feature's rule attributes, the prototype standing in
+# for every feature with that digest, and the number of features it stands in for. The mapping table from source
+# features to prototypes is named with crossSectionMapSuffix.
+crossSectionHashField = "CrossSectionHash"
+prototypeIDField = "PrototypeID"
+prototypeCountField = "FeatureCount"
+crossSectionMapSuffix = "_CrossSectionMap"
+
+# Fields and suffix of the incremental mode: the source OID written to each output row, and the manifest table of
+# per row content hashes kept next to the output. The manifest row with the settings OID holds the digest of the
+# run settings and the anchor, so a rerun builds on the same anchor. Above incrementalRebuildRatio changed rows, the
+# output is rebuilt instead of updated. Rows are selected by OID in IN clauses of at most oidBatchSize values.
+sourceOIDField = "SourceOID"
+manifestSuffix = "_Manifest"
+_manifestSettingsOID = -1
+incrementalRebuildRatio = 0.5
+oidBatchSize = 1000
+
+# Name of the JSON sidecar holding cached mean centers, written next to the workspace of each reference dataset.
+centroidCacheName = "CECentroidCache.json"
+
+_wkbLineString = 2
+_wkbPolygon = 3
+
+try:
+    _textTypes = (str, unicode)
+except NameError:  # Python 3
+    _textTypes = (str,)
+
+
+# Function Definitions
+def optionalParameter(index, default=None, asText=False):
+    """Return a script tool parameter, or the default if the toolbox does not define that parameter or it was left
+    empty. This lets options added to the scripts run from toolboxes that predate them."""
+    if index >= arcpy.GetArgumentCount():
+        return default
+    value = arcpy.GetParameterAsText(index) if asText else arcpy.GetParameter(index)
+    if value is None or value in ("", "#"):
+        return default
+    return value
+
+
+def asFloat(value):
+    """Cast a cursor value to a float, returning NaN for nulls and non-numeric values so they can be screened
+    out as a vector rather than raising inside the row loop."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+
+class SizeValidation(object):
+    """Classification of a vector of raw size values, computed once before any geometry is built or written.
+
+    Attributes
+    ----------
+    sizes : numpy.ndarray
+        Sizes to build geometries with. Repaired rows hold the corrected size and rejected rows hold 0, so the
+        kernel can run over the whole vector.
+    codes : numpy.ndarray
+        Per row code: 0 if valid, a key of sizeRepairReasons if repaired, a key of sizeRejectReasons if rejected.
+    valid : numpy.ndarray
+        Boolean mask of the rows to write (valid or repaired).
+    """
+
+    def __init__(self, sizes, codes):
+        self.codes = codes
+        self.valid = codes < min(sizeRejectReasons)
+        self.sizes = numpy.where(self.valid, sizes, 0)
+
+    def counts(self, reasons):
+        """Return (reason, row count) pairs for the codes of reasons that occur."""
+        return [(reasons[code], int(numpy.count_nonzero(self.codes == code))) for code in sorted(reasons)
+                if numpy.any(self.codes == code)]
+
+    def report(self):
+        """Return a short description of the repaired and rejected row counts."""
+        messages = []
+        for label, reasons in [("repaired", sizeRepairReasons), ("rejected", sizeRejectReasons)]:
+            counts = self.counts(reasons)
+            if counts:
+                messages.append("{0} rows {1} ({2})".format(str(sum(count for reason, count in counts)), label,
+                                                           ", ".join("{0}: {1}".format(*pair) for pair in counts)))
+        return "; ".join(messages) if messages else "All {0} sizes are valid.".format(str(len(self.codes)))
+
+
+def validateSizes(values, constantSize=None):
+    """Classify raw size values as valid, repairable, or rejected in one vectorized pass.
+
+    Negative sizes are repaired to their absolute value and numeric text is cast. Nulls, non-numeric text, zero, and
+    infinite sizes are rejected, since they cannot produce a geometry.
+
+    Parameters
+    ----------
+    values : sequence
+        Raw size values read from a cursor.
+    constantSize : float, optional
+        If provided, every row is validated with this constant instead (used when no size field is set).
+
+    Returns
+    -------
+    SizeValidation
+        Sizes and per row codes.
+    """
+    if constantSize is not None:
+        values = [constantSize] * len(values)
+    raw = numpy.fromiter((asFloat(value) for value in values), dtype="f8", count=len(values))
+    isNull = numpy.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    isText = numpy.fromiter((isinstance(value, _textTypes) for value in values), dtype=bool, count=len(values))
+    isNan = numpy.isnan(raw)
+    codes = numpy.zeros(len(values), dtype="i1")
+    # Later assignments take precedence, so rejections are applied after repairs.
+    codes[isText] = 2
+    codes[raw < 0] = 1
+    codes[isNan & ~isNull] = 4
+    codes[isNull] = 3
+    codes[raw == 0] = 5
+    codes[numpy.isinf(raw)] = 6
+    return SizeValidation(numpy.abs(numpy.where(isNan, 0, raw)), codes)
+
+
+class RejectWriter(object):
+    """Writes the rows rejected by validateSizes to a table with their OID, raw size value, and reason code. The
+    table is only created once a reject is written, and a stale table from an earlier run is removed up front.
+
+    Parameters
+    ----------
+    tablePath : str
+        Path of the reject table (see companionTablePath). If None, rejected rows are only counted.
+    replacedOIDs : iterable, optional
+        Source OIDs rebuilt by an incremental update (see IncrementalRun.rejects). Only their rows are removed from
+        an existing table, so it keeps the rejects of the rows the update leaves alone.
+    """
+
+    def __init__(self, tablePath, replacedOIDs=None):
+        self.tablePath = tablePath
+        self.written = 0
+        self.exists = False
+        if tablePath and arcpy.Exists(tablePath):
+            if replacedOIDs is None:
+                arcpy.Delete_management(tablePath)
+            else:
+                for where in oidWhereClauses(tablePath, "SourceOID", replacedOIDs):
+                    with arcpy.da.UpdateCursor(tablePath, ["SourceOID"], where) as cursor:
+                        for row in cursor:
+                            cursor.deleteRow()
+                self.exists = True
+
+    def write(self, oids, values, validation):
+        """Insert the rejected rows of one validated batch. oids and values are aligned with the validation."""
+        rejected = numpy.flatnonzero(~validation.valid)
+        if not len(rejected) or not self.tablePath:
+            self.written += len(rejected)
+            return len(rejected)
+        if not self.exists:
+            workspace, name = os.path.split(self.tablePath)
+            arcpy.CreateTable_management(workspace, name)
+            arcpy.AddField_management(self.tablePath, "SourceOID", "LONG")
+            arcpy.AddField_management(self.tablePath, "SizeValue", "TEXT")
+            arcpy.AddField_management(self.tablePath, "ReasonCode", "TEXT")
+            self.exists = True
+        with arcpy.da.InsertCursor(self.tablePath, ["SourceOID", "SizeValue", "ReasonCode"]) as cursor:
+            for index in rejected.tolist():
+                value = values[index]
+                cursor.insertRow((oids[index], None if value is None else str(value),
+                                  sizeRejectReasons[int(validation.codes[index])]))
+        self.written += len(rejected)
+        return len(rejected)
+
+
+def anchorCoordinates(pointGeometry):
+    """Return the (X, Y) tuple of a point geometry used as the anchor of every output template."""
+    point = pointGeometry.firstPoint
+    return float(point.X), float(point.Y)
+
+
+def _anchorArray(anchorXY):
+    """Return one (X, Y) anchor or an (N, 2) array of anchors as an (N or 1, 2) array that broadcasts per feature."""
+    return numpy.asarray(anchorXY, dtype="f8").reshape(-1, 2)
+
+
+def streetCoordinates(anchorXY, lengths, nodalShift=0):
+    """Build the vertices of standardized north-south street segments for a vector of lengths.
+
+    Parameters
+    ----------
+    anchorXY : tuple or numpy.ndarray
+        (X, Y) origin of every street segment, or an (N, 2) array with one origin per street.
+    lengths : numpy.ndarray
+        Street lengths in coordinate system units.
+    nodalShift : float, optional
+        Horizontal (X) offset applied to both endpoints (default 0).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (N, 2, 2) holding the start and end vertex of each street.
+    """
+    lengths = numpy.asarray(lengths, dtype="f8")
+    anchors = _anchorArray(anchorXY)
+    coords = numpy.empty((lengths.size, 2, 2), dtype="f8")
+    coords[:, :, 0] = anchors[:, 0, None] + nodalShift
+    coords[:, 0, 1] = anchors[:, 1]
+    coords[:, 1, 1] = anchors[:, 1] + lengths
+    return coords
+
+
+def lotCoordinates(anchorXY, sideLengths):
+    """Build the closed rings of squares centered on the anchor for a vector of side lengths.
+
+    Parameters
+    ----------
+    anchorXY : tuple or numpy.ndarray
+        (X, Y) center of every square, or an (N, 2) array with one center per square.
+    sideLengths : numpy.ndarray
+        Side length of each square in coordinate system units.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (N, 5, 2) holding each ring, closed on its first vertex.
+    """
+    halfSides = numpy.asarray(sideLengths, dtype="f8") * .5
+    return _anchorArray(anchorXY)[:, None, :] + halfSides[:, None, None] * _lotRingSigns[None, :, :]
+
+
+def blockCoordinates(anchorXY, lengths, blockWidths):
+    """Build the 7 lines of the center street and flanking block template for a vector of lengths.
+
+    Parameters
+    ----------
+    anchorXY : tuple or numpy.ndarray
+        (X, Y) origin of the center street, or an (N, 2) array with one origin per street.
+    lengths : numpy.ndarray
+        Street lengths in coordinate system units.
+    blockWidths : float or numpy.ndarray
+        Width of the side blocks, either one value or one per street.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (N, 7, 2, 2) whose second axis follows blockPartNames.
+    """
+    lengths = numpy.asarray(lengths, dtype="f8")
+    widths = numpy.asarray(blockWidths, dtype="f8") * numpy.ones_like(lengths)
+    coords = numpy.empty((lengths.size, len(blockPartNames), 2, 2), dtype="f8")
+    anchors = _anchorArray(anchorXY)
+    coords[..., 0] = anchors[:, 0, None, None] + widths[:, None, None] * _blockPartFactors[None, :, :, 0]
+    coords[..., 1] = anchors[:, 1, None, None] + lengths[:, None, None] * _blockPartFactors[None, :, :, 1]
+    return coords
+
+
+def _splitRecords(records):
+    """Split a packed structured array into one bytearray per record."""
+    size = records.dtype.itemsize
+    buffer = bytearray(records.view(numpy.uint8))
+    return [buffer[start:start + size] for start in range(0, len(buffer), size)]
+
+
+def polylineWKB(coords):
+    """Serialize an (N, V, 2) vertex array to N single part WKB line strings in one vectorized pass."""
+    coords = numpy.asarray(coords, dtype="<f8")
+    count, vertexCount = coords.shape[0], coords.shape[1]
+    records = numpy.empty(count, dtype=numpy.dtype([("byteOrder", "u1"), ("wkbType", "<u4"),
+                                                    ("numPoints", "<u4"), ("xy", "<f8", (vertexCount * 2,))]))
+    records["byteOrder"] = 1
+    records["wkbType"] = _wkbLineString
+    records["numPoints"] = vertexCount
+    records["xy"] = coords.reshape(count, vertexCount * 2)
+    return _splitRecords(records)
+
+
+def polygonWKB(coords):
+    """Serialize an (N, V, 2) array of closed rings to N single ring WKB polygons in one vectorized pass."""
+    coords = numpy.asarray(coords, dtype="<f8")
+    count, vertexCount = coords.shape[0], coords.shape[1]
+    records = numpy.empty(count, dtype=numpy.dtype([("byteOrder", "u1"), ("wkbType", "<u4"), ("numRings", "<u4"),
+                                                    ("numPoints", "<u4"), ("xy", "<f8", (vertexCount * 2,))]))
+    records["byteOrder"] = 1
+    records["wkbType"] = _wkbPolygon
+    records["numRings"] = 1
+    records["numPoints"] = vertexCount
+    records["xy"] = coords.reshape(count, vertexCount * 2)
+    return _splitRecords(records)
+
+
+def streetShapes(anchorXY, lengths, scaleFactor=1.0):
+    """Return WKB street segments for a vector of lengths. Lengths are multiplied by scaleFactor, which is the
+    output units per input unit at the anchor (1 unless the anchor was projected, see webMercatorAnchor)."""
+    return polylineWKB(streetCoordinates(anchorXY, numpy.asarray(lengths, dtype="f8") * scaleFactor))
+
+
+def lotShapes(anchorXY, areas, scaleFactor=1.0):
+    """Return WKB lot squares for a vector of areas. Side lengths are the square root of each area, multiplied
+    by scaleFactor."""
+    return polygonWKB(lotCoordinates(anchorXY, numpy.sqrt(numpy.abs(areas)) * scaleFactor))
+
+
+def blockShapes(anchorXY, lengths, blockWidths, scaleFactor=1.0):
+    """Return WKB block template lines for a vector of lengths, flattened so that the 7 parts of input i occupy
+    positions i * 7 through i * 7 + 6. Lengths and widths are multiplied by scaleFactor."""
+    coords = blockCoordinates(anchorXY, numpy.asarray(lengths, dtype="f8") * scaleFactor,
+                              numpy.asarray(blockWidths, dtype="f8") * scaleFactor)
+    return polylineWKB(coords.reshape(-1, 2, 2))
+
+
+def streetExtents(lengths):
+    """Return the (minX, minY, maxX, maxY) footprint of each street segment relative to its anchor."""
+    lengths = numpy.asarray(lengths, dtype="f8")
+    extents = numpy.zeros((lengths.size, 4), dtype="f8")
+    extents[:, 3] = lengths
+    return extents
+
+
+def lotExtents(areas):
+    """Return the (minX, minY, maxX, maxY) footprint of each lot square relative to its anchor."""
+    halfSides = numpy.sqrt(numpy.abs(numpy.asarray(areas, dtype="f8"))) * .5
+    return numpy.column_stack([-halfSides, -halfSides, halfSides, halfSides])
+
+
+def blockExtents(lengths, blockWidths):
+    """Return the (minX, minY, maxX, maxY) footprint of each block template relative to its anchor."""
+    lengths = numpy.asarray(lengths, dtype="f8")
+    widths = numpy.asarray(blockWidths, dtype="f8") * numpy.ones_like(lengths)
+    return numpy.column_stack([-widths, numpy.zeros_like(lengths), widths, lengths])
+
+
+class GridLayout(object):
+    """Shelf packing of output footprints into a non-overlapping grid centered on the anchor.
+
+    Footprints are sorted by height and placed left to right on shelves (rows) of a common width, with gap between
+    neighbours and between shelves (next fit decreasing height). The shelf width is chosen so the layout is about
+    square. The row and column of each feature and the offset it was moved by are returned, so the stacked layout
+    can be restored.
+
+    Parameters
+    ----------
+    extentBuilder : function
+        Function returning the (N, 4) footprints of a vector of sizes, such as streetExtents, lotExtents, or
+        blockExtents.
+    gap : float, optional
+        Space left between footprints, in source units (default 0).
+    **builderArgs
+        Extra arguments of extentBuilder (blockWidths for blockExtents).
+    """
+
+    def __init__(self, extentBuilder, gap=0, **builderArgs):
+        self.extentBuilder = extentBuilder
+        self.gap = abs(float(gap or 0))
+        self.builderArgs = builderArgs
+
+    def place(self, sizes, valid=None):
+        """Return (offsets, rows, columns) for a vector of sizes. offsets is an (N, 2) array in source units and
+        rows and columns are integer arrays. Rows not in the valid mask are left at the anchor with row -1."""
+        sizes = numpy.asarray(sizes, dtype="f8")
+        valid = numpy.ones(sizes.size, dtype=bool) if valid is None else numpy.asarray(valid, dtype=bool)
+        extents = self.extentBuilder(sizes, **self.builderArgs)
+        widths = extents[:, 2] - extents[:, 0]
+        heights = extents[:, 3] - extents[:, 1]
+        offsets = numpy.zeros((sizes.size, 2), dtype="f8")
+        rows = numpy.empty(sizes.size, dtype="i4")
+        rows.fill(-1)
+        columns = rows.copy()
+        order = [index for index in numpy.argsort(-heights, kind="mergesort").tolist() if valid[index]]
+        if not order:
+            return offsets, rows, columns
+        gap = self.gap
+        packedArea = numpy.sum((widths[order] + gap) * (heights[order] + gap))
+        shelfWidth = max(float(widths[order].max()), math.sqrt(packedArea))
+        x = y = shelfHeight = layoutWidth = 0.0
+        row = column = 0
+        for index in order:
+            if column and x + widths[index] > shelfWidth:
+                y += shelfHeight + gap
+                x = shelfHeight = 0.0
+                row += 1
+                column = 0
+            offsets[index] = (x - extents[index, 0], y - extents[index, 1])
+            rows[index], columns[index] = row, column
+            layoutWidth = max(layoutWidth, x + widths[index])
+            x += widths[index] + gap
+            shelfHeight = max(shelfHeight, heights[index])
+            column += 1
+        # Center the packed layout on the anchor.
+        offsets[valid] -= (layoutWidth * .5, (y + shelfHeight) * .5)
+        return offsets, rows, columns
+
+    def values(self, offsets, rows, columns, scaleFactor=1.0):
+        """Return the gridLayoutFields values of each feature, with offsets in output units."""
+        return list(zip(rows.tolist(), columns.tolist(), (offsets[:, 0] * scaleFactor).tolist(),
+                        (offsets[:, 1] * scaleFactor).tolist()))
+
+
+class GeometryInterner(object):
+    """Interning cache for serialized template geometries.
+
+    Output shapes only depend on the anchor, the scale factor, the size, and (for blocks) the block width, so
+    features sharing a size can share one WKB template. Each call builds only the sizes not already cached, in a
+    single kernel call, and returns the cached template for every feature. The cache is bounded and evicts the
+    least recently used template first. An optional tolerance snaps sizes to multiples of itself before lookup,
+    which raises the hit rate on noisy measured lengths at the cost of that much size precision.
+
+    Parameters
+    ----------
+    shapeBuilder : function
+        Kernel function taking (anchorXY, sizes, scaleFactor=..., **builderArgs) such as streetShapes,
+        lotShapes, or blockShapes.
+    partCount : int, optional
+        Number of geometries the builder returns per size (7 for blockShapes, default 1).
+    maxTemplates : int, optional
+        Maximum number of distinct templates kept in the cache (default 100000).
+    tolerance : float, optional
+        Size quantization step. 0 or None disables quantization (default 0).
+    """
+
+    def __init__(self, shapeBuilder, partCount=1, maxTemplates=100000, tolerance=0):
+        self.shapeBuilder = shapeBuilder
+        self.partCount = partCount
+        self.maxTemplates = max(int(maxTemplates), 1)
+        self.tolerance = abs(float(tolerance or 0))
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, sizes):
+        """Snap sizes to the nearest multiple of the tolerance. Sizes are validated as positive before they get
+        here, so sizes below half the tolerance are kept at one tolerance rather than snapped to a zero size."""
+        sizes = numpy.asarray(sizes, dtype="f8")
+        if not self.tolerance:
+            return sizes
+        return numpy.maximum(numpy.round(sizes / self.tolerance), 1) * self.tolerance
+
+    def shapes(self, anchorXY, sizes, scaleFactor=1.0, **builderArgs):
+        """Return the WKB geometries for a vector of sizes in the same layout as the wrapped builder, reusing
+        one template object for every feature that shares a (quantized) size. Per feature anchors (an (N, 2)
+        array, see GridLayout) make every shape unique, so they are passed straight to the builder."""
+        if numpy.ndim(anchorXY) == 2:
+            self.misses += len(sizes)
+            return self.shapeBuilder(anchorXY, self.quantize(sizes), scaleFactor=scaleFactor, **builderArgs)
+        context = (tuple(anchorXY), float(scaleFactor), tuple(sorted(builderArgs.items())))
+        uniqueSizes, inverse = numpy.unique(self.quantize(sizes), return_inverse=True)
+        keys = [(float(size),) + context for size in uniqueSizes]
+        missing = [index for index, key in enumerate(keys) if key not in self.templates]
+        if missing:
+            built = self.shapeBuilder(anchorXY, uniqueSizes[missing], scaleFactor=scaleFactor, **builderArgs)
+            for position, index in enumerate(missing):
+                self.templates[keys[index]] = built[position * self.partCount:(position + 1) * self.partCount]
+        uniqueTemplates = []
+        for key in keys:
+            template = self.templates.pop(key)
+            self.templates[key] = template  # Re-insert as most recently used.
+            uniqueTemplates.append(template)
+        while len(self.templates) > self.maxTemplates:
+            self.templates.popitem(last=False)
+        self.misses += len(missing)
+        self.hits += len(inverse) - len(missing)
+        if self.partCount == 1:
+            return [uniqueTemplates[index][0] for index in inverse]
+        return [part for index in inverse for part in uniqueTemplates[index]]
+
+    def report(self):
+        """Return a short description of the cache hit rate."""
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        return "Built {0} distinct template geometries for {1} features ({2:.1f}% reused).".format(
+                self.misses, total, rate)
+
+
+def webMercatorScales(pointGeometry, probeDistance=1.0):
+    """Project only the anchor point into Web Mercator Auxiliary Sphere and measure the local scale factors there.
+
+    The scale factors are measured by projecting two probe points one probeDistance east and north of the anchor,
+    which accounts for both the linear unit of the source projection and the Mercator scale distortion at the anchor
+    latitude.
+
+    Parameters
+    ----------
+    pointGeometry : arcpy.PointGeometry
+        Anchor point in the source spatial reference.
+    probeDistance : float, optional
+        Offset of the probe points in source units (default 1).
+
+    Returns
+    -------
+    tuple
+        ((X, Y), (eastScale, northScale)) where (X, Y) is the projected anchor and each scale is Web Mercator meters
+        per source unit along that axis.
+    """
+    sourceReference = pointGeometry.spatialReference
+    webMercator = arcpy.SpatialReference(webMercatorWKID)
+    x, y = anchorCoordinates(pointGeometry)
+    anchorXY = anchorCoordinates(pointGeometry.projectAs(webMercator))
+    scales = []
+    for probeX, probeY in [(x + probeDistance, y), (x, y + probeDistance)]:
+        probe = arcpy.PointGeometry(arcpy.Point(probeX, probeY), sourceReference).projectAs(webMercator)
+        probeXY = anchorCoordinates(probe)
+        scales.append(math.hypot(probeXY[0] - anchorXY[0], probeXY[1] - anchorXY[1]) / probeDistance)
+    return anchorXY, tuple(scales)
+
+
+def directWebMercatorSupported(pointGeometry, tolerance=None):
+    """Return True if outputs built around the anchor can be written in Web Mercator directly.
+
+    A single scale factor is only exact when the source projection is conformal at the anchor, so that its east and
+    north scales agree. Geographic sources and sources whose scales differ by more than tolerance (relative) have to
+    be projected feature by feature instead.
+
+    Parameters
+    ----------
+    pointGeometry : arcpy.PointGeometry
+        Anchor point in the source spatial reference.
+    tolerance : float, optional
+        Largest relative difference of the east and north scales. Defaults to conformalScaleTolerance.
+
+    Returns
+    -------
+    bool
+        True if webMercatorAnchor gives the same result as projecting the finished output.
+    """
+    if pointGeometry.spatialReference.type == "Geographic":
+        return False
+    tolerance = conformalScaleTolerance if tolerance is None else tolerance
+    eastScale, northScale = webMercatorScales(pointGeometry)[1]
+    return abs(eastScale - northScale) <= tolerance * max(eastScale, northScale)
+
+
+def directWebMercatorFallback(pointGeometry):
+    """Return directWebMercatorSupported(pointGeometry), warning that the outputs will be projected if it is not."""
+    if directWebMercatorSupported(pointGeometry):
+        return True
+    arcpy.AddWarning("The input spatial reference is not conformal at the centroid, so the outputs are projected "
+                     "to Web Mercator instead of being written directly.")
+    return False
+
+
+def webMercatorAnchor(pointGeometry, probeDistance=1.0):
+    """Project only the anchor point into Web Mercator Auxiliary Sphere and measure the local scale factor there.
+
+    Every output feature is an offset from the anchor, so projecting the anchor and scaling the offsets gives the
+    same result as projecting the finished output, without a full read-project-write pass (see
+    writeAssociationOutputs). This only holds for a conformal source, whose east and north scales agree; check
+    directWebMercatorSupported first.
+
+    Parameters
+    ----------
+    pointGeometry : arcpy.PointGeometry
+        Anchor point in the source spatial reference.
+    probeDistance : float, optional
+        Offset of the probe points in source units (default 1).
+
+    Returns
+    -------
+    tuple
+        ((X, Y), scaleFactor) where (X, Y) is the projected anchor and scaleFactor is Web Mercator meters per
+        source unit.
+    """
+    anchorXY, scales = webMercatorScales(pointGeometry, probeDistance)
+    # Mercator is conformal, so for a conformal source the east and north scales only differ by rounding.
+    return anchorXY, sum(scales) / len(scales)
+
+
+class RowPlan(object):
+    """Row accessor plan compiled once per run that maps a source cursor row to an output cursor row.
+
+    Field names are resolved (case insensitively) when the plan is built, so the per row work is a single
+    itemgetter call over the source row followed by the replacement values, instead of a field name search for
+    every field of every row. Output fields found neither in the replacements nor in the source are written as
+    null.
+
+    Parameters
+    ----------
+    sourceFields : list
+        Field names and tokens of the search cursor rows.
+    outputFields : list
+        Field names and tokens of the insert cursor rows.
+    replacementFields : list, optional
+        Output fields whose values are passed to build for each row instead of being copied from the source.
+    sizeField : str, optional
+        Field holding per feature sizes. Its source index is exposed as sizeIndex (None if not found).
+    """
+
+    def __init__(self, sourceFields, outputFields, replacementFields=(), sizeField=None):
+        sourceLookup = {}
+        for index, field in enumerate(sourceFields):
+            sourceLookup.setdefault(str(field).lower(), index)
+        sourceWidth = len(sourceFields)
+        replacementLookup = dict((str(field).lower(), sourceWidth + index)
+                                 for index, field in enumerate(replacementFields))
+        nullIndex = sourceWidth + len(replacementFields)
+        # Indexes into the row extended with the replacement values and one trailing null.
+        extendedIndexes = []
+        for field in outputFields:
+            key = str(field).lower()
+            extendedIndexes.append(replacementLookup.get(key, sourceLookup.get(key, nullIndex)))
+        self.sourceFields = list(sourceFields)
+        self.outputFields = list(outputFields)
+        self.replacementFields = list(replacementFields)
+        self.sizeIndex = sourceLookup.get(str(sizeField).lower()) if sizeField else None
+        self._replacementCount = len(replacementFields)
+        self._single = len(extendedIndexes) == 1
+        self._getter = operator.itemgetter(*extendedIndexes)
+
+    def build(self, row, replacementValues=()):
+        """Return the output row for a source row and the values of the replacement fields (in plan order)."""
+        values = self._getter(tuple(row) + tuple(replacementValues) + (None,))
+        return (values,) if self._single else values
+
+
+def iterChunks(rows, chunkSize):
+    """Yield lists of at most chunkSize rows from a cursor or other iterable, so only one chunk of records is
+    held in memory at a time. A chunkSize of 0 or less yields every row in one chunk."""
+    chunkSize = int(chunkSize or 0)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if 0 < chunkSize <= len(chunk):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class InsertTimer(object):
+    """Accumulates the rows written and the time spent in the insert loops of a run, to report insert throughput.
+    Wrap each insert loop in start() and stop(rows)."""
+
+    def __init__(self):
+        self.rows = 0
+        self.seconds = 0.0
+        self._started = None
+
+    def start(self):
+        self._started = time.time()
+
+    def stop(self, rows):
+        self.seconds += time.time() - self._started
+        self.rows += int(rows)
+
+    def report(self):
+        """Return a short description of the insert throughput."""
+        rate = self.rows / self.seconds if self.seconds > 0 else 0.0
+        return "Inserted {0} rows in {1:.2f} seconds ({2:,.0f} rows/sec).".format(str(self.rows), self.seconds, rate)
+
+
+def deferSpatialIndex(featureClass):
+    """Remove the spatial index of a new, empty feature class before a bulk load, so it is not maintained on every
+    insert. Return True if an index was removed and should be rebuilt with rebuildSpatialIndex once loaded."""
+    try:
+        if getattr(arcpy.Describe(featureClass), "hasSpatialIndex", False):
+            arcpy.RemoveSpatialIndex_management(featureClass)
+            return True
+    except arcpy.ExecuteError:
+        pass  # Workspaces that do not allow removing the index (such as in memory) keep maintaining it.
+    return False
+
+
+def rebuildSpatialIndex(featureClass):
+    """Build the spatial index of a bulk loaded feature class once, with the grid size chosen by ArcGIS."""
+    arcpy.AddSpatialIndex_management(featureClass)
+
+
+def peakMemoryMB():
+    """Return the peak resident memory of the current process in megabytes, or None if it cannot be read."""
+    try:
+        if sys.platform.startswith("win"):
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t), ("PagefileUsage", ctypes.c_size_t),
+                            ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return None
+            return counters.PeakWorkingSetSize / (1024.0 * 1024.0)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+    except Exception:
+        return None
+
+
+def attributeFields(featureClass, excludedTypes=("OID", "Geometry", "GlobalID", "Raster", "Blob"),
+                    excludedFields=("shape_area", "shape_length")):
+    """Return the names of the writable attribute fields of a feature class, in schema order."""
+    return [f.name for f in arcpy.ListFields(featureClass) if f.type not in excludedTypes
+            and f.name.lower() not in excludedFields]
+
+
+def rowCount(table):
+    """Return the number of rows of a table or feature class."""
+    return int(arcpy.GetCount_management(table).getOutput(0))
+
+
+def normalizedValue(value, decimals=6):
+    """Return a cursor value in the form hashed by rowDigest: numbers as floats rounded to decimals (so 3, 3.0, and
+    3.0000001 agree), text stripped of surrounding white space, dates as ISO text, and anything else as text."""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, numbers.Real):
+        return round(float(value), decimals) + 0.0  # + 0.0 folds -0.0 into 0.0
+    if isinstance(value, _textTypes):
+        return value.strip()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def rowDigest(values, decimals=6):
+    """Return the hexadecimal MD5 digest of a row of attribute values. The digest only depends on the normalized
+    values and their order, so it is stable across runs, workspaces, and Python versions."""
+    text = json.dumps([normalizedValue(value, decimals) for value in values], separators=(",", ":"))
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def memoryWorkspace():
+    """Return the in memory workspace of the running ArcGIS product ("memory" in ArcGIS Pro, else "in_memory")."""
+    try:
+        if arcpy.GetInstallInfo().get("ProductName") == "ArcGISPro":
+            return "memory"
+    except Exception:
+        pass
+    return "in_memory"
+
+
+def layerFileExtension():
+    """Return the layer file extension of the running ArcGIS product (".lyrx" in ArcGIS Pro, else ".lyr")."""
+    try:
+        if arcpy.GetInstallInfo().get("ProductName") == "ArcGISPro":
+            return ".lyrx"
+    except Exception:
+        pass
+    return ".lyr"
+
+
+def intermediateWorkspace(mode="MEMORY", outFeatureClass=None, outputRows=0, spillThreshold=memorySpillRows):
+    """Return the workspace the intermediate feature classes of a run are written to.
+
+    Parameters
+    ----------
+    mode : str, optional
+        "MEMORY" keeps intermediates in the in memory workspace, spilling to the local scratch geodatabase when
+        outputRows exceeds spillThreshold. "SCRATCH" always uses the scratch geodatabase, and "OUTPUT" writes them
+        next to outFeatureClass as the tools did before (default "MEMORY").
+    outFeatureClass : str, optional
+        Output feature class, used by the OUTPUT mode.
+    outputRows : int, optional
+        Number of rows the largest intermediate will hold.
+    spillThreshold : int, optional
+        Largest intermediate row count kept in memory (default memorySpillRows).
+
+    Returns
+    -------
+    str
+        Workspace path.
+    """
+    mode = str(mode or "MEMORY").upper()
+    if mode == "OUTPUT" and outFeatureClass:
+        return os.path.dirname(outFeatureClass)
+    if mode == "MEMORY" and int(outputRows) <= int(spillThreshold):
+        return memoryWorkspace()
+    return arcpy.env.scratchGDB
+
+
+def scratchFeatureClass(prefix="TempCEFC", workspace=None):
+    """Return an unused feature class path for a temporary output, in the scratch geodatabase unless a workspace
+    (see intermediateWorkspace) is given."""
+    return arcpy.CreateScratchName(prefix, "", "FeatureClass", workspace or arcpy.env.scratchGDB)
+
+
+def companionTablePath(outFeatureClass, suffix):
+    """Return the path of a table written next to an output feature class, named after it with suffix."""
+    workspace, name = os.path.split(outFeatureClass)
+    return os.path.join(workspace, arcpy.ValidateTableName(name + suffix, workspace))
+
+
+def attributeTablePath(outFeatureClass):
+    """Return the path of the attribute table written next to a slim output feature class."""
+    return companionTablePath(outFeatureClass, attributeTableSuffix)
+
+
+def createSlimFeatureClass(outFeatureClass, geometryType, spatialReference, extraFields=()):
+    """Create an output feature class holding only geometry, the UniqueFeatID key, and any extra (name, type)
+    fields, instead of a full copy of the input schema."""
+    workspace, name = os.path.split(outFeatureClass)
+    arcpy.CreateFeatureclass_management(workspace, name, geometryType, spatial_reference=spatialReference)
+    arcpy.AddField_management(outFeatureClass, slimKeyField, "LONG")
+    for fieldName, fieldType in extraFields:
+        arcpy.AddField_management(outFeatureClass, fieldName, fieldType)
+    return outFeatureClass
+
+
+def createAttributeTable(tablePath, template):
+    """Create the normalized attribute table of a slim output, using the input as the schema template and adding
+    the UniqueFeatID key if the template does not already have it."""
+    if arcpy.Exists(tablePath):
+        arcpy.Delete_management(tablePath)
+    workspace, name = os.path.split(tablePath)
+    arcpy.CreateTable_management(workspace, name, template)
+    if not arcpy.ListFields(tablePath, slimKeyField):
+        arcpy.AddField_management(tablePath, slimKeyField, "LONG")
+    return tablePath
+
+
+def createJoinView(featureClass, attributeTable, layerFile=None):
+    """Join a slim output to its attribute table on UniqueFeatID and save the join as a layer file, so the full
+    attribute set can be viewed or exported for CityEngine import without storing it once per geometry.
+
+    Returns
+    -------
+    str
+        Path of the layer file, written next to the output workspace unless layerFile is given. The file is a .lyrx
+        in ArcGIS Pro and a .lyr elsewhere (see layerFileExtension).
+    """
+    layerName = os.path.basename(featureClass) + "_JoinView"
+    if layerFile is None:
+        workspace = os.path.dirname(featureClass)
+        folder = os.path.dirname(workspace) if os.path.splitext(workspace)[1] else workspace
+        layerFile = os.path.join(folder, layerName + layerFileExtension())
+    arcpy.MakeFeatureLayer_management(featureClass, layerName)
+    arcpy.AddJoin_management(layerName, slimKeyField, attributeTable, slimKeyField, "KEEP_ALL")
+    arcpy.SaveToLayerFile_management(layerName, layerFile, "ABSOLUTE")
+    arcpy.Delete_management(layerName)
+    return layerFile
+
+
+class AssociationOutput(object):
+    """One output of the association engine shared by the Prepare tools (see writeAssociationOutputs).
+
+    Parameters
+    ----------
+    outFeatureClass : str
+        Path of the Web Mercator output feature class.
+    kind : str
+        "street", "lot", or "block".
+    sizeField : str, optional
+        Field holding per feature street lengths or lot areas. If not set, constantSize is used for every row.
+    constantSize : float, optional
+        Size used for every row when sizeField is not set.
+    blockWidth : float, optional
+        Block width of block outputs, in source units.
+    tolerance : float, optional
+        Size quantization step of this output's GeometryInterner (default 0).
+    slim : bool, optional
+        Write only geometry and the UniqueFeatID key (plus CEStreetName for blocks) to the output, and the input
+        attributes once per input row to its attribute table (see attributeTablePath) (default False).
+    keepRejects : bool, optional
+        Write rejected rows to the reject table named after the output. If False, they are only counted (default
+        True).
+    sourceKey : bool, optional
+        Key rows by their source OID for IncrementalRun: the UniqueFeatID of slim and block outputs is the source
+        OID instead of the input position, and outputs that are not slim also get sourceOIDField (default False).
+    rejects : RejectWriter, optional
+        Writer of the rejected rows, replacing the one keepRejects sets up, e.g. IncrementalRun.rejects for an
+        update built into a staging feature class.
+    """
+
+    # kind: (shape builder, geometry type, part names, footprint builder)
+    kinds = {"street": (streetShapes, "POLYLINE", None, streetExtents),
+             "lot": (lotShapes, "POLYGON", None, lotExtents),
+             "block": (blockShapes, "POLYLINE", blockPartNames, blockExtents)}
+
+    def __init__(self, outFeatureClass, kind, sizeField=None, constantSize=0, blockWidth=0, tolerance=0, slim=False,
+                 keepRejects=True, sourceKey=False, rejects=None):
+        if kind not in self.kinds:
+            raise ValueError("Unknown association output kind: {0}".format(str(kind)))
+        shapeBuilder, self.geometryType, self.partNames, self.extentBuilder = self.kinds[kind]
+        self.outFeatureClass = outFeatureClass
+        self.kind = kind
+        self.spec = (kind, sizeField or None, constantSize, blockWidth, tolerance)  # Arguments after outFeatureClass
+        self.sizeField = sizeField or None
+        self.constantSize = constantSize
+        self.builderArgs = {"blockWidths": blockWidth} if kind == "block" else {}
+        self.interner = GeometryInterner(shapeBuilder, len(self.partNames or [None]), tolerance=tolerance)
+        self.attributeTable = attributeTablePath(outFeatureClass) if slim else None
+        self.rejects = rejects or RejectWriter(companionTablePath(outFeatureClass, rejectTableSuffix)
+                                               if keepRejects else None)
+        self.sourceKey = sourceKey
+        self.written = 0
+        self.sizeCodes = []
+        self.gridOffsets = self.gridValues = None
+
+    def placeOnGrid(self, sizeValues, gap, scaleFactor=1.0):
+        """Pack every feature of the input into a GridLayout, given all of its raw size values in cursor order.
+        Footprints are taken from the quantized sizes the interner builds the geometry with, so snapped features
+        never outgrow their cells. Once placed, the output also gets the gridLayoutFields."""
+        validation = validateSizes(sizeValues, None if self.sizeField else self.constantSize)
+        sizes = numpy.where(validation.valid, self.interner.quantize(validation.sizes), 0)
+        layout = GridLayout(self.extentBuilder, gap, **self.builderArgs)
+        offsets, rows, columns = layout.place(sizes, validation.valid)
+        self.gridOffsets = offsets * scaleFactor
+        self.gridValues = layout.values(offsets, rows, columns, scaleFactor)
+
+    def replacementFields(self):
+        """Return the output fields whose values are generated rather than copied from the input, in the order
+        writeAssociationOutputs passes them: the geometry, the key and part name, the grid fields, and the source
+        OID."""
+        fields = [geometryToken]
+        if self.partNames:
+            fields += [slimKeyField, "CEStreetName"]
+        elif self.attributeTable:
+            fields.append(slimKeyField)
+        if self.gridValues is not None:
+            fields += [name for name, fieldType in gridLayoutFields]
+        if self.sourceKey and not self.attributeTable:
+            fields.append(sourceOIDField)
+        return fields
+
+    def outputFields(self, fieldNames):
+        """Return the insert cursor fields of this output, given the attribute fields copied from the input."""
+        replacements = self.replacementFields()
+        if self.attributeTable:
+            return replacements
+        lowerNames = [name.lower() for name in fieldNames]
+        return replacements[:1] + list(fieldNames) + [name for name in replacements[1:]
+                                                      if name.lower() not in lowerNames]
+
+    def extraFields(self):
+        """Return the (name, type) fields added to the output feature class after it is created."""
+        fields = [(slimKeyField, "LONG")] if self.partNames else []
+        if self.partNames:
+            fields.append(("CEStreetName", "TEXT"))
+        if self.gridValues is not None:
+            fields += gridLayoutFields
+        if self.sourceKey and not self.attributeTable:
+            fields.append((sourceOIDField, "LONG"))
+        return fields
+
+    def rowPlan(self, searchFields, fieldNames):
+        """Return the RowPlan mapping rows of the shared search cursor to rows of this output."""
+        return RowPlan(searchFields, self.outputFields(fieldNames), self.replacementFields(), self.sizeField)
+
+    def attributePlan(self, searchFields, fieldNames):
+        """Return the RowPlan mapping rows of the shared search cursor to rows of the attribute table of a slim
+        output, with the key as its only replacement."""
+        return RowPlan(searchFields, [slimKeyField] + [name for name in fieldNames
+                                                       if name.lower() != slimKeyField.lower()], [slimKeyField])
+
+    def create(self, target, inFeatureClass, spatialReference):
+        """Create the feature class this output is written to (and the attribute table of a slim output)."""
+        if self.attributeTable:
+            createSlimFeatureClass(target, self.geometryType, spatialReference,
+                                   [field for field in self.extraFields() if field[0] != slimKeyField])
+            createAttributeTable(self.attributeTable, inFeatureClass)
+            return
+        workspace, name = os.path.split(target)
+        arcpy.CreateFeatureclass_management(workspace, name, self.geometryType, template=inFeatureClass,
+                                            spatial_reference=spatialReference)
+        for fieldName, fieldType in self.extraFields():
+            if not arcpy.ListFields(target, fieldName):
+                arcpy.AddField_management(target, fieldName, fieldType)
+
+    def validation(self):
+        """Return the SizeValidation of every row read so far, to report the repaired and rejected row counts.
+        Only the codes are kept, so its sizes are all 0."""
+        codes = numpy.concatenate(self.sizeCodes) if self.sizeCodes else numpy.zeros(0, dtype="i1")
+        return SizeValidation(numpy.zeros(len(codes)), codes)
+
+
+def writeAssociationOutputs(inFeatureClass, outputs, pointGeometry, directWebMercator=False, chunkSize=50000,
+                            tempWorkspace=None, bulkLoad=False, insertTimer=None, gridGap=None, project=True,
+                            firstPosition=0):
+    """Write any combination of street, lot, and block outputs from one scan of the input. This is the writer of
+    every Prepare tool, so size validation, rejects, slim outputs, grid layouts, and incremental keys are handled
+    the same way for all of them.
+
+    The input is read once, in chunks of chunkSize rows, and every chunk is passed to each output's interned
+    geometry kernel and insert cursor before the next chunk is read. Only attribute columns and size fields are
+    read, never the source geometry. All outputs share the anchor point. If directWebMercator is true, only the
+    anchor is projected and the outputs are written in Web Mercator; otherwise each output is written to a
+    temporary feature class in tempWorkspace (see intermediateWorkspace), in the source spatial reference, and
+    projected.
+    Block outputs also get the UniqueFeatID (1 based input position) and CEStreetName fields. Slim outputs hold
+    only geometry and UniqueFeatID (and CEStreetName), and their input attributes are written once per input row
+    to their attribute table. Each output's sizes are validated per chunk with validateSizes, and its rejected rows
+    go to its own reject table. If gridGap is set, the size columns are read once up front and each output is packed
+    into its own GridLayout. Without project, the outputs are written in the source spatial reference and left for
+    the caller to project.
+
+    Parameters
+    ----------
+    inFeatureClass : str
+        Input feature class supplying attributes and sizes.
+    outputs : list
+        AssociationOutput objects to write.
+    pointGeometry : arcpy.PointGeometry
+        Anchor point in the input's spatial reference.
+    directWebMercator : bool, optional
+        Write the outputs in Web Mercator directly instead of projecting them (default False).
+    chunkSize : int, optional
+        Input rows held in memory at once. 0 or less reads every row in one chunk (default 50000).
+    tempWorkspace : str, optional
+        Workspace of the temporary feature classes. Defaults to the scratch geodatabase.
+    bulkLoad : bool, optional
+        Defer spatial index maintenance of each written feature class until the scan is done (default False).
+    insertTimer : InsertTimer, optional
+        Timer the scan and insert loop is added to.
+    gridGap : float, optional
+        Gap of the grid layout in source units. If not set, every feature is built on the anchor.
+    project : bool, optional
+        Project the outputs to Web Mercator when directWebMercator is not set (default True).
+    firstPosition : int, optional
+        Input position of the first row read, added to the UniqueFeatID of block outputs (default 0).
+
+    Returns
+    -------
+    list
+        Number of input features written to each output, in the order of outputs.
+    """
+    webMercator = arcpy.SpatialReference(webMercatorWKID)
+    directWebMercator = directWebMercator and directWebMercatorFallback(pointGeometry)
+    if directWebMercator:
+        anchorXY, scaleFactor = webMercatorAnchor(pointGeometry)
+        spatialReference = webMercator
+        targets = [output.outFeatureClass for output in outputs]
+    else:
+        anchorXY, scaleFactor = anchorCoordinates(pointGeometry), 1.0
+        spatialReference = arcpy.Describe(inFeatureClass).spatialReference
+        targets = [scratchFeatureClass(workspace=tempWorkspace) if project else output.outFeatureClass
+                   for output in outputs]
+    fieldNames = attributeFields(inFeatureClass)
+    if gridGap is not None:
+        gridNames = [name for name, fieldType in gridLayoutFields]
+        fieldNames = [name for name in fieldNames if name not in gridNames]
+    if any(output.sourceKey for output in outputs):
+        fieldNames = [name for name in fieldNames if name.lower() != sourceOIDField.lower()]
+    searchFields = list(fieldNames) + ["OID@"]
+    oidIndex = len(fieldNames)
+    for output in outputs:
+        if output.sizeField and output.sizeField.lower() not in [name.lower() for name in searchFields]:
+            searchFields.append(output.sizeField)
+    if gridGap is not None:
+        # Layouts need every size before the first chunk is written, so the size columns are read once up front.
+        sizeFields = ["OID@"] + [output.sizeField for output in outputs if output.sizeField]
+        with arcpy.da.SearchCursor(inFeatureClass, sizeFields) as cursor:
+            columns = list(zip(*[row for row in cursor])) or [()] * len(sizeFields)
+        for output in outputs:
+            sizeValues = columns[sizeFields.index(output.sizeField)] if output.sizeField else [None] * len(columns[0])
+            output.placeOnGrid(list(sizeValues), gridGap, scaleFactor)
+    plans = [output.rowPlan(searchFields, fieldNames) for output in outputs]
+    attributePlans = [output.attributePlan(searchFields, fieldNames) if output.attributeTable else None
+                      for output in outputs]
+    for output, target in zip(outputs, targets):
+        output.create(target, inFeatureClass, spatialReference)
+    deferred = [target for target in targets if bulkLoad and deferSpatialIndex(target)]
+    insertTimer = insertTimer or InsertTimer()
+    insertTimer.start()
+    cursors = [arcpy.da.InsertCursor(target, plan.outputFields) for target, plan in zip(targets, plans)]
+    attributeCursors = [arcpy.da.InsertCursor(output.attributeTable, plan.outputFields) if plan else None
+                        for output, plan in zip(outputs, attributePlans)]
+    try:
+        count = 0
+        with arcpy.da.SearchCursor(inFeatureClass, searchFields) as searchCursor:
+            for records in iterChunks(searchCursor, chunkSize):
+                oids = [row[oidIndex] for row in records]
+                for output, plan, cursor, attributePlan, attributeCursor in zip(outputs, plans, cursors,
+                                                                               attributePlans, attributeCursors):
+                    if plan.sizeIndex is not None:
+                        sizeValues = [row[plan.sizeIndex] for row in records]
+                        validation = validateSizes(sizeValues)
+                    else:
+                        sizeValues = [None] * len(records)
+                        validation = validateSizes(sizeValues, output.constantSize)
+                    output.rejects.write(oids, sizeValues, validation)
+                    output.sizeCodes.append(validation.codes)
+                    if output.gridOffsets is not None:
+                        chunkAnchors = _anchorArray(anchorXY) + output.gridOffsets[count:count + len(records)]
+                        shapes = output.interner.shapes(chunkAnchors, validation.sizes, scaleFactor,
+                                                        **output.builderArgs)
+                    else:
+                        shapes = output.interner.shapes(anchorXY, validation.sizes, scaleFactor,
+                                                        **output.builderArgs)
+                    keyed = output.partNames or attributeCursor is not None
+                    sourceRow = output.sourceKey and attributeCursor is None
+                    for index in numpy.flatnonzero(validation.valid).tolist():
+                        row = records[index]
+                        # Incremental outputs are keyed by source OID, so the key of a rebuilt row does not change.
+                        key = oids[index] if output.sourceKey else firstPosition + count + index + 1
+                        gridRow = output.gridValues[count + index] if output.gridValues is not None else ()
+                        values = ((key,) if keyed else ()) + gridRow + ((oids[index],) if sourceRow else ())
+                        if attributeCursor is not None:
+                            attributeCursor.insertRow(attributePlan.build(row, (key,)))
+                        if output.partNames:
+                            partCount = len(output.partNames)
+                            for part, partName in enumerate(output.partNames):
+                                cursor.insertRow(plan.build(row, (shapes[index * partCount + part],) + values[:1] +
+                                                            (partName,) + values[1:]))
+                        else:
+                            cursor.insertRow(plan.build(row, (shapes[index],) + values))
+                        output.written += 1
+                count += len(records)
+    finally:
+        # Release the insert cursors, and their locks, before the outputs are projected.
+        cursor = attributeCursor = None
+        del cursors[:]
+        del attributeCursors[:]
+    insertTimer.stop(sum(output.written * len(output.partNames or [None]) for output in outputs))
+    # Intermediates are only projected and deleted, so only the outputs written directly get their index back.
+    for target in deferred if directWebMercator else []:
+        rebuildSpatialIndex(target)
+    if not directWebMercator and project:
+        for output, target in zip(outputs, targets):
+            arcpy.Project_management(target, output.outFeatureClass, webMercator)
+            arcpy.Delete_management(target)
+    return [output.written for output in outputs]
+
+
+def oidPartitions(table, partitionCount):
+    """Split the rows of a table into up to partitionCount contiguous OID ranges holding about as many rows each.
+    Returns a list of (first OID, last OID, input position of the first row) tuples in ascending OID order."""
+    with arcpy.da.SearchCursor(table, ["OID@"]) as cursor:
+        oids = numpy.sort(numpy.fromiter((row[0] for row in cursor), dtype="i8"))
+    partitions = []
+    position = 0
+    for part in numpy.array_split(oids, max(min(int(partitionCount), len(oids)), 1)):
+        if len(part):
+            partitions.append((int(part[0]), int(part[-1]), position))
+            position += len(part)
+    return partitions
+
+
+def _poolExecutable():
+    """Point multiprocessing at the Python interpreter of the running ArcGIS install, since inside ArcMap or ArcGIS
+    Pro sys.executable is the application rather than python.exe."""
+    if os.name == "nt" and not os.path.basename(sys.executable).lower().startswith("python"):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, "python.exe"))
+
+
+def _writePartition(task):
+    """Process pool worker of writePartitionedOutputs. Writes one OID range of the input to its own scratch file
+    geodatabase and returns, for each output, the path written, the reject table path (None if nothing was
+    rejected), and the number of input features written."""
+    inFeatureClass, first, last, position, index, specs, anchorXY, directWebMercator, chunkSize = task
+    folder = arcpy.env.scratchFolder
+    workspace = arcpy.CreateFileGDB_management(folder, os.path.basename(arcpy.CreateUniqueName(
+            "CEPartition{0}.gdb".format(index), folder))).getOutput(0)
+    oidField = arcpy.AddFieldDelimiters(inFeatureClass, arcpy.Describe(inFeatureClass).OIDFieldName)
+    layer = arcpy.MakeFeatureLayer_management(inFeatureClass, "CEPartition{0}".format(index),
+                                              "{0} >= {1} AND {0} <= {2}".format(oidField, first, last)).getOutput(0)
+    pointGeometry = arcpy.PointGeometry(arcpy.Point(anchorXY[0], anchorXY[1]),
+                                        arcpy.Describe(inFeatureClass).spatialReference)
+    outputs = [AssociationOutput(os.path.join(workspace, "Output{0}".format(number)), *spec)
+               for number, spec in enumerate(specs)]
+    writeAssociationOutputs(layer, outputs, pointGeometry, directWebMercator, chunkSize, workspace, project=False,
+                            firstPosition=position)
+    return [(output.outFeatureClass, output.rejects.tablePath if output.rejects.written else None, output.written)
+            for output in outputs]
+
+
+def writePartitionedOutputs(inFeatureClass, outputs, pointGeometry, workers, directWebMercator=False,
+                            chunkSize=50000, tempWorkspace=None, insertTimer=None):
+    """Write street, lot, and block outputs like writeAssociationOutputs, with the input split across a pool of
+    worker processes.
+
+    The input is partitioned into one contiguous OID range per worker (see oidPartitions). Each worker builds the
+    geometry of its range and writes it to feature classes in its own scratch file geodatabase, so workers never
+    share a workspace lock. The partitions are then merged in OID order and projected once, so the output holds
+    the same rows in the same order whatever the worker count. Block UniqueFeatIDs stay the input position of each
+    row. Reject tables are merged the same way. Grid layouts are not supported, since a layout needs every size.
+
+    Parameters
+    ----------
+    inFeatureClass : str
+        Input feature class supplying attributes and sizes.
+    outputs : list
+        AssociationOutput objects to write.
+    pointGeometry : arcpy.PointGeometry
+        Anchor point in the input's spatial reference.
+    workers : int
+        Number of worker processes, and of partitions.
+    directWebMercator : bool, optional
+        Workers write Web Mercator directly and the merged outputs are not projected (default False).
+    chunkSize : int, optional
+        Input rows held in memory at once by each worker (default 50000).
+    tempWorkspace : str, optional
+        Workspace of the merged feature classes before projection. Defaults to the scratch geodatabase.
+    insertTimer : InsertTimer, optional
+        Timer the pool and merge are added to.
+
+    Returns
+    -------
+    list
+        Number of input features written to each output, in the order of outputs.
+    """
+    directWebMercator = directWebMercator and directWebMercatorFallback(pointGeometry)
+    partitions = oidPartitions(inFeatureClass, workers)
+    anchorXY = anchorCoordinates(pointGeometry)
+    specs = [output.spec for output in outputs]
+    tasks = [(inFeatureClass, first, last, position, index, specs, anchorXY, directWebMercator, chunkSize)
+             for index, (first, last, position) in enumerate(partitions)]
+    insertTimer = insertTimer or InsertTimer()
+    insertTimer.start()
+    if tasks:
+        _poolExecutable()
+        pool = multiprocessing.Pool(min(int(workers), len(tasks)))
+        try:
+            results = pool.map(_writePartition, tasks)  # Results come back in partition order
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = []
+    webMercator = arcpy.SpatialReference(webMercatorWKID)
+    for number, output in enumerate(outputs):
+        parts = [result[number][0] for result in results]
+        if directWebMercator:
+            arcpy.Merge_management(parts, output.outFeatureClass)
+        else:
+            merged = scratchFeatureClass(workspace=tempWorkspace)
+            arcpy.Merge_management(parts, merged)
+            arcpy.Project_management(merged, output.outFeatureClass, webMercator)
+            arcpy.Delete_management(merged)
+        rejectTables = [result[number][1] for result in results if result[number][1]]
+        if rejectTables:
+            arcpy.Merge_management(rejectTables, output.rejects.tablePath)
+        output.rejects.written = sum(rowCount(table) for table in rejectTables)
+        output.written = sum(result[number][2] for result in results)
+    insertTimer.stop(sum(output.written * len(output.partNames or [None]) for output in outputs))
+    for workspace in set(os.path.dirname(part[0]) for result in results for part in result):
+        arcpy.Delete_management(workspace)
+    return [output.written for output in outputs]
+
+
+def sourceRowHashes(inFeatureClass, sizeField=None, decimals=6):
+    """Return a dictionary of the rowDigest of the attributes (and size field) of every row of a table, by OID."""
+    fieldNames = attributeFields(inFeatureClass)
+    if sizeField and sizeField.lower() not in [name.lower() for name in fieldNames]:
+        fieldNames.append(sizeField)
+    with arcpy.da.SearchCursor(inFeatureClass, ["OID@"] + fieldNames) as cursor:
+        return dict((row[0], rowDigest(row[1:], decimals)) for row in cursor)
+
+
+def oidWhereClauses(table, fieldName, oids, batchSize=None):
+    """Return where clauses selecting the rows of table whose fieldName is one of oids, in batches of batchSize
+    (default oidBatchSize) values so no clause goes over the SQL statement limits of the database. Together the
+    clauses select every OID; no clause is returned if there are none."""
+    batchSize = int(batchSize or oidBatchSize)
+    fieldName = arcpy.AddFieldDelimiters(table, fieldName)
+    oids = sorted(int(oid) for oid in oids)
+    return ["{0} IN ({1})".format(fieldName, ",".join(str(oid) for oid in oids[start:start + batchSize]))
+            for start in range(0, len(oids), batchSize)]
+
+
+class IncrementalRun(object):
+    """Incremental update of a Prepare tool output driven by a manifest of per row content hashes.
+
+    The manifest (named after the output with manifestSuffix) holds the rowDigest of every source row, keyed by
+    OID, plus a settings row with the digest of the run settings and the anchor of the run that wrote it. A rerun
+    hashes the source again and compares: rows whose hash changed or that are new are rebuilt into a staging
+    feature class from a layer holding only those rows (see source), and merge applies the staging rows to the
+    existing output with an update cursor, so unchanged and updated rows keep their OIDs. Rows gone from the source
+    are deleted. The output is rebuilt instead when it or its manifest is missing, the settings or anchor changed,
+    or more than incrementalRebuildRatio of the rows changed.
+
+    Parameters
+    ----------
+    inFeatureClass : str
+        Input feature class of the Prepare tool.
+    outFeatureClass : str
+        Output feature class, which holds the source OID of each row in sourceOIDField.
+    sizeField : str, optional
+        Size field of the run, hashed with the attributes.
+    """
+
+    def __init__(self, inFeatureClass, outFeatureClass, sizeField=None):
+        self.inFeatureClass = inFeatureClass
+        self.outFeatureClass = outFeatureClass
+        self.tablePath = companionTablePath(outFeatureClass, manifestSuffix)
+        self.previous = {}
+        self.previousSettings = self.anchorXY = None
+        if arcpy.Exists(self.tablePath) and arcpy.Exists(outFeatureClass) and \
+                arcpy.ListFields(outFeatureClass, sourceOIDField):
+            with arcpy.da.SearchCursor(self.tablePath, [sourceOIDField, "RowHash", "AnchorX", "AnchorY"]) as cursor:
+                for oid, digest, anchorX, anchorY in cursor:
+                    if oid == _manifestSettingsOID:
+                        self.previousSettings, self.anchorXY = digest, (anchorX, anchorY)
+                    else:
+                        self.previous[oid] = digest
+        self.hashes = sourceRowHashes(inFeatureClass, sizeField)
+        self.full = True
+        self.changed, self.deleted = sorted(self.hashes), []
+        self.settings = None
+
+    def plan(self, settings, anchorXY, rebuild=False):
+        """Compare the source with the manifest and decide between an update and a rebuild. settings is a list of
+        the run's options, hashed with the anchor and the output schema. Returns True for an incremental update."""
+        self.settings = rowDigest(list(settings) + list(anchorXY) + sorted(attributeFields(self.inFeatureClass)))
+        self.anchorXY = tuple(anchorXY)
+        if rebuild or self.previousSettings != self.settings:
+            return False
+        self.changed = sorted(oid for oid, digest in self.hashes.items() if self.previous.get(oid) != digest)
+        self.deleted = sorted(oid for oid in self.previous if oid not in self.hashes)
+        self.full = len(self.changed) + len(self.deleted) > incrementalRebuildRatio * max(len(self.hashes), 1)
+        return not self.full
+
+    def report(self):
+        """Return a summary of the rows the run rebuilds."""
+        if self.full:
+            return "Rebuilding the output from all {0} rows.".format(str(len(self.hashes)))
+        return "{0} rows are new or changed, {1} rows were deleted, and {2} rows are unchanged.".format(
+                str(len(self.changed)), str(len(self.deleted)),
+                str(len(self.hashes) - len(self.changed)))
+
+    def source(self, layerName="CEIncrementalSource"):
+        """Return a feature layer of the input holding only the new and changed rows."""
+        oidField = arcpy.Describe(self.inFeatureClass).OIDFieldName
+        if arcpy.Exists(layerName):
+            arcpy.Delete_management(layerName)
+        arcpy.MakeFeatureLayer_management(self.inFeatureClass, layerName)
+        # The rows are selected batch by batch, since one clause listing every OID can be too long for the database.
+        for number, where in enumerate(oidWhereClauses(self.inFeatureClass, oidField, self.changed)):
+            arcpy.SelectLayerByAttribute_management(layerName, "ADD_TO_SELECTION" if number else "NEW_SELECTION",
+                                                    where)
+        return layerName
+
+    def rejects(self):
+        """Return a RejectWriter for the reject table of the output that replaces the rows of the new, changed, and
+        deleted source rows, so after merge the table still lists exactly the rows missing from the output."""
+        return RejectWriter(companionTablePath(self.outFeatureClass, rejectTableSuffix),
+                            set(self.changed) | set(self.deleted))
+
+    def merge(self, stagingFeatureClass=None, partField=None):
+        """Apply the rows of a staging feature class, built from source and projected like the output, to the
+        output. Rows are matched on sourceOIDField (and partField, for outputs with several rows per source row).
+        Returns the number of rows updated, inserted, and deleted."""
+        fields = [geometryToken] + attributeFields(self.outFeatureClass)
+        lowerNames = [name.lower() for name in fields]
+        sourceIndex = lowerNames.index(sourceOIDField.lower())
+        partIndex = lowerNames.index(partField.lower()) if partField else None
+        staged = OrderedDict()
+        if stagingFeatureClass:
+            with arcpy.da.SearchCursor(stagingFeatureClass, fields) as cursor:
+                for row in cursor:
+                    staged[(row[sourceIndex], row[partIndex] if partField else None)] = row
+        updated = deleted = 0
+        for where in oidWhereClauses(self.outFeatureClass, sourceOIDField, set(self.changed) | set(self.deleted)):
+            with arcpy.da.UpdateCursor(self.outFeatureClass, fields, where) as cursor:
+                for row in cursor:
+                    newRow = staged.pop((row[sourceIndex], row[partIndex] if partField else None), None)
+                    if newRow is None:  # Deleted from the source, or now rejected
+                        cursor.deleteRow()
+                        deleted += 1
+                    else:
+                        cursor.updateRow(newRow)
+                        updated += 1
+        with arcpy.da.InsertCursor(self.outFeatureClass, fields) as cursor:
+            for row in staged.values():
+                cursor.insertRow(row)
+        return updated, len(staged), deleted
+
+    def save(self):
+        """Write the manifest of the source rows hashed by this run, replacing the previous one."""
+        if arcpy.Exists(self.tablePath):
+            arcpy.Delete_management(self.tablePath)
+        workspace, name = os.path.split(self.tablePath)
+        arcpy.CreateTable_management(workspace, name)
+        arcpy.AddField_management(self.tablePath, sourceOIDField, "LONG")
+        arcpy.AddField_management(self.tablePath, "RowHash", "TEXT", field_length=32)
+        arcpy.AddField_management(self.tablePath, "AnchorX", "DOUBLE")
+        arcpy.AddField_management(self.tablePath, "AnchorY", "DOUBLE")
+        with arcpy.da.InsertCursor(self.tablePath, [sourceOIDField, "RowHash", "AnchorX", "AnchorY"]) as cursor:
+            cursor.insertRow((_manifestSettingsOID, self.settings) + tuple(self.anchorXY))
+            for oid, digest in self.hashes.items():
+                cursor.insertRow((oid, digest, None, None))
+
+
+class CompensatedSum(object):
+    """Running floating point sum using Neumaier's compensated summation, so the mean center of millions of
+    large projected coordinates does not drift with the order the rows are read in."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, value):
+        newTotal = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - newTotal) + value
+        else:
+            self.compensation += (value - newTotal) + self.total
+        self.total = newTotal
+
+    def value(self):
+        return self.total + self.compensation
+
+
+def streamingMeanCenter(featureClass):
+    """Compute the mean center of a feature class in process by streaming the SHAPE@XY centroid of each feature.
+
+    This matches the unweighted result of MeanCenter_stats without writing, reading back, and deleting an
+    intermediate feature class. Features with empty geometry are skipped.
+
+    Returns
+    -------
+    tuple
+        ((X, Y), count) in the units of the feature class spatial reference. (X, Y) is None if no feature had
+        a geometry.
+    """
+    sumX, sumY = CompensatedSum(), CompensatedSum()
+    count = 0
+    with arcpy.da.SearchCursor(featureClass, ["SHAPE@XY"]) as cursor:
+        for row in cursor:
+            x, y = row[0]
+            if x is None or y is None:
+                continue
+            sumX.add(x)
+            sumY.add(y)
+            count += 1
+    if not count:
+        return None, 0
+    return (sumX.value() / count, sumY.value() / count), count
+
+
+# Extensions of the connection files of workspaces whose data is not stored in files
+nonFileWorkspaceExtensions = (".sde", ".odc")
+
+
+def datasetStamp(datasetPath):
+    """Return a modification stamp for a dataset based on the files that store it.
+
+    The nearest existing file system path is used: for a feature class in a file geodatabase this is the .gdb
+    folder (any edit in the geodatabase changes the stamp, which only ever invalidates the cache early), for a
+    shapefile it is the set of files sharing its base name. Returns None for data that is not stored in files,
+    such as enterprise geodatabases reached through a connection file, in memory workspaces, and services, since
+    no file changes when it is edited.
+    """
+    if "://" in datasetPath:
+        return None
+    parts = [part.lower() for part in os.path.normpath(datasetPath).replace("\\", "/").split("/") if part]
+    if any(os.path.splitext(part)[1] in nonFileWorkspaceExtensions for part in parts) or \
+            (parts and parts[0] in ("in_memory", "memory")):
+        return None
+    path = os.path.abspath(datasetPath)
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    if os.path.isdir(path):
+        stamps = [os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)]
+        return max(stamps + [os.path.getmtime(path)])
+    baseName = os.path.splitext(path)[0]
+    folder = os.path.dirname(path)
+    return max(os.path.getmtime(os.path.join(folder, name)) for name in os.listdir(folder)
+               if os.path.splitext(os.path.join(folder, name))[0] == baseName)
+
+
+def centroidCachePath(datasetPath):
+    """Return the sidecar file used to cache mean centers for a dataset. It is written in the folder that holds
+    the dataset's workspace (next to the .gdb, .sde connection, or shapefile)."""
+    describe = arcpy.Describe(datasetPath)
+    workspace = getattr(describe, "path", os.path.dirname(datasetPath))
+    while workspace and (os.path.splitext(workspace)[1].lower() in (".gdb", ".sde", ".mdb") or
+                         not os.path.isdir(workspace)):
+        if os.path.dirname(workspace) == workspace:
+            break
+        workspace = os.path.dirname(workspace)
+    if not workspace or not os.path.isdir(workspace):
+        workspace = arcpy.env.scratchFolder
+    return os.path.join(workspace, centroidCacheName)
+
+
+def _readCentroidCache(cachePath):
+    try:
+        with open(cachePath, "r") as cacheFile:
+            return json.load(cacheFile)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _writeCentroidCache(cachePath, cache):
+    try:
+        with open(cachePath, "w") as cacheFile:
+            json.dump(cache, cacheFile, indent=1, sort_keys=True)
+    except (IOError, OSError):
+        arcpy.AddWarning("Could not write the centroid cache to {0}.".format(str(cachePath)))
+
+
+def cachedMeanCenter(featureClass, useCache=True):
+    """Return the mean center of a feature class, reusing the cached value if the dataset has not changed.
+
+    Cache entries are keyed on the dataset path and are only reused if the row count and the modification stamp
+    (see datasetStamp) both match, so dozens of scenario runs against the same reference dataset only read its
+    geometry once. Data without a stamp, such as enterprise geodatabase data, is never cached and is read on
+    every run.
+
+    Returns
+    -------
+    arcpy.PointGeometry
+        Mean center in the spatial reference of the feature class, or None if it has no geometries.
+    """
+    spatialReference = arcpy.Describe(featureClass).spatialReference
+    datasetKey = os.path.normcase(os.path.abspath(featureClass))
+    featureCount = rowCount(featureClass)
+    stamp = datasetStamp(featureClass)
+    cachePath = centroidCachePath(featureClass) if useCache and stamp is not None else None
+    if cachePath:
+        cache = _readCentroidCache(cachePath)
+        entry = cache.get(datasetKey)
+        if entry and entry.get("rowCount") == featureCount and entry.get("stamp") == stamp:
+            return arcpy.PointGeometry(arcpy.Point(entry["x"], entry["y"]), spatialReference)
+    centerXY, count = streamingMeanCenter(featureClass)
+    if centerXY is None:
+        return None
+    if cachePath:
+        cache = _readCentroidCache(cachePath)
+        cache[datasetKey] = {"rowCount": featureCount, "stamp": stamp, "x": centerXY[0], "y": centerXY[1]}
+        _writeCentroidCache(cachePath, cache)
+    return arcpy.PointGeometry(arcpy.Point(centerXY[0], centerXY[1]), spatialReference)
+
+
+def parseAnchorCoordinate(anchorText):
+    """Parse an explicit anchor given as "X Y" (the text form of a point tool parameter) or "X,Y". Returns an
+    (X, Y) tuple, or None if no anchor was given."""
+    if anchorText is None:
+        return None
+    if isinstance(anchorText, (tuple, list)):
+        return float(anchorText[0]), float(anchorText[1])
+    parts = str(anchorText).replace(",", " ").split()
+    if len(parts) < 2:
+        return None
+    return float(parts[0]), float(parts[1])
+
+
+def anchorPoint(inFeatureClass, referenceFeatureClass=None, anchorXY=None, useCache=True):
+    """Return the point every output template is anchored on, in the spatial reference of the input.
+
+    An explicit anchorXY (in input units) skips the computation entirely. Otherwise the mean center of the
+    reference feature class, or of the input if no reference is given, is computed in process and cached (see
+    cachedMeanCenter). A reference center in another coordinate system is projected to the input's.
+
+    Parameters
+    ----------
+    inFeatureClass : str
+        Input feature class of the Prepare tool.
+    referenceFeatureClass : str, optional
+        Feature class whose mean center is used instead of the input's.
+    anchorXY : tuple, optional
+        Explicit (X, Y) anchor in the input's spatial reference.
+    useCache : bool, optional
+        Whether to read and write the centroid cache (default True).
+
+    Returns
+    -------
+    arcpy.PointGeometry
+        Anchor point in the input spatial reference.
+    """
+    inputReference = arcpy.Describe(inFeatureClass).spatialReference
+    if anchorXY is not None:
+        return arcpy.PointGeometry(arcpy.Point(anchorXY[0], anchorXY[1]), inputReference)
+    if referenceFeatureClass and referenceFeatureClass != "#" and arcpy.Exists(referenceFeatureClass):
+        center = cachedMeanCenter(referenceFeatureClass, useCache)
+        if center is not None and center.spatialReference.name != inputReference.name:
+            center = center.projectAs(inputReference)
+        return center
+    return cachedMeanCenter(inFeatureClass, useCache)
@@ -0,0 +1,232 @@
+# --------------------------------
+# Name: DeduplicateCrossSections.py
+# Purpose: This scripting tool reduces a street feature class to one prototype feature per distinct cross section.
+# The CityEngine rule attributes of each feature are hashed, the first feature read with each hash is written to the
+# output as its prototype, and a mapping table links every source feature to its prototype, so that generation and
+# export scale with the number of distinct designs rather than the number of segments. Run it after the
+# PrepareCE*Associations tools and PopulateStreetParameters.
+# Current Owner: David Wasserman
+# Last Modified: 10/18/2026
+# Copyright:   (c) Co-Adaptive- David Wasserman
+# ArcGIS Version:   10.3
+# Python Version:   2.7
+# License
+# Copyright 2015 David J. Wasserman
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# --------------------------------
+# Import Modules
+import os, arcpy
+import CEAssociationsCore as core
+import PopulateStreetParameters as streetParameters
+
+# Add Field types of the ListFields types a source ID field may have
+fieldTypes = {"String": "TEXT", "Integer": "LONG", "SmallInteger": "SHORT", "Double": "DOUBLE", "Single": "FLOAT",
+              "Date": "DATE", "OID": "LONG", "GUID": "GUID", "GlobalID": "GUID"}
+
+# Function Definitions
+def funcReport(function=None,reportBool=False):
+    """This decorator function is designed to be used as a wrapper with other functions to enable basic try and except
+     reporting (if function fails it will report the name of the function that failed and its arguments. If a report
+      boolean is true the function will report inputs and outputs of a function.-David Wasserman"""
+    def funcReport_Decorator(function):
+        def funcWrapper(*args, **kwargs):
+            try:
+                funcResult = function(*args, **kwargs)
+                if reportBool:
+                    print("Function:{0}".format(str(function.__name__)))
+                    print("     Input(s):{0}".format(str(args)))
+                    print("     Ouput(s):{0}".format(str(funcResult)))
+                return funcResult
+            except Exception as e:
+                print("{0} - function failed -|- Function arguments were:{1}.".format(str(function.__name__), str(args)))
+                print(e.args[0])
+        return funcWrapper
+    if not function:  # User passed in a bool argument
+        def waiting_for_function(function):
+            return funcReport_Decorator(function)
+        return waiting_for_function
+    else:
+        return funcReport_Decorator(function)
+
+
+def arcToolReport(function=None, arcToolMessageBool=False, arcProgressorBool=False):
+    """This decorator function is designed to be used as a wrapper with other GIS functions to enable basic try and except
+     reporting (if function fails it will report the name of the function that failed and its arguments. If a report
+      boolean is true the function will report inputs and outputs of a function.-David Wasserman"""
+    def arcToolReport_Decorator(function):
+        def funcWrapper(*args, **kwargs):
+            try:
+                funcResult = function(*args, **kwargs)
+                if arcToolMessageBool:
+                    arcpy.AddMessage("Function:{0}".format(str(function.__name__)))
+                    arcpy.AddMessage("     Input(s):{0}".format(str(args)))
+                    arcpy.AddMessage("     Ouput(s):{0}".format(str(funcResult)))
+                if arcProgressorBool:
+                    arcpy.SetProgressorLabel("Function:{0}".format(str(function.__name__)))
+                    arcpy.SetProgressorLabel("     Input(s):{0}".format(str(args)))
+                    arcpy.SetProgressorLabel("     Ouput(s):{0}".format(str(funcResult)))
+                return funcResult
+            except Exception as e:
+                arcpy.AddMessage(
+                    "{0} - function failed -|- Function arguments were:{1}.".format(str(function.__name__), str(args)))
+                print("{0} - function failed -|- Function arguments were:{1}.".format(str(function.__name__), str(args)))
+                print(e.args[0])
+        return funcWrapper
+    if not function:  # User passed in a bool argument
+        def waiting_for_function(function):
+            return  arcToolReport_Decorator(function)
+        return waiting_for_function
+    else:
+        return arcToolReport_Decorator(function)
+
+@arcToolReport
+def arc_print(string, progressor_Bool=False):
+    """ This function is used to simplify using arcpy reporting for tool creation,if progressor bool is true it will
+    create a tool label."""
+    casted_string = str(string)
+    if progressor_Bool:
+        arcpy.SetProgressorLabel(casted_string)
+        arcpy.AddMessage(casted_string)
+        print(casted_string)
+    else:
+        arcpy.AddMessage(casted_string)
+        print(casted_string)
+
+
+@arcToolReport
+def FieldExist(featureclass, fieldname):
+    """ Check if a field in a feature class field exists and return true it does, false if not."""
+    fieldList = arcpy.ListFields(featureclass, fieldname)
+    fieldCount = len(fieldList)
+    if (fieldCount >= 1) and fieldname.strip():  # If there is one or more of this field return true
+        return True
+    else:
+        return False
+
+
+def crossSectionFieldNames(inFeatureClass, fieldNames=None):
+    """Return the input fields hashed into the cross section of each feature, in schema order. These are the
+    fieldNames given, or by default every street parameter and Complete Street rule field of
+    PopulateStreetParameters the input has."""
+    if not fieldNames:
+        workspace = os.path.dirname(inFeatureClass)
+        fieldNames = [arcpy.ValidateFieldName(name, workspace) for name in
+                      streetParameters.street_parameter_fields + streetParameters.complete_street_fields]
+    wanted = set(name.lower() for name in fieldNames)
+    return [name for name in core.attributeFields(inFeatureClass) if name.lower() in wanted]
+
+
+def createMappingTable(tablePath, sourceIDField=None):
+    """Create the table mapping each source feature to its prototype, replacing any table from an earlier run.
+    Returns the names of its fields in insert order."""
+    if arcpy.Exists(tablePath):
+        arcpy.Delete_management(tablePath)
+    workspace, name = os.path.split(tablePath)
+    arcpy.CreateTable_management(workspace, name)
+    mapFields = ["SourceOID"]
+    arcpy.AddField_management(tablePath, "SourceOID", "LONG")
+    if sourceIDField is not None:
+        arcpy.AddField_management(tablePath, "SourceID", fieldTypes.get(sourceIDField.type, "TEXT"),
+                                  field_length=sourceIDField.length)
+        mapFields.append("SourceID")
+    arcpy.AddField_management(tablePath, core.prototypeIDField, "LONG")
+    arcpy.AddField_management(tablePath, core.crossSectionHashField, "TEXT", field_length=32)
+    return mapFields + [core.prototypeIDField, core.crossSectionHashField]
+
+
+# Main Function
+@arcToolReport
+def do_analysis(inFeatureClass, outFeatureClass, crossSectionFields=None, mappingTable=None, idField=None,
+                decimals=6):
+    """This function writes one prototype feature per distinct cross section of the input to outFeatureClass,
+    with its PrototypeID, FeatureCount, and CrossSectionHash, and writes a table mapping the OID (and idField, if
+    given) of every input feature to the PrototypeID standing in for it. A cross section is the set of values of
+    the crossSectionFields, by default the street rule fields of PopulateStreetParameters, with numbers compared to
+    the given number of decimals. The mapping table defaults to a table named after the output with
+    _CrossSectionMap appended."""
+    try:
+        arcpy.env.overwriteOutput = True
+        arc_print("Gathering feature information.", True)
+        desc = arcpy.Describe(inFeatureClass)
+        hashFields = crossSectionFieldNames(inFeatureClass, crossSectionFields)
+        if not hashFields:
+            arc_print("No cross section fields were found in the input. Check arguments.", True)
+            arcpy.AddError("No cross section fields were found in the input. Check arguments.")
+            return
+        arc_print("Hashing the cross section fields: {0}.".format(", ".join(hashFields)), True)
+        sourceIDField = None
+        if idField and FieldExist(inFeatureClass, idField):
+            sourceIDField = arcpy.ListFields(inFeatureClass, idField)[0]
+        if not mappingTable or mappingTable == "#":
+            mappingTable = core.companionTablePath(outFeatureClass, core.crossSectionMapSuffix)
+        mapFields = createMappingTable(mappingTable, sourceIDField)
+        searchFields = ["OID@"] + hashFields + ([sourceIDField.name] if sourceIDField is not None else [])
+        idIndex = len(hashFields) + 1
+        prototypeIDs = {}  # Cross section hash: prototype ID
+        prototypeOIDs = {}  # OID of the feature written as each prototype: prototype ID
+        digests, featureCounts = [None], [0]  # Indexed by prototype ID
+        arc_print("Hashing the cross section of every input feature.", True)
+        with arcpy.da.SearchCursor(inFeatureClass, searchFields) as cursor:
+            with arcpy.da.InsertCursor(mappingTable, mapFields) as mapCursor:
+                for row in cursor:
+                    digest = core.rowDigest(row[1:idIndex], decimals)
+                    prototypeID = prototypeIDs.get(digest)
+                    if prototypeID is None:
+                        prototypeID = prototypeIDs[digest] = len(digests)
+                        prototypeOIDs[row[0]] = prototypeID
+                        digests.append(digest)
+                        featureCounts.append(0)
+                    featureCounts[prototypeID] += 1
+                    mapCursor.insertRow((row[0],) + tuple(row[idIndex:]) + (prototypeID, digest))
+        sourceCount = sum(featureCounts)
+        arc_print("Found {0} distinct cross sections in {1} features.".format(str(len(prototypeIDs)),
+                                                                             str(sourceCount)), True)
+        arc_print("Writing one prototype feature per cross section.", True)
+        if arcpy.Exists(outFeatureClass):
+            arcpy.Delete_management(outFeatureClass)
+        workspace, name = os.path.split(outFeatureClass)
+        arcpy.CreateFeatureclass_management(workspace, name, desc.shapeType.upper(), inFeatureClass,
+                                            "SAME_AS_TEMPLATE", "SAME_AS_TEMPLATE", desc.spatialReference)
+        prototypeFields = [core.prototypeIDField, core.prototypeCountField, core.crossSectionHashField]
+        arcpy.AddField_management(outFeatureClass, core.prototypeIDField, "LONG")
+        arcpy.AddField_management(outFeatureClass, core.prototypeCountField, "LONG")
+        arcpy.AddField_management(outFeatureClass, core.crossSectionHashField, "TEXT", field_length=32)
+        copyFields = [field for field in core.attributeFields(inFeatureClass) if field not in prototypeFields]
+        with arcpy.da.SearchCursor(inFeatureClass, ["OID@", "SHAPE@"] + copyFields) as cursor:
+            with arcpy.da.InsertCursor(outFeatureClass, ["SHAPE@"] + copyFields + prototypeFields) as insertCursor:
+                for row in cursor:
+                    prototypeID = prototypeOIDs.get(row[0])
+                    if prototypeID is not None:
+                        insertCursor.insertRow(row[1:] + (prototypeID, featureCounts[prototypeID],
+                                                          digests[prototypeID]))
+        arc_print("Wrote {0} prototypes standing in for {1} features ({2:.1f}x fewer) and the mapping table {3}."
+                  .format(str(len(prototypeIDs)), str(sourceCount), sourceCount / float(max(len(prototypeIDs), 1)),
+                          mappingTable), True)
+    except arcpy.ExecuteError:
+        print(arcpy.GetMessages(2))
+    except Exception as e:
+        print(e.args[0])
+
+
+# End do_analysis function
+# Main Script
+if __name__ == "__main__":
+    # Define Inputs
+    inFeatureClass = arcpy.GetParameterAsText(0)
+    outFeatureClass = arcpy.GetParameterAsText(1)
+    crossSectionFields = [name for name in core.optionalParameter(2, "", True).split(";") if name]  # optional
+    mappingTable = core.optionalParameter(3, None, True)  # optional path of the source to prototype table
+    idField = core.optionalParameter(4, None, True)  # optional source ID written to the mapping table
+    decimals = core.optionalParameter(5, 6)  # Decimal places numbers are compared to
+    do_analysis(inFeatureClass, outFeatureClass, crossSectionFields, mappingTable, idField, decimals)
@@ -0,0 +1,83 @@
+# --------------------------------
+# Name: RowPlanBenchmark.py
+# Purpose: Microbenchmark of the per row copy used by PrepareCEBlockAssociations on a wide (200 field) table.
+# Compares the field name search of the former copyAlteredRow function with the compiled RowPlan in
+# CEAssociationsCore. Run it from the ArcGIS Python interpreter.
+# Current Owner: David Wasserman
+# Last Modified: 10/18/2026
+# Copyright:   (c) Co-Adaptive- David Wasserman
+# ArcGIS Version:   10.3
+# Python Version:   2.7
+# License
+# Copyright 2015 David J. Wasserman
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# --------------------------------
+# Import Modules
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import CEAssociationsCore as core
+
+
+# Function Definitions
+def getFIndex(field_names, field_name):
+    """Former field index lookup: a lower cased copy and linear search of the field list on every call."""
+    try:
+        return [str(i).lower() for i in field_names].index(str(field_name).lower())
+    except:
+        return None
+
+
+def copyAlteredRow(row, fieldList, replacementDict):
+    """Former per row copy of PrepareCEBlockAssociations, kept here as the benchmark baseline."""
+    newRow = []
+    keyList = replacementDict.keys()
+    for field in fieldList:
+        if field in keyList:
+            newRow.append(replacementDict[field])
+        else:
+            newRow.append(row[getFIndex(fieldList, field)])
+    return newRow
+
+
+def rowsPerSecond(function, rowCount):
+    """Time rowCount calls of function(iteration) and return the throughput."""
+    start = time.time()
+    for iteration in range(rowCount):
+        function(iteration)
+    return rowCount / max(time.time() - start, 1e-9)
+
+
+def do_analysis(fieldCount=200, baselineRows=1000, planRows=200000):
+    """Print rows/sec of the former copy and the compiled row plan for a table with fieldCount fields."""
+    attributeFields = ["Field{0}".format(index) for index in range(fieldCount - 3)] + ["UniqueFeatID",
+                                                                                       "CEStreetName"]
+    searchFields = ["SHAPE@"] + attributeFields
+    insertFields = [core.geometryToken] + attributeFields
+    row = tuple(range(len(searchFields)))
+    shape = bytearray(b"0" * 41)
+    before = rowsPerSecond(lambda count: copyAlteredRow(row, insertFields, {core.geometryToken: shape,
+                                                                            "UniqueFeatID": count,
+                                                                            "CEStreetName": "MainStreet"}),
+                           baselineRows)
+    rowPlan = core.RowPlan(searchFields, insertFields, [core.geometryToken, "UniqueFeatID", "CEStreetName"])
+    after = rowsPerSecond(lambda count: rowPlan.build(row, (shape, count, "MainStreet")), planRows)
+    print("Fields per row: {0}".format(len(insertFields)))
+    print("copyAlteredRow: {0:,.0f} rows/sec".format(before))
+    print("RowPlan.build:  {0:,.0f} rows/sec ({1:,.0f}x)".format(after, after / before))
+
+
+# Main Script
+if __name__ == "__main__":
+    do_analysis()
@@ -3,7 +3,7 @@
 # Purpose: This tool is designed to populate with default fields and values for street shapes and is designed
 # to add core complete street rule fields.
 # Current Owner: David Wasserman
-# Last Modified: 8/5/17
+# Last Modified: 10/18/2026
 # Copyright:  (c) Co-Adaptive- David Wasserman
 # ArcGIS Version:   10.3
 # Python Version:   2.7
@@ -24,7 +24,9 @@
 # --------------------------------
 
 # Import Modules
-import os, math, arcpy, random
+import os, ast, json, numbers, operator, multiprocessing, arcpy, numpy
+from collections import OrderedDict
+import CEAssociationsCore as core
 
 
 # String Parameters
@@ -95,6 +97,145 @@ Traffic_Lights = "Traffic_Lights"
 
 Bridge_Display = "Bridge_Display"
 
+# Schemas of the fields added by the tool, as (field name, field type, alias). The fields drive the generated
+# street, so they are also what groups streets with the same cross section.
+street_parameter_schema = [(streetWidth, "DOUBLE", streetWidth),
+                           (sidewalkWidthLeft, "DOUBLE", sidewalkWidthLeft),
+                           (sidewalkWidthRight, "DOUBLE", sidewalkWidthRight),
+                           (streetOffset, "DOUBLE", streetOffset),
+                           (precision, "DOUBLE", precision),
+                           (laneWidth, "DOUBLE", laneWidth),
+                           (type, "TEXT", "Intersection type"),
+                           (cornerStyle, "TEXT", cornerStyle)]
+complete_street_schema = [  # Section 1
+                          (Lane_Distribution, "DOUBLE", Lane_Distribution),
+                          (Lane_Width, "DOUBLE", Lane_Width),
+                          (Speed_Limit_in_MPH, "DOUBLE", Speed_Limit_in_MPH),
+                          (Stop_Begin, "TEXT", Stop_Begin),
+                          (Stop_End, "TEXT", Stop_End),
+                          # Section 2
+                          (Crosswalk_Begin, "TEXT", Crosswalk_Begin),
+                          (Crosswalk_End, "TEXT", Crosswalk_End),
+                          (Begin_Crosswalk_To_Stop_Bar, "DOUBLE", Begin_Crosswalk_To_Stop_Bar),
+                          (End_Crosswalk_To_Stop_Bar, "DOUBLE", End_Crosswalk_To_Stop_Bar),
+                          (Crosswalk_Width, "DOUBLE", Crosswalk_Width),
+                          # Section 3
+                          (Right_Parking_Type, "TEXT", Right_Parking_Type),
+                          (Right_Parking_Width, "DOUBLE", Right_Parking_Width),
+                          (Left_Parking_Type, "TEXT", Left_Parking_Type),
+                          (Left_Parking_Width, "DOUBLE", Left_Parking_Width),
+                          # Section 4
+                          (Center_Type, "TEXT", Center_Type),
+                          (Center_Width, "DOUBLE", Center_Width),
+                          (Planting_and_Walkway_Layout, "TEXT", Planting_and_Walkway_Layout),
+                          (Boulevard_Inside_Width, "DOUBLE", Boulevard_Inside_Width),
+                          (Boulevard_Configuration, "TEXT", Boulevard_Configuration),
+                          (Median_Ground_Cover, "TEXT", Median_Ground_Cover),
+                          (Median_Planting_Length, "DOUBLE", Median_Planting_Length),
+                          # Section 5
+                          (Median_Bus_Stop, "TEXT", Median_Bus_Stop),
+                          (Median_Bus_Stop_Location, "TEXT", Median_Bus_Stop_Location),
+                          # Section 6
+                          (Transit_Lane, "TEXT", Transit_Lane),
+                          (Transit_Lane_Sides, "TEXT", Transit_Lane_Sides),
+                          (Transit_Lane_Width, "DOUBLE", Transit_Lane_Width),
+                          (Transit_Lane_Position, "TEXT", Transit_Lane_Position),
+                          # Section 7
+                          (Right_Bike_Lane_Width, "DOUBLE", Right_Bike_Lane_Width),
+                          (Left_Bike_Lane_Width, "DOUBLE", Left_Bike_Lane_Width),
+                          (Right_Buffer_Width, "DOUBLE", Right_Buffer_Width),
+                          (Left_Buffer_Width, "DOUBLE", Left_Buffer_Width),
+                          (Buffer_Type, "TEXT", Buffer_Type),
+                          (Buffer_Protection, "TEXT", Buffer_Protection),
+                          (Parking_Protection, "TEXT", Parking_Protection),
+                          (Left_Bike_Box, "TEXT", Left_Bike_Box),
+                          (Right_Bike_Box, "TEXT", Right_Bike_Box),
+                          (Bike_Box_Color_Override, "TEXT", Bike_Box_Color_Override),
+                          # Section 8
+                          (Sidewalk_Ground_Cover, "TEXT", Sidewalk_Ground_Cover),
+                          (Sidewalk_Planting_Width, "DOUBLE", Sidewalk_Planting_Width),
+                          (Sidewalk_Planting_Length, "DOUBLE", Sidewalk_Planting_Length),
+                          (Sidewalk_Planting_Spacing, "DOUBLE", Sidewalk_Planting_Spacing),
+                          # Section 9
+                          (Sidewalk_Bus_Stop, "TEXT", Sidewalk_Bus_Stop),
+                          (Sidewalk_Bus_Stop_Location, "TEXT", Sidewalk_Bus_Stop_Location),
+                          (Sidewalk_Benches, "TEXT", Sidewalk_Benches),
+                          (Parking_Meters, "TEXT", Parking_Meters),
+                          (Sidewalk_Street_Lamps, "TEXT", Sidewalk_Street_Lamps),
+                          (Traffic_Lights, "TEXT", Traffic_Lights),
+                          # Section 10
+                          (Bridge_Display, "TEXT", Bridge_Display)]
+street_parameter_fields = [field_name for field_name, field_type, field_alias in street_parameter_schema]
+complete_street_fields = [field_name for field_name, field_type, field_alias in complete_street_schema]
+
+# Fields written by the default street parameter generator, in write order, and the Complete Street Rule fields it
+# adds when randomized Complete Street values are requested.
+default_parameter_fields = [streetWidth, streetOffset, sidewalkWidthRight, sidewalkWidthLeft, precision, laneWidth,
+                            type, cornerStyle]
+random_complete_street_fields = [Stop_Begin, Stop_End, Lane_Width, Begin_Crosswalk_To_Stop_Bar,
+                                 End_Crosswalk_To_Stop_Bar, Transit_Lane, Transit_Lane_Width, Right_Bike_Lane_Width,
+                                 Left_Bike_Lane_Width, Right_Buffer_Width, Left_Buffer_Width, Buffer_Type,
+                                 Right_Parking_Type, Left_Parking_Type, Sidewalk_Ground_Cover, Bridge_Display,
+                                 Crosswalk_End, Crosswalk_Begin]
+
+# Default distributions of the randomized street values, in the street profile format read by load_street_profile.
+# Each entry draws from "values" (or the integers of "range", inclusive) with optional relative "weights". An entry
+# with "given" draws from the first of its "rules" whose "above", "below" and "equals" conditions hold for the value
+# drawn for the given entry; a rule without conditions applies to every remaining row.
+default_street_profile = {
+    # Street Parameters
+    "sidewalkWidth": {"values": [0, 1.4, 1.5, 1.6, 2, 2.5, 2.6, 2.8, 3, 4, 5],
+                      "weights": [1, 2, 1, 1, 1, 1, 1, 1, 1, 1, 1]},
+    "Street_Lanes": {"range": [8, 35]},
+    # Complete Street Rule Attributes
+    "Stop": {"values": ["line only", "with stop marking", "arrows on all lanes", "arrows on side lanes",
+                        "arrows for right turn"]},
+    "Crosswalk": {"values": ["none", "continental", "ladder", "transverse", "custom", "ladder custom"]},
+    "Complete_Street_Lanes": {"range": [1, 8]},
+    "Lane_Width": {"values": [3.3528, 3.6576]},
+    "Crosswalk_To_Stop_Bar": {"values": [1.4, 2.4]},
+    "Transit_Lane": {"values": ["None", "Bus Lane"], "weights": [4, 1]},
+    "Bike_Lane_Width": {"values": [0, 1.4, 1.8, 2], "weights": [3, 2, 1, 1]},
+    "Buffer_Width": {"given": "Bike_Lane_Width",
+                     "rules": [{"above": 1.6, "values": [1.2]},
+                               {"above": 0, "values": [0, 1]},
+                               {"values": [0]}]},
+    "Buffer_Type": {"values": ["Painted Stripes", "Curb Buffer with Plantings", "Cycle Track With Planters",
+                               "Cycle Track With Tubular Markers"], "weights": [2, 1, 1, 1]},
+    "Parking_Type": {"values": ["None", "Parallel"], "weights": [2, 1]},
+    "Sidewalk_Ground_Cover": {"values": ["None", "Standard Grass"]}}
+
+# Rows generated per random stream. Streams follow the OID order in chunks of this size, whatever the worker count.
+chunk_rows = 50000
+
+# Update modes of the default street parameter values: every row, only the missing values, or only the rows whose
+# other attributes changed since the run that wrote the street manifest (the table named after the streets with
+# street_manifest_suffix).
+update_all = "ALL"
+update_fill_missing = "FILL_MISSING"
+update_changed_only = "CHANGED_ONLY"
+street_manifest_suffix = "_StreetManifest"
+
+# Street rules of the fields derived from other Complete Street fields, which recompute_derived_fields keeps
+# consistent. Lanes is the number of travel lanes, which no field holds: it is inferred from streetWidth and kept in
+# the dependency table (named after the streets with street_dependency_suffix). Null widths count as 0, and a null
+# Center_Width as the center of the generated streets.
+derived_street_rules = """
+Right_Parking_Width = parking_width(Right_Parking_Type)
+Left_Parking_Width = parking_width(Left_Parking_Type)
+streetWidth = even_street_widths(Lanes, Lane_Width) + fill_null(Right_Parking_Width, 0) + \
+    fill_null(Left_Parking_Width, 0) + fill_null(Right_Bike_Lane_Width, 0) + fill_null(Left_Bike_Lane_Width, 0) + \
+    fill_null(Right_Buffer_Width, 0) + fill_null(Left_Buffer_Width, 0) + fill_null(Center_Width, 0.4064) + 0.3
+"""
+lanes_field = "Lanes"
+street_dependency_suffix = "_StreetDependencies"
+
+# Compiled street profiles, by (profile path, modification time)
+_street_profiles = {}
+
+# Field names validated by valid_field_name, by (workspace, field name)
+_valid_field_names = {}
+
 
 # Function Definitions
 def func_report(function=None, report_bool=False):
@@ -188,66 +329,45 @@ def field_exist(featureclass, fieldname):
         return False
 
 
-@arc_tool_report
-def add_new_field(in_table, field_name, field_type, field_precision="#", field_scale="#", field_length="#",
-                  field_alias="#", field_is_nullable="#", field_is_required="#", field_domain="#"):
-    """Add a field to a table only if it does not already exist. Checking first is faster than calling
-    AddField unconditionally.
+def valid_field_name(field_name, workspace):
+    """Return arcpy.ValidateFieldName(field_name, workspace), validating each name once per workspace."""
+    key = (workspace, field_name)
+    if key not in _valid_field_names:
+        _valid_field_names[key] = arcpy.ValidateFieldName(field_name, workspace)
+    return _valid_field_names[key]
 
-    Parameters
-    ----------
-    in_table : str
-        Path to the input table or feature class.
-    field_name : str
-        Name of the field to add.
-    field_type : str
-        ArcGIS field type string (e.g. "DOUBLE", "TEXT", "LONG").
-    field_precision : str or int, optional
-        Number of digits for numeric fields. Defaults to "#".
-    field_scale : str or int, optional
-        Number of decimal places for numeric fields. Defaults to "#".
-    field_length : str or int, optional
-        Maximum character length for text fields. Defaults to "#".
-    field_alias : str, optional
-        Alias displayed in ArcGIS. Defaults to "#".
-    field_is_nullable : str, optional
-        Whether the field allows NULL values. Defaults to "#".
-    field_is_required : str, optional
-        Whether the field is required by the schema. Defaults to "#".
-    field_domain : str, optional
-        Name of a domain to assign to the field. Defaults to "#".
-    """
-    if field_exist(in_table, field_name):
-        print(field_name + " Exists")
-        arcpy.AddMessage(field_name + " Exists")
-    else:
-        print("Adding " + field_name)
-        arcpy.AddMessage("Adding " + field_name)
-        arcpy.AddField_management(in_table, field_name, field_type, field_precision, field_scale,
-                                  field_length,
-                                  field_alias,
-                                  field_is_nullable, field_is_required, field_domain)
 
-@arc_tool_report
-def buff_dist(bikelnWidth):
-    """Return a plausible bike lane buffer width (meters) based on the given bike lane width.
+def add_schema_fields(in_table, schema, workspace):
+    """Add the fields of a schema missing from a table, reading the table's fields once and adding every missing
+    field in a single AddFields call (one AddField call per field where AddFields is not available).
 
     Parameters
     ----------
-    bikelnWidth : float
-        Width of the adjacent bike lane in meters.
+    in_table : str
+        Path to the input table or feature class.
+    schema : list
+        (field name, field type, alias) tuples, such as street_parameter_schema.
+    workspace : str
+        Workspace the field names are validated for.
 
     Returns
     -------
-    float
-        1.2 m buffer for wide lanes (>1.6 m), 0 or 1 m randomly for narrow lanes, 0 for no lane.
+    dict
+        Validated field name of every schema field, by schema field name.
     """
-    if bikelnWidth > 1.6:
-        return 1.2
-    if bikelnWidth > 0:
-        return random.randint(0, 1)
+    field_names = dict((field_name, valid_field_name(field_name, workspace)) for field_name, field_type, field_alias
+                       in schema)
+    existing = set(field.name.lower() for field in arcpy.ListFields(in_table))
+    missing = [[field_names[field_name], field_type, field_alias] for field_name, field_type, field_alias in schema
+               if field_names[field_name].lower() not in existing]
+    arc_print("{0} fields exist and {1} fields are added.".format(str(len(schema) - len(missing)), str(len(missing))))
+    if missing and hasattr(arcpy, "AddFields_management"):
+        arcpy.AddFields_management(in_table, missing)
     else:
-        return 0
+        for field_name, field_type, field_alias in missing:
+            arcpy.AddField_management(in_table, field_name, field_type, field_alias=field_alias)
+    return field_names
+
 
 @arc_tool_report
 def if_below_thresh_zero(number, threshold):
@@ -318,32 +438,833 @@ def parking_width(string):
     else:
         return 0
 
+def random_generator(seed=None):
+    """Return a NumPy random generator seeded with seed (unseeded if None). Uses numpy.random.Generator where the
+    installed NumPy has it, and a RandomState otherwise, so the draws of a seed depend on the NumPy version."""
+    if hasattr(numpy.random, "default_rng"):
+        return numpy.random.default_rng(seed)
+    return numpy.random.RandomState(seed)
+
+
+def chunk_generator(seed, chunk):
+    """Return the independent random generator of one chunk of rows: a child of seed's SeedSequence keyed by the
+    chunk number where NumPy has SeedSequence, and a RandomState seeded with [seed, chunk] otherwise."""
+    if hasattr(numpy.random, "SeedSequence"):
+        return numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=(chunk,)))
+    return numpy.random.RandomState([seed, chunk])
+
+
+def random_integers(generator, low, high, size):
+    """Return size random integers from low to high inclusive, like random.randint, from either generator type."""
+    if hasattr(generator, "integers"):
+        return generator.integers(low, high + 1, size)
+    return generator.randint(low, high + 1, size)
+
+
+def random_uniform(generator, size):
+    """Return size random floats in [0, 1) from either generator type."""
+    if hasattr(generator, "integers"):
+        return generator.random(size)
+    return generator.random_sample(size)
+
+
+class AliasTable(object):
+    """Walker/Vose alias method table of a discrete distribution. Building it is O(n) in the number of values, and
+    each sample then costs one uniform integer, one uniform float, and one comparison however many values there
+    are."""
+
+    def __init__(self, values, weights=None):
+        if not values:
+            raise ValueError("A distribution needs at least one value.")
+        weights = numpy.ones(len(values)) if weights is None else numpy.asarray(weights, dtype="f8")
+        if len(weights) != len(values) or (weights < 0).any() or not weights.sum() > 0:
+            raise ValueError("Distribution weights must be one non-negative weight per value, not all zero.")
+        numeric = all(isinstance(value, numbers.Number) and not isinstance(value, bool) for value in values)
+        self.values = numpy.array(values, dtype="f8" if numeric else object)
+        count = len(values)
+        scaled = weights * count / weights.sum()
+        self.probability = numpy.ones(count)
+        self.alias = numpy.arange(count)
+        small = [index for index in range(count) if scaled[index] < 1]
+        large = [index for index in range(count) if scaled[index] >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # Whatever is left is 1 up to rounding and keeps probability 1.
+
+    def sample(self, generator, size):
+        """Return size values drawn from the distribution."""
+        index = random_integers(generator, 0, len(self.values) - 1, size)
+        keep = random_uniform(generator, size) < self.probability[index]
+        return self.values[numpy.where(keep, index, self.alias[index])]
+
+
+class StreetProfile(object):
+    """Compiled street profile: an alias table per distribution, and ordered (condition, alias table) rules for the
+    entries drawn given another entry. A compiled profile holds no run state and can be reused for any number of
+    runs and generators."""
+    conditions = {"above": numpy.greater, "below": numpy.less, "equals": numpy.equal}
+
+    def __init__(self, profile=None):
+        entries = dict(default_street_profile)
+        unknown = [name for name in (profile or {}) if name not in default_street_profile]
+        if unknown:
+            raise ValueError("Unknown street profile entries: {0}. Expected some of: {1}.".format(
+                    ", ".join(sorted(unknown)), ", ".join(sorted(default_street_profile))))
+        entries.update(profile or {})
+        self.tables = {}
+        self.given = {}
+        for name, entry in entries.items():
+            if "given" in entry:
+                if entry["given"] not in entries:
+                    raise ValueError("Street profile entry {0} is given unknown entry {1}.".format(
+                            name, entry["given"]))
+                self.given[name] = entry["given"]
+                self.tables[name] = [(self.compile_condition(rule), self.compile_table(rule))
+                                     for rule in entry.get("rules", [])]
+                if not self.tables[name]:
+                    raise ValueError("Street profile entry {0} has no rules.".format(name))
+            else:
+                self.tables[name] = self.compile_table(entry)
+        for name in self.given:
+            seen, given = [name], self.given[name]
+            while given in self.given:
+                if given in seen:
+                    raise ValueError("Street profile entries {0} are given each other.".format(", ".join(seen)))
+                seen.append(given)
+                given = self.given[given]
+
+    def compile_condition(self, rule):
+        """Return the (numpy comparison, threshold) pairs of a rule."""
+        return [(self.conditions[key], rule[key]) for key in sorted(self.conditions) if key in rule]
+
+    @staticmethod
+    def compile_table(entry):
+        """Return the alias table of a values/weights or range entry."""
+        values = entry.get("values")
+        if "range" in entry:
+            low, high = entry["range"]
+            values = list(range(int(low), int(high) + 1))
+        return AliasTable(values or [], entry.get("weights"))
+
+    def draw(self, name, generator, size, drawn):
+        """Return size values of entry name, drawing the entry it is given first if it is not in drawn yet. Every
+        column drawn is stored in the drawn dictionary by entry name, so the draws of one row are consistent."""
+        if name in drawn:
+            return drawn[name]
+        if name not in self.given:
+            drawn[name] = self.tables[name].sample(generator, size)
+            return drawn[name]
+        given = self.draw(self.given[name], generator, size, drawn)
+        remaining = numpy.ones(size, dtype=bool)
+        dtypes = set(table.values.dtype for condition, table in self.tables[name])
+        values = numpy.zeros(size, dtype=dtypes.pop() if len(dtypes) == 1 else object)
+        for condition, table in self.tables[name]:
+            match = remaining.copy()
+            for compare, threshold in condition:
+                match &= compare(given, threshold)
+            values[match] = table.sample(generator, int(match.sum()))
+            remaining &= ~match
+        if remaining.any():
+            raise ValueError("No rule of street profile entry {0} applies to {1} rows.".format(
+                    name, int(remaining.sum())))
+        drawn[name] = values
+        return values
+
+
+def load_street_profile(profile_path=None):
+    """Return the StreetProfile compiled from a JSON street profile file, or from default_street_profile if no path
+    is given. Entries missing from the file keep their defaults. Compiled profiles are cached by path and
+    modification time, so runs in the same session reuse them until the file changes."""
+    key = (os.path.abspath(profile_path), os.path.getmtime(profile_path)) if profile_path else None
+    if key not in _street_profiles:
+        profile = None
+        if profile_path:
+            with open(profile_path) as profile_file:
+                profile = json.load(profile_file)
+        _street_profiles[key] = StreetProfile(profile)
+    return _street_profiles[key]
+
+
+def even_street_widths_array(lanes_count, ln_width, additional_width=0):
+    """Vectorized even_street_widths: add a lane to each odd lane count and return the street widths. Null (NaN)
+    lane counts or widths give NaN widths."""
+    lanes_count = numpy.asarray(lanes_count, dtype="f8")
+    return (lanes_count + (lanes_count % 2 != 0)) * numpy.asarray(ln_width, dtype="f8") + additional_width
+
+
+def if_below_thresh_zero_array(number, threshold):
+    """Vectorized if_below_thresh_zero: 0 where number is below threshold, 1 elsewhere."""
+    return numpy.where(numpy.asarray(number, dtype="f8") < threshold, 0, 1)
+
+
+def parking_width_array(parking_types):
+    """Vectorized parking_width: 2.44 m for parallel parking, 0 otherwise."""
+    return numpy.where(numpy.asarray(parking_types, dtype=object) == "Parallel", 2.44, 0.0)
+
+
+def generate_street_columns(row_count, generator, rand_comp_str=False, profile=None):
+    """Generate the default street parameter values of row_count streets as whole columns.
+
+    Values are drawn from the distributions of a street profile, with array operations in place of the per row
+    helper calls. If rand_comp_str is True, randomized Complete Street Rule values are generated as well, and
+    streetWidth is recomputed from the generated lanes, parking, bike lanes, buffers, and center.
+
+    Parameters
+    ----------
+    row_count : int
+        Number of streets.
+    generator : numpy.random.Generator or numpy.random.RandomState
+        Random generator (see random_generator).
+    rand_comp_str : bool, optional
+        Also generate the random_complete_street_fields (default False).
+    profile : StreetProfile, optional
+        Compiled street profile to draw from (default: the compiled default_street_profile).
+
+    Returns
+    -------
+    OrderedDict
+        Column of values of each generated field, by field name, in write order.
+    """
+    profile = profile or load_street_profile()
+    drawn = {}
+
+    def draw(name):
+        return profile.draw(name, generator, row_count, drawn)
+
+    columns = OrderedDict()
+    lanes_width = 3.5
+    columns[streetWidth] = even_street_widths_array(draw("Street_Lanes"), lanes_width - .2)
+    columns[streetOffset] = numpy.zeros(row_count)
+    columns[sidewalkWidthRight] = draw("sidewalkWidth")
+    columns[sidewalkWidthLeft] = draw("sidewalkWidth")
+    columns[precision] = numpy.repeat(.5, row_count)
+    columns[laneWidth] = numpy.repeat(lanes_width, row_count)
+    columns[type] = numpy.repeat(numpy.array(["Crossing"], dtype=object), row_count)
+    columns[cornerStyle] = numpy.repeat(numpy.array(["Arcs"], dtype=object), row_count)
+    if not rand_comp_str:
+        return columns
+    center_width = 0.1016 * 4
+    spare_space = 0.3
+    columns[streetWidth] = even_street_widths_array(
+            draw("Complete_Street_Lanes"), draw("Lane_Width"),
+            (parking_width_array(draw("Parking_Type")) * 2) + (draw("Bike_Lane_Width") * 2) +
+            (draw("Buffer_Width") * 2) + center_width + spare_space)
+    columns[Stop_Begin] = draw("Stop")
+    columns[Stop_End] = draw("Stop")
+    columns[Lane_Width] = draw("Lane_Width")
+    columns[Begin_Crosswalk_To_Stop_Bar] = draw("Crosswalk_To_Stop_Bar")
+    columns[End_Crosswalk_To_Stop_Bar] = draw("Crosswalk_To_Stop_Bar")
+    columns[Transit_Lane] = draw("Transit_Lane")
+    columns[Transit_Lane_Width] = numpy.repeat(3.3528, row_count)
+    columns[Right_Bike_Lane_Width] = draw("Bike_Lane_Width")
+    columns[Left_Bike_Lane_Width] = draw("Bike_Lane_Width")
+    columns[Right_Buffer_Width] = draw("Buffer_Width")
+    columns[Left_Buffer_Width] = draw("Buffer_Width")
+    columns[Buffer_Type] = draw("Buffer_Type")
+    columns[Right_Parking_Type] = draw("Parking_Type")
+    columns[Left_Parking_Type] = draw("Parking_Type")
+    columns[Sidewalk_Ground_Cover] = draw("Sidewalk_Ground_Cover")
+    columns[Bridge_Display] = numpy.repeat(numpy.array(["Concrete Extrusion Only"], dtype=object), row_count)
+    columns[Crosswalk_End] = draw("Crosswalk")
+    columns[Crosswalk_Begin] = draw("Crosswalk")
+    return columns
+
+
+def _generate_chunk(task):
+    """Process pool worker of generate_street_chunks: generates the columns of one chunk from its own stream."""
+    row_count, seed, chunk, rand_comp_str, profile = task
+    return generate_street_columns(row_count, chunk_generator(seed, chunk), rand_comp_str, profile)
+
+
+def generate_street_chunks(row_count, seed, rand_comp_str=False, profile=None, workers=1, chunk_size=chunk_rows):
+    """Generate the default street parameter columns of row_count streets in chunks of chunk_size rows, each drawn
+    from its own stream of seed (see chunk_generator). With more than one worker the chunks are generated in a
+    process pool. The chunks are concatenated in order, so a seed gives the same columns for any worker count.
+
+    Parameters
+    ----------
+    row_count : int
+        Number of streets.
+    seed : int
+        Seed of the chunk streams.
+    rand_comp_str : bool, optional
+        Also generate the random_complete_street_fields (default False).
+    profile : StreetProfile, optional
+        Compiled street profile to draw from (default: the compiled default_street_profile).
+    workers : int, optional
+        Number of processes generating chunks (default 1, in process).
+    chunk_size : int, optional
+        Rows per chunk and stream (default chunk_rows).
+
+    Returns
+    -------
+    OrderedDict
+        Column of values of each generated field, by field name, in write order.
+    """
+    profile = profile or load_street_profile()
+    tasks = [(min(chunk_size, row_count - start), seed, chunk, rand_comp_str, profile)
+             for chunk, start in enumerate(range(0, row_count, chunk_size))]
+    if int(workers or 1) > 1 and len(tasks) > 1:
+        core._poolExecutable()
+        pool = multiprocessing.Pool(min(int(workers), len(tasks)))
+        try:
+            chunks = pool.map(_generate_chunk, tasks)  # Chunks come back in order
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        chunks = [_generate_chunk(task) for task in tasks]
+    if not chunks:
+        return generate_street_columns(0, random_generator(seed), rand_comp_str, profile)
+    return OrderedDict((name, numpy.concatenate([columns[name] for columns in chunks])) for name in chunks[0])
+
+
+def read_street_groups(in_features, filter_query=None, group_id=None):
+    """Return the sorted OIDs of the rows of a table matching filter_query (every row if None), and the group of
+    each of them as an array of group numbers. Rows sharing a group_id value share a group number, numbered in the
+    order of their lowest OID; rows with a null group_id, and every row without group_id, are groups of their own."""
+    fields = ["OID@"] + ([group_id] if group_id else [])
+    with arcpy.da.SearchCursor(in_features, fields, filter_query or None) as cursor:
+        rows = sorted(cursor)
+    oids = numpy.array([row[0] for row in rows], dtype="i8")
+    if not group_id:
+        return oids, numpy.arange(len(oids))
+    group_numbers = {}
+    # A null group_id is no shared value, so key those rows on their OID to keep them apart.
+    keys = [("__oid__", row[0]) if row[1] is None else row[1] for row in rows]
+    groups = numpy.array([group_numbers.setdefault(key, len(group_numbers)) for key in keys], dtype="i8")
+    return oids, groups
+
+
+def group_member_values(in_features, field_names, oids, groups, selected, where_clause=None):
+    """Return the values of field_names of the lowest OID member of each group with a selected row that is not
+    selected itself and has no null in field_names, by group number. oids, groups, and selected are the arrays of
+    read_street_groups and a mask of the rows an update writes."""
+    wanted = set(groups[selected].tolist())
+    candidates = dict((oid, group) for oid, group, chosen in zip(oids.tolist(), groups.tolist(), selected.tolist())
+                      if not chosen and group in wanted)
+    members = {}
+    with arcpy.da.SearchCursor(in_features, ["OID@"] + list(field_names), where_clause or None) as cursor:
+        for row in cursor:
+            group = candidates.get(row[0])
+            if group is None or any(value is None for value in row[1:]):
+                continue
+            if group not in members or row[0] < members[group][0]:
+                members[group] = row
+    return dict((group, row[1:]) for group, row in members.items())
+
+
+def null_where_clause(in_features, field_names):
+    """Return a where clause selecting the rows of a table where any of field_names is null."""
+    return " OR ".join("{0} IS NULL".format(arcpy.AddFieldDelimiters(in_features, field_name))
+                       for field_name in field_names)
+
+
+def street_input_hashes(in_features, target_fields, filter_query=None):
+    """Return the rowDigest of the attributes of every row matching filter_query, other than the target_fields
+    the tool writes, by OID. These are the inputs a changed-only update compares with the street manifest."""
+    targets = set(field_name.lower() for field_name in target_fields)
+    input_fields = [field_name for field_name in core.attributeFields(in_features)
+                    if field_name.lower() not in targets]
+    with arcpy.da.SearchCursor(in_features, ["OID@"] + input_fields, filter_query or None) as cursor:
+        return dict((row[0], core.rowDigest(row[1:])) for row in cursor)
+
+
+def read_street_manifest(manifest_path):
+    """Return the settings digest and the row hashes by OID of a street manifest, or (None, {}) if it is
+    missing."""
+    settings, hashes = None, {}
+    if arcpy.Exists(manifest_path):
+        with arcpy.da.SearchCursor(manifest_path, [core.sourceOIDField, "RowHash"]) as cursor:
+            for oid, digest in cursor:
+                if oid == core._manifestSettingsOID:
+                    settings = digest
+                else:
+                    hashes[oid] = digest
+    return settings, hashes
+
+
+def save_street_manifest(manifest_path, settings, hashes):
+    """Write a street manifest holding a settings digest and row hashes by OID, replacing the previous one."""
+    if arcpy.Exists(manifest_path):
+        arcpy.Delete_management(manifest_path)
+    workspace, name = os.path.split(manifest_path)
+    arcpy.CreateTable_management(workspace, name)
+    arcpy.AddField_management(manifest_path, core.sourceOIDField, "LONG")
+    arcpy.AddField_management(manifest_path, "RowHash", "TEXT", field_length=32)
+    with arcpy.da.InsertCursor(manifest_path, [core.sourceOIDField, "RowHash"]) as cursor:
+        cursor.insertRow((core._manifestSettingsOID, settings))
+        for oid, digest in hashes.items():
+            cursor.insertRow((oid, digest))
+
+
+def write_columns(in_features, field_names, columns, oids=None, where_clause=None, keep_existing=False):
+    """Write precomputed columns to a table in one UpdateCursor pass by a single writer. field_names maps each
+    column name to its validated field name. If oids is given, the value at position i goes to the row with OID
+    oids[i], whatever order the cursor returns rows in, and rows not in oids are left unchanged. Otherwise values
+    are written in cursor order. Only rows matching where_clause are read. If keep_existing is True, values that are
+    not null in the table are kept and only the nulls are filled. Returns the number of rows written."""
+    values = [column.tolist() for column in columns.values()]
+    fields = [field_names[name] for name in columns]
+    written = 0
+    if oids is None:
+        with arcpy.da.UpdateCursor(in_features, fields, where_clause or None) as cursor:
+            for row, new_row in zip(cursor, zip(*values)):
+                if keep_existing:
+                    new_row = [value if existing is None else existing for existing, value in zip(row, new_row)]
+                cursor.updateRow(new_row)
+                written += 1
+        return written
+    positions = dict(zip(oids.tolist(), range(len(oids))))
+    with arcpy.da.UpdateCursor(in_features, ["OID@"] + fields, where_clause or None) as cursor:
+        for row in cursor:
+            position = positions.get(row[0])
+            if position is None:
+                continue
+            if keep_existing:
+                cursor.updateRow([row[0]] + [column[position] if existing is None else existing
+                                             for existing, column in zip(row[1:], values)])
+            else:
+                cursor.updateRow([row[0]] + [column[position] for column in values])
+            written += 1
+    return written
+
+
+def is_null_array(values):
+    """Return where values are null, as read by read_rule_columns: NaN numbers and None or empty text."""
+    values = numpy.asarray(values)
+    if values.dtype == object:
+        return numpy.array([value is None or value == "" for value in values.tolist()], dtype=bool)
+    if values.dtype.kind in "SU":  # Fixed width text, such as the result of where(a > 1, "x", "y")
+        return numpy.char.str_len(values) == 0
+    return numpy.isnan(values.astype("f8"))
+
+
+def fill_null_array(values, fill_value):
+    """Return values with their nulls (see is_null_array) replaced by fill_value."""
+    return numpy.where(is_null_array(values), fill_value, values)
+
+
+def null_equal_array(values, other_values):
+    """Return where two columns hold the same value, counting two nulls as the same."""
+    values_null, other_null = is_null_array(values), is_null_array(other_values)
+    return (values_null & other_null) | (~values_null & ~other_null & (numpy.asarray(values, dtype=object) ==
+                                                                       numpy.asarray(other_values, dtype=object)))
+
+
+def consistent_array(values, expected, tolerance=1e-6):
+    """Return where a derived column agrees with the values computed by its rule: numbers within tolerance and
+    other values when equal. Rows whose computed value is null (from null inputs) are counted as consistent."""
+    values, expected = numpy.asarray(values), numpy.asarray(expected)
+    agrees = is_null_array(expected) | null_equal_array(values, expected)
+    if values.dtype.kind in "biuf" and expected.dtype.kind in "biuf":
+        with numpy.errstate(invalid="ignore"):
+            agrees |= numpy.abs(values.astype("f8") - expected.astype("f8")) <= tolerance
+    return agrees
+
+
+def nulls_to_none(values):
+    """Return a result column with its NaN values replaced by None, so they are written as nulls."""
+    if values.dtype.kind == "f" and numpy.isnan(values).any():
+        nulls = numpy.isnan(values)
+        values = values.astype(object)
+        values[nulls] = None
+    return values
+
+
+# Functions street rules can call, by name
+rule_functions = {"even_street_widths": even_street_widths_array, "parking_width": parking_width_array,
+                  "if_below_thresh_zero": if_below_thresh_zero_array, "where": numpy.where,
+                  "minimum": numpy.minimum, "maximum": numpy.maximum, "abs": numpy.abs, "round": numpy.round,
+                  "floor": numpy.floor, "ceil": numpy.ceil, "sqrt": numpy.sqrt, "isnull": is_null_array,
+                  "fill_null": fill_null_array}
+
+
+class StreetRules(object):
+    """Compiled street rules deriving fields from other columns of a table with NumPy array operations.
+
+    Rules are written one per line (or separated by semicolons) as "field = expression", and lines starting with
+    # are comments. An expression combines columns and numbers or text with + - * / // % **, comparisons, and, or,
+    not, "a if condition else b", and the rule_functions, for example
+    "streetWidth = even_street_widths(lanes, Lane_Width) + 2 * parking_width(Right_Parking_Type)". A rule can use
+    the fields set by the rules before it, and a line ending with a backslash continues on the next line. The
+    inputs of each rule are kept, by target, as the dependency graph of the rules. Each expression is parsed once into a tree of closures over whole
+    columns, so evaluating a rule costs a few array operations however many rows there are.
+
+    Parameters
+    ----------
+    text : str
+        Street rules.
+    """
+    operators = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+                 ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+                 ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Not: numpy.logical_not,
+                 ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+                 ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.And: numpy.logical_and, ast.Or: numpy.logical_or}
+    constants = tuple(getattr(ast, name) for name in ("Constant", "Num", "Str") if hasattr(ast, name))
+
+    def __init__(self, text):
+        self.rules = []
+        self.sources = []
+        self.inputs = OrderedDict()
+        targets = set()
+        for line in text.replace("\\\n", " ").replace(";", "\n").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            target, equals, expression = line.partition("=")
+            target = target.strip()
+            if not equals or not target or not all(part.isalnum() for part in target.split("_") if part):
+                raise ValueError("Street rule '{0}' is not of the form field = expression.".format(line))
+            try:
+                tree = ast.parse(expression.strip(), mode="eval").body
+            except SyntaxError:
+                raise ValueError("Street rule expression '{0}' is not valid.".format(expression.strip()))
+            self.names = []
+            function = self.compile_node(tree)
+            self.sources.extend(name for name in self.names if name.lower() not in targets and
+                                name.lower() not in [source.lower() for source in self.sources])
+            self.rules.append((target, function))
+            self.inputs[target] = [name.lower() for name in self.names]
+            targets.add(target.lower())
+
+    def compile_node(self, node):
+        """Return a function of the columns dictionary computing an expression node."""
+        if isinstance(node, self.constants):
+            value = getattr(node, "value", getattr(node, "n", getattr(node, "s", None)))
+            return lambda columns: value
+        if isinstance(node, ast.Name):
+            name = node.id
+            self.names.append(name)
+            return lambda columns: columns[name.lower()]
+        if isinstance(node, ast.BinOp) and node.op.__class__ in self.operators:
+            apply, left, right = self.operators[node.op.__class__], self.compile_node(node.left), \
+                                 self.compile_node(node.right)
+            return lambda columns: apply(left(columns), right(columns))
+        if isinstance(node, ast.UnaryOp) and node.op.__class__ in self.operators:
+            apply, operand = self.operators[node.op.__class__], self.compile_node(node.operand)
+            return lambda columns: apply(operand(columns))
+        if isinstance(node, ast.BoolOp):
+            apply, values = self.operators[node.op.__class__], [self.compile_node(value) for value in node.values]
+            return lambda columns: reduce_values(apply, [value(columns) for value in values])
+        if isinstance(node, ast.Compare) and all(op.__class__ in self.operators for op in node.ops):
+            terms = [self.compile_node(node.left)] + [self.compile_node(term) for term in node.comparators]
+            applies = [self.operators[op.__class__] for op in node.ops]
+            return lambda columns: reduce_values(numpy.logical_and, [
+                    apply(terms[index](columns), terms[index + 1](columns)) for index, apply in enumerate(applies)])
+        if isinstance(node, ast.IfExp):
+            test, body, orelse = self.compile_node(node.test), self.compile_node(node.body), \
+                                 self.compile_node(node.orelse)
+            return lambda columns: numpy.where(test(columns), body(columns), orelse(columns))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in rule_functions \
+                and not node.keywords:
+            function, arguments = rule_functions[node.func.id], [self.compile_node(arg) for arg in node.args]
+            return lambda columns: function(*[argument(columns) for argument in arguments])
+        raise ValueError("Street rules do not support '{0}'. Use columns, numbers, text, arithmetic, comparisons, "
+                         "and the functions {1}.".format(node.__class__.__name__, ", ".join(sorted(rule_functions))))
+
+    def evaluate(self, columns, row_count):
+        """Evaluate the rules over the source columns (by lower cased name) of row_count rows, and return the
+        column of each target field, by target name, in rule order."""
+        columns = dict(columns)
+        results = OrderedDict()
+        for target, function in self.rules:
+            values = numpy.asarray(function(columns))
+            if values.ndim == 0:  # A constant rule
+                values = numpy.repeat(values.astype(object if values.dtype.kind in "SUO" else "f8")[None],
+                                      row_count)
+            elif values.dtype.kind in "SU":  # Text results are held like text columns, as objects
+                values = values.astype(object)
+            columns[target.lower()] = results[target] = values
+        return results
+
+
+def reduce_values(function, values):
+    """Apply a binary function cumulatively to a list of values."""
+    result = values[0]
+    for value in values[1:]:
+        result = function(result, value)
+    return result
+
+
+def read_rule_columns(in_features, field_names, where_clause=None, key_field="OID@"):
+    """Read the OIDs (or the values of another non-null key_field) and the columns of field_names of the rows of a
+    table matching where_clause in one TableToNumPyArray call. Numeric columns are returned as floats with NaN for
+    nulls, and the other columns as object arrays with None for nulls."""
+    fields = dict((field.name.lower(), field) for field in arcpy.ListFields(in_features))
+    missing = [field_name for field_name in field_names if field_name.lower() not in fields]
+    if missing:
+        raise ValueError("Street rules use fields missing from {0}: {1}.".format(
+                os.path.basename(in_features), ", ".join(missing)))
+    numeric = set(field_name for field_name in field_names
+                  if fields[field_name.lower()].type in ("Double", "Single", "Integer", "SmallInteger", "OID"))
+    integer_null = -2147483647  # Null marker of integer fields, which have no NaN
+    null_values = dict((field_name, numpy.nan if fields[field_name.lower()].type in ("Double", "Single")
+                        else integer_null if field_name in numeric else "") for field_name in field_names)
+    table = arcpy.da.TableToNumPyArray(in_features, [key_field] + list(field_names), where_clause or None,
+                                       skip_nulls=False, null_value=null_values)
+    columns = {}
+    for field_name in field_names:
+        if field_name in numeric:
+            column = table[field_name].astype("f8")
+            if fields[field_name.lower()].type not in ("Double", "Single"):
+                column[table[field_name] == integer_null] = numpy.nan
+        else:
+            column = table[field_name].astype(object)
+            column[column == ""] = None
+        columns[field_name.lower()] = column
+    return table[key_field].astype("i8"), columns
+
+
+def apply_street_rules(in_features, rules, field_names=None, where_clause=None):
+    """Derive fields of a table from its other columns with street rules: the source columns are read once,
+    every rule is evaluated over the whole columns, and the results are written back in one cursor pass.
+
+    Parameters
+    ----------
+    in_features : str
+        Path to the table or feature class.
+    rules : str or StreetRules
+        Street rules (see StreetRules), or the path of a text file holding them.
+    field_names : dict, optional
+        Validated field name of each target field, by field name (default: the target names).
+    where_clause : str, optional
+        Where clause limiting the rows derived.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    if not isinstance(rules, StreetRules):
+        if os.path.isfile(rules):
+            with open(rules) as rules_file:
+                rules = rules_file.read()
+        rules = StreetRules(rules)
+    field_names = dict(field_names or {})
+    existing = dict((field.name.lower(), field.name) for field in arcpy.ListFields(in_features))
+    for target, function in rules.rules:
+        field_names.setdefault(target, existing.get(target.lower(), target))
+        if field_names[target].lower() not in existing:
+            raise ValueError("Street rule target {0} is not a field of {1}.".format(
+                    target, os.path.basename(in_features)))
+    sources = [existing.get(name.lower(), name) for name in rules.sources]
+    oids, columns = read_rule_columns(in_features, sources, where_clause)
+    results = rules.evaluate(columns, len(oids))
+    for target, values in results.items():
+        results[target] = nulls_to_none(values)
+    arc_print("Derived {0} fields from {1} columns for {2} rows, writing them in one pass.".format(
+            str(len(results)), str(len(sources)), str(len(oids))), True)
+    return write_columns(in_features, field_names, results, oids, where_clause)
+
+
+def read_street_dependencies(dependency_path, field_names):
+    """Return the source OIDs and the columns of field_names (by lower cased name) of a street dependency table,
+    or None if it is missing or does not hold every field."""
+    if not arcpy.Exists(dependency_path):
+        return None
+    existing = set(field.name.lower() for field in arcpy.ListFields(dependency_path))
+    if any(field_name.lower() not in existing for field_name in field_names):
+        return None
+    return read_rule_columns(dependency_path, field_names, key_field=core.sourceOIDField)
+
+
+def save_street_dependencies(dependency_path, oids, columns, field_names):
+    """Write a street dependency table holding the columns of field_names (by lower cased name) by source OID,
+    replacing the previous one."""
+    if arcpy.Exists(dependency_path):
+        arcpy.Delete_management(dependency_path)
+    workspace, name = os.path.split(dependency_path)
+    arcpy.CreateTable_management(workspace, name)
+    schema = [(core.sourceOIDField, "LONG", core.sourceOIDField)] + [
+        (field_name, "TEXT" if columns[field_name.lower()].dtype == object else "DOUBLE", field_name)
+        for field_name in field_names]
+    table_fields = add_schema_fields(dependency_path, schema, workspace)
+    values = [nulls_to_none(columns[field_name.lower()]).tolist() for field_name in field_names]
+    with arcpy.da.InsertCursor(dependency_path, [table_fields[field_name] for field_name, field_type, alias
+                                                 in schema]) as cursor:
+        for position, oid in enumerate(oids.tolist()):
+            cursor.insertRow([oid] + [column[position] for column in values])
+
+
+def report_inconsistent_rows(field_name, oids, listed=50):
+    """Warn that the edited values of a derived field disagree with its rule for the rows of oids, listing the first
+    listed OIDs."""
+    oids = sorted(oids.tolist())
+    shown = ", ".join(str(oid) for oid in oids[:listed]) + (", ..." if len(oids) > listed else "")
+    message = "{0} rows keep an edited {1} that disagrees with its components (OIDs: {2}).".format(
+            str(len(oids)), field_name, shown)
+    arc_print(message, True)
+    arcpy.AddWarning(message)
+
+
+def recompute_derived_fields(in_features, field_names=None, where_clause=None, rules=derived_street_rules):
+    """Recompute the derived fields of the rows whose inputs changed since the last run, keeping the component and
+    derived values of Complete Street fields consistent in one batched update.
+
+    The inputs and derived fields of every row are compared with their values in the dependency table written by
+    the previous run. Following the dependency graph of the rules, a derived field is recomputed for a row when any
+    of its inputs changed, directly or through another derived field, or when it is null. A derived value that was
+    edited since the previous run (or that a new row already holds) is kept rather than recomputed, and the rows where
+    it disagrees with the value of its rule are reported with a warning. The lane count of a row is inferred from its
+    streetWidth when the row is new or its streetWidth was edited, and read from the dependency table otherwise, so
+    editing a component keeps the lanes and changes the width, while an edited width changes the lanes and is kept.
+    The rows whose derived values change are written in one cursor pass and the dependency table is rewritten.
+
+    Parameters
+    ----------
+    in_features : str
+        Path to the streets, holding the Complete Street fields.
+    field_names : dict, optional
+        Validated field name of each derived field, by field name (default: the field names).
+    where_clause : str, optional
+        Where clause limiting the rows recomputed.
+    rules : str or StreetRules, optional
+        Street rules of the derived fields (default derived_street_rules), with lanes_field as the lane count.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    rules = rules if isinstance(rules, StreetRules) else StreetRules(rules)
+    existing = dict((field.name.lower(), field.name) for field in arcpy.ListFields(in_features))
+    targets = [target for target, function in rules.rules]
+    tracked = [existing.get(name.lower(), name) for name in rules.sources if name.lower() != lanes_field.lower()] + \
+              [existing.get(target.lower(), target) for target in targets]
+    oids, columns = read_rule_columns(in_features, tracked, where_clause)
+    row_count = len(oids)
+    dependency_path = core.companionTablePath(in_features, street_dependency_suffix)
+    previous = read_street_dependencies(dependency_path, tracked + [lanes_field])
+    positions = numpy.repeat(-1, row_count)
+    if previous is not None:
+        previous_positions = dict(zip(previous[0].tolist(), range(len(previous[0]))))
+        positions = numpy.array([previous_positions.get(oid, -1) for oid in oids.tolist()], dtype="i8")
+    known = positions >= 0
+    changed = {}
+    for field_name in tracked:
+        changed[field_name.lower()] = ~known
+        if known.any():
+            changed[field_name.lower()][known] = ~null_equal_array(
+                    columns[field_name.lower()][known], previous[1][field_name.lower()][positions[known]])
+    # Follow the dependency graph: a derived field is affected by its own changes and by its affected inputs. Derived
+    # values set by the user (edited, or already held by a new row) are kept, only nulls are filled.
+    width_key = streetWidth.lower()
+    affected = dict(changed)
+    affected[lanes_field.lower()] = changed.get(width_key, ~known)
+    edited = {}
+    for target in targets:
+        mask = changed.get(target.lower(), numpy.zeros(row_count, dtype=bool)).copy()
+        edited[target.lower()] = mask & ~is_null_array(columns[target.lower()])
+        for name in rules.inputs[target]:
+            mask |= affected.get(name, False)
+        affected[target.lower()] = mask & ~edited[target.lower()]
+    update = numpy.zeros(row_count, dtype=bool)
+    for target in targets:
+        update |= affected[target.lower()]
+    # Rows with edited derived values are evaluated too, to infer their lanes and check them against their rules.
+    check = update | affected[lanes_field.lower()]
+    for target in targets:
+        check |= edited[target.lower()]
+    check_count = int(check.sum())
+    lanes = numpy.repeat(numpy.nan, row_count)
+    if known.any():
+        lanes[known] = previous[1][lanes_field.lower()][positions[known]]
+    subset = dict((name, column[check]) for name, column in columns.items())
+    infer = affected[lanes_field.lower()][check]
+    if infer.any() and width_key in subset and Lane_Width.lower() in subset:
+        # The width of zero lanes is the width of everything but the lanes.
+        subset[lanes_field.lower()] = numpy.zeros(check_count)
+        sides = rules.evaluate(subset, check_count)[streetWidth]
+        inferred = numpy.round((subset[width_key] - sides) / subset[Lane_Width.lower()])
+        sub_lanes = lanes[check]
+        sub_lanes[infer] = numpy.maximum(inferred[infer], 0)
+        lanes[check] = sub_lanes
+    subset[lanes_field.lower()] = lanes[check]
+    results = rules.evaluate(subset, check_count)
+    write = numpy.zeros(check_count, dtype=bool)
+    for target in targets:
+        current = subset[target.lower()]
+        inconsistent = edited[target.lower()][check] & ~consistent_array(current, results[target])
+        if inconsistent.any():
+            report_inconsistent_rows(target, oids[check][inconsistent])
+        values = numpy.where(affected[target.lower()][check], results[target], current)
+        write |= ~null_equal_array(values, current)
+        columns[target.lower()][check] = values  # The dependency table records the values after this update
+        results[target] = values
+    write_oids = oids[check][write]
+    derived_columns = OrderedDict((target, nulls_to_none(values[write])) for target, values in results.items())
+    arc_print("{0} of {1} rows have changed inputs, writing the derived fields of {2} rows in one pass.".format(
+            str(int(update.sum())), str(row_count), str(len(write_oids))), True)
+    field_names = dict(field_names or {})
+    for target in targets:
+        field_names.setdefault(target, existing.get(target.lower(), target))
+    written = write_columns(in_features, field_names, derived_columns, write_oids, where_clause)
+    columns[lanes_field.lower()] = lanes
+    if where_clause and previous is not None:
+        # Keep the dependencies of the rows outside the where clause
+        updated_oids = set(oids.tolist())
+        outside = numpy.array([oid not in updated_oids for oid in previous[0].tolist()], dtype=bool)
+        oids = numpy.concatenate([oids, previous[0][outside]])
+        columns = dict((name, numpy.concatenate([columns[name], previous[1][name][outside]]))
+                       for name in [field_name.lower() for field_name in tracked + [lanes_field]])
+    save_street_dependencies(dependency_path, oids, columns, tracked + [lanes_field])
+    return written
+
+
 # Main Function
 
 # Function Definitions
-def populate_street_parameters(in_features, group_id, filter_query, comp_st_attr, default_st_param, rand_comp_str):
+def populate_street_parameters(in_features, group_id, filter_query, comp_st_attr, default_st_param, rand_comp_str,
+                               seed=None, profile_path=None, workers=1, update_mode=update_all, street_rules=None,
+                               recompute_derived=False):
     """Add CityEngine street parameter fields and Complete Street Rule attribute fields to a feature class,
     and optionally populate them with default or randomized values.
 
     Street shape parameters (streetWidth, laneWidth, sidewalkWidth, etc.) are always added.
     Complete Street Rule attributes (bike lanes, parking, transit, sidewalk amenities, etc.) are added
     only when comp_st_attr is True.  Default/random values are written only when the corresponding
-    boolean flags are True.
+    boolean flags are True. Values are generated as whole columns, each chunk of rows in OID order from its own
+    stream of seed, and written back in a single cursor pass.
 
     Parameters
     ----------
     in_features : str
         Path to the input polyline feature class.
-    group_id :
-        Reserved for future grouping logic; not currently used.
-    filter_query :
-        Reserved for future filtering logic; not currently used.
+    group_id : str
+        Field grouping the streets, such as a corridor ID. Values are generated once per distinct value and
+        broadcast to every street of the group, so a corridor shares one cross section. None generates values per
+        street.
+    filter_query : str
+        Where clause limiting the streets whose values are populated. None populates every street.
     comp_st_attr : bool
         If True, add all Complete Street Rule attribute fields.
     default_st_param : bool
         If True, populate street parameter and attribute fields with randomized plausible default values.
     rand_comp_str : bool
         If True (and comp_st_attr is also True), populate Complete Street Rule fields with randomized values.
+    seed : int, optional
+        Seed of the random streams. The same seed gives the same values on the same NumPy version, whatever the
+        worker count. A seed is drawn and reported if none is given.
+    profile_path : str, optional
+        JSON street profile overriding distributions of default_street_profile (see load_street_profile).
+    workers : int, optional
+        Number of processes generating values (default 1). Rows are written back by this process only.
+    update_mode : str, optional
+        update_all (default) writes every row. update_fill_missing only writes the rows with a null target field,
+        and only fills their nulls. update_changed_only only writes the rows that are new or whose other
+        attributes changed since the last run, as recorded in the street manifest; every row is written when the
+        run settings changed.
+    street_rules : str, optional
+        Street rules deriving fields from existing columns, or a text file holding them (see StreetRules). They
+        are applied to the rows matching filter_query after any default values are written.
+    recompute_derived : bool, optional
+        If True, recompute the fields derived from other Complete Street fields (see derived_street_rules) for the
+        rows whose inputs changed since the last recompute, after any default values and street rules are written.
     """
     try:
         arc_print("Defining workspace strings and street parameter street names.")
@@ -352,219 +1273,95 @@ def populate_street_parameters(in_features, group_id, filter_query, comp_st_attr
         # Street Parameters
         name = os.path.split(in_features)[1]
         workspace = os.path.split(in_features)[0]
-        spstreetWidth = arcpy.ValidateFieldName(streetWidth, workspace)
-        spsidewalkWidthLeft = arcpy.ValidateFieldName(sidewalkWidthLeft, workspace)
-        spsidewalkWidthRight = arcpy.ValidateFieldName(sidewalkWidthRight, workspace)
-        spstoffset = arcpy.ValidateFieldName(streetOffset, workspace)
-        spprecision = arcpy.ValidateFieldName(precision, workspace)
-        splaneWidth = arcpy.ValidateFieldName(laneWidth, workspace)
-        sptype = arcpy.ValidateFieldName(type, workspace)
-        spcornerStyle = arcpy.ValidateFieldName(cornerStyle, workspace)
-
+        # The schema is diffed against the existing fields once and every missing field is added in one call.
+        schema = street_parameter_schema
         arc_print("Adding Core Street Parameter Fields for: {0}".format(str(name)), True)
-        add_new_field(in_features, spstreetWidth, "DOUBLE", field_alias=streetWidth)
-        add_new_field(in_features, spsidewalkWidthLeft, "DOUBLE",
-                      field_alias=sidewalkWidthLeft)
-        add_new_field(in_features, spsidewalkWidthRight, "DOUBLE",
-                      field_alias=sidewalkWidthRight)
-        add_new_field(in_features, spstoffset, "DOUBLE", field_alias=streetOffset)
-        add_new_field(in_features, spprecision, "DOUBLE", field_alias=precision)
-        add_new_field(in_features, splaneWidth, "DOUBLE", field_alias=laneWidth)
-        add_new_field(in_features, sptype, "TEXT", field_alias="Intersection type")
-        add_new_field(in_features, spcornerStyle, "TEXT", field_alias=cornerStyle)
-
         if comp_st_attr:
             arc_print("Adding Core Complete Street Rule Attributes Fields for: {0}".format(str(name)), True)
-            # Section 1
-            add_new_field(in_features, arcpy.ValidateFieldName(Lane_Distribution, workspace), "DOUBLE",
-                          field_alias=Lane_Distribution)
-            add_new_field(in_features, arcpy.ValidateFieldName(Lane_Width, workspace), "DOUBLE",
-                          field_alias=Lane_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Speed_Limit_in_MPH, workspace), "DOUBLE",
-                          field_alias=Speed_Limit_in_MPH)
-            add_new_field(in_features, arcpy.ValidateFieldName(Stop_Begin, workspace), "TEXT", field_alias=Stop_Begin)
-            add_new_field(in_features, arcpy.ValidateFieldName(Stop_End, workspace), "TEXT", field_alias=Stop_End)
-            # Section 2
-            add_new_field(in_features, arcpy.ValidateFieldName(Crosswalk_Begin, workspace), "TEXT",
-                          field_alias=Crosswalk_Begin)
-            add_new_field(in_features, arcpy.ValidateFieldName(Crosswalk_End, workspace), "TEXT",
-                          field_alias=Crosswalk_End)
-            add_new_field(in_features, arcpy.ValidateFieldName(Begin_Crosswalk_To_Stop_Bar, workspace), "DOUBLE",
-                          field_alias=Begin_Crosswalk_To_Stop_Bar)
-            add_new_field(in_features, arcpy.ValidateFieldName(End_Crosswalk_To_Stop_Bar, workspace), "DOUBLE",
-                          field_alias=End_Crosswalk_To_Stop_Bar)
-            add_new_field(in_features, arcpy.ValidateFieldName(Crosswalk_Width, workspace), "DOUBLE",
-                          field_alias=Crosswalk_Width)
-            # Section 3
-            add_new_field(in_features, arcpy.ValidateFieldName(Right_Parking_Type, workspace), "TEXT",
-                          field_alias=Right_Parking_Type)
-            add_new_field(in_features, arcpy.ValidateFieldName(Right_Parking_Width, workspace), "DOUBLE",
-                          field_alias=Right_Parking_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Left_Parking_Type, workspace), "TEXT",
-                          field_alias=Left_Parking_Type)
-            add_new_field(in_features, arcpy.ValidateFieldName(Left_Parking_Width, workspace), "DOUBLE",
-                          field_alias=Left_Parking_Width)
-            # Section 4
-            add_new_field(in_features, arcpy.ValidateFieldName(Center_Type, workspace), "TEXT",
-                          field_alias=Center_Type)
-            add_new_field(in_features, arcpy.ValidateFieldName(Center_Width, workspace), "DOUBLE",
-                          field_alias=Center_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Planting_and_Walkway_Layout, workspace), "TEXT",
-                          field_alias=Planting_and_Walkway_Layout)
-            add_new_field(in_features, arcpy.ValidateFieldName(Boulevard_Inside_Width, workspace), "DOUBLE",
-                          field_alias=Boulevard_Inside_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Boulevard_Configuration, workspace), "TEXT",
-                          field_alias=Boulevard_Configuration)
-            add_new_field(in_features, arcpy.ValidateFieldName(Median_Ground_Cover, workspace), "TEXT",
-                          field_alias=Median_Ground_Cover)
-            add_new_field(in_features, arcpy.ValidateFieldName(Median_Planting_Length, workspace), "DOUBLE",
-                          field_alias=Median_Planting_Length)
-            # Section 5
-            add_new_field(in_features, arcpy.ValidateFieldName(Median_Bus_Stop, workspace), "TEXT",
-                          field_alias=Median_Bus_Stop)
-            add_new_field(in_features, arcpy.ValidateFieldName(Median_Bus_Stop_Location, workspace), "TEXT",
-                          field_alias=Median_Bus_Stop_Location)
-            # Section 6
-            add_new_field(in_features, arcpy.ValidateFieldName(Transit_Lane, workspace), "TEXT",
-                          field_alias=Transit_Lane)
-            add_new_field(in_features, arcpy.ValidateFieldName(Transit_Lane_Sides, workspace), "TEXT",
-                          field_alias=Transit_Lane_Sides)
-            add_new_field(in_features, arcpy.ValidateFieldName(Transit_Lane_Width, workspace), "DOUBLE",
-                          field_alias=Transit_Lane_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Transit_Lane_Position, workspace), "TEXT",
-                          field_alias=Transit_Lane_Position)
-            # Section 7
-            add_new_field(in_features, arcpy.ValidateFieldName(Right_Bike_Lane_Width, workspace), "DOUBLE",
-                          field_alias=Right_Bike_Lane_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Left_Bike_Lane_Width, workspace), "DOUBLE",
-                          field_alias=Left_Bike_Lane_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Right_Buffer_Width, workspace), "DOUBLE",
-                          field_alias=Right_Buffer_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Left_Buffer_Width, workspace), "DOUBLE",
-                          field_alias=Left_Buffer_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Buffer_Type, workspace), "TEXT",
-                          field_alias=Buffer_Type)
-            add_new_field(in_features, arcpy.ValidateFieldName(Buffer_Protection, workspace), "TEXT",
-                          field_alias=Buffer_Protection)
-            add_new_field(in_features, arcpy.ValidateFieldName(Parking_Protection, workspace), "TEXT",
-                          field_alias=Parking_Protection)
-            add_new_field(in_features, arcpy.ValidateFieldName(Left_Bike_Box, workspace), "TEXT",
-                          field_alias=Left_Bike_Box)
-            add_new_field(in_features, arcpy.ValidateFieldName(Right_Bike_Box, workspace), "TEXT",
-                          field_alias=Right_Bike_Box)
-            add_new_field(in_features, arcpy.ValidateFieldName(Bike_Box_Color_Override, workspace), "TEXT",
-                          field_alias=Bike_Box_Color_Override)
-            # Section 8
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Ground_Cover, workspace), "TEXT",
-                          field_alias=Sidewalk_Ground_Cover)
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Planting_Width, workspace), "DOUBLE",
-                          field_alias=Sidewalk_Planting_Width)
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Planting_Length, workspace), "DOUBLE",
-                          field_alias=Sidewalk_Planting_Length)
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Planting_Spacing, workspace), "DOUBLE",
-                          field_alias=Sidewalk_Planting_Spacing)
-            # Section 9
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Bus_Stop, workspace), "TEXT",
-                          field_alias=Sidewalk_Bus_Stop)
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Bus_Stop_Location, workspace), "TEXT",
-                          field_alias=Sidewalk_Bus_Stop_Location)
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Benches, workspace), "TEXT",
-                          field_alias=Sidewalk_Benches)
-            add_new_field(in_features, arcpy.ValidateFieldName(Parking_Meters, workspace), "TEXT",
-                          field_alias=Parking_Meters)
-            add_new_field(in_features, arcpy.ValidateFieldName(Sidewalk_Street_Lamps, workspace), "TEXT",
-                          field_alias=Sidewalk_Street_Lamps)
-            add_new_field(in_features, arcpy.ValidateFieldName(Traffic_Lights, workspace), "TEXT",
-                          field_alias=Traffic_Lights)
-            # Section 10
-            add_new_field(in_features, arcpy.ValidateFieldName(Bridge_Display, workspace), "TEXT",
-                          field_alias=Bridge_Display)
+            schema = street_parameter_schema + complete_street_schema
+        field_names = add_schema_fields(in_features, schema, workspace)
+        field_names.update((field_name, valid_field_name(field_name, workspace))
+                           for field_name in complete_street_fields if field_name not in field_names)
         if default_st_param:
             arc_print("Calculating default street parameter values.", True)
-            cursor = arcpy.da.UpdateCursor(in_features,
-                                           [spstreetWidth, spstoffset, spsidewalkWidthRight, spsidewalkWidthLeft,
-                                            spprecision, splaneWidth, sptype, spcornerStyle,
-                                            arcpy.ValidateFieldName(Stop_Begin, workspace),
-                                            arcpy.ValidateFieldName(Stop_End, workspace),
-                                            arcpy.ValidateFieldName(Lane_Width, workspace),
-                                            arcpy.ValidateFieldName(Begin_Crosswalk_To_Stop_Bar, workspace),
-                                            arcpy.ValidateFieldName(End_Crosswalk_To_Stop_Bar, workspace),
-                                            arcpy.ValidateFieldName(Transit_Lane, workspace),
-                                            arcpy.ValidateFieldName(Transit_Lane_Width, workspace),
-                                            arcpy.ValidateFieldName(Right_Bike_Lane_Width, workspace),
-                                            arcpy.ValidateFieldName(Left_Bike_Lane_Width, workspace),
-                                            arcpy.ValidateFieldName(Right_Buffer_Width, workspace),
-                                            arcpy.ValidateFieldName(Left_Buffer_Width, workspace),
-                                            arcpy.ValidateFieldName(Buffer_Type, workspace),
-                                            arcpy.ValidateFieldName(Right_Parking_Type, workspace),
-                                            arcpy.ValidateFieldName(Left_Parking_Type, workspace),
-                                            arcpy.ValidateFieldName(Sidewalk_Ground_Cover, workspace),
-                                            arcpy.ValidateFieldName(Bridge_Display, workspace),
-                                            arcpy.ValidateFieldName(Crosswalk_End, workspace),
-                                            arcpy.ValidateFieldName(Crosswalk_Begin, workspace)])
-            counter = 1
-            for spRow in cursor:
-                try:
-                    arc_print("Calculating row number {0}".format(str(counter)))
-                    sidewalkWidth = random.choice([0,1.4,1.4,1.5,1.6,2,2.5,2.6,2.8,3,4,5])
-                    lanesWidth = 3.5
-                    strWidth = even_street_widths(random.randint(8, 35), (lanesWidth - .2))
-                    spRow[0] = strWidth
-                    spRow[1] = 0
-                    spRow[2] = sidewalkWidth
-                    spRow[3] = sidewalkWidth
-                    spRow[4] = .5
-                    spRow[5] = lanesWidth
-                    spRow[6] = "Crossing"
-                    spRow[7] = "Arcs"
-                    arc_print("Defined street parameters for row number {0}".format(str(counter)))
-                    if rand_comp_str and comp_st_attr:
-                        stopChoice = random.choice(
-                                ["line only", "with stop marking", "arrows on all lanes", "arrows on side lanes",
-                                 "arrows for right turn"])
-                        crswlkChoice = random.choice(
-                                ["none", "continental", "ladder", "transverse", "custom", "ladder custom"])
-                        compLaneWidth = random.choice([3.3528, 3.6576])
-                        TranLaneWidth = 3.3528
-                        bikeChoice = random.choice([0, 0, 0, 1.4, 1.4, 1.8, 2])
-                        buffChoice = buff_dist(bikeChoice)
-                        prkChoice = random.choice(["None", "None", "Parallel"])
-                        parkWidth = parking_width(prkChoice)
-                        stopGap = random.randint(1, 2) + .4
-                        buffType = random.choice(["Painted Stripes", "Painted Stripes", "Curb Buffer with Plantings",
-                                                  "Cycle Track With Planters", "Cycle Track With Tubular Markers"])
-                        centerWidth = 0.1016 * 4
-                        spareSpace = 0.3
-                        compStrWidth = even_street_widths(random.randint(1, 8), (compLaneWidth),
-                                                          ((parkWidth * 2) + (bikeChoice * 2) + (
-                                                           buffChoice * 2) + centerWidth + spareSpace))
-                        spRow[0] = compStrWidth
-                        spRow[8] = stopChoice
-                        spRow[9] = stopChoice
-                        spRow[10] = compLaneWidth
-                        spRow[11] = stopGap
-                        spRow[12] = stopGap
-                        spRow[13] = random.choice(["None", "None", "None", "None", "Bus Lane"])
-                        spRow[14] = TranLaneWidth
-                        spRow[15] = bikeChoice
-                        spRow[16] = bikeChoice
-                        spRow[17] = buffChoice
-                        spRow[18] = buffChoice
-                        spRow[19] = buffType
-                        spRow[20] = prkChoice
-                        spRow[21] = prkChoice
-                        spRow[22] = random.choice(["None", "Standard Grass"])
-                        spRow[23] = "Concrete Extrusion Only"
-                        spRow[24] = crswlkChoice
-                        spRow[25] = crswlkChoice
-                        arc_print("Defined Complete Street Attributes for row number {0}".format(str(counter)))
-                    counter += 1
-                    cursor.updateRow(spRow)
-                except:
-                    arc_print("Skipped row on iteration {0}".format(str(counter)))
-                    counter += 1
-                    pass
-            del cursor
+            if update_mode not in (update_all, update_fill_missing, update_changed_only):
+                raise ValueError("Unknown update mode {0}. Use {1}, {2} or {3}.".format(
+                        update_mode, update_all, update_fill_missing, update_changed_only))
+            where_clause = filter_query or None
+            rand_comp_str = bool(rand_comp_str and comp_st_attr)
+            target_fields = [field_names[field_name] for field_name in default_parameter_fields +
+                             (random_complete_street_fields if rand_comp_str else [])]
+            if update_mode == update_fill_missing:
+                null_clause = null_where_clause(in_features, target_fields)
+                where_clause = "({0}) AND ({1})".format(where_clause, null_clause) if where_clause else null_clause
+            elif update_mode == update_changed_only:
+                manifest_path = core.companionTablePath(in_features, street_manifest_suffix)
+                settings = core.rowDigest([seed, profile_path, group_id, rand_comp_str] + target_fields)
+                previous_settings, manifest = read_street_manifest(manifest_path)
+                hashes = street_input_hashes(in_features, [field_names[field_name] for field_name in field_names],
+                                             filter_query)
+                if previous_settings != settings:
+                    arc_print("The run settings changed or no street manifest was found, updating every row.", True)
+                    manifest = {}
+                changed = set(oid for oid, digest in hashes.items() if manifest.get(oid) != digest)
+                arc_print("{0} of {1} rows are new or changed.".format(str(len(changed)), str(len(hashes))), True)
+            if seed is None:
+                seed = int(random_integers(random_generator(), 0, 2 ** 31 - 1, 1)[0])
+                arc_print("Generating values with seed {0}. Set it as the seed to repeat this run.".format(seed),
+                          True)
+            target_names = default_parameter_fields + (random_complete_street_fields if rand_comp_str else [])
+            member_values = {}
+            if group_id and update_mode != update_all:
+                # A group keeps one cross section: the rows an update selects take the values of a member of their
+                # group the update leaves alone, and only groups without one get new values.
+                if update_mode == update_changed_only:
+                    selected_oids = changed
+                else:
+                    selected_oids = set(read_street_groups(in_features, where_clause)[0].tolist())
+                oids, groups = read_street_groups(in_features, filter_query, group_id)
+                selected = numpy.array([oid in selected_oids for oid in oids.tolist()], dtype=bool)
+                member_values = group_member_values(in_features, target_fields, oids, groups, selected,
+                                                    filter_query)
+                oids, groups = oids[selected], groups[selected]
+            else:
+                oids, groups = read_street_groups(in_features, where_clause, group_id)
+                if update_mode == update_changed_only:
+                    keep = numpy.array([oid in changed for oid in oids.tolist()], dtype=bool)
+                    oids, groups = oids[keep], groups[keep]
+            reuse = numpy.array([group in member_values for group in groups.tolist()], dtype=bool)
+            # Renumber the groups drawn in this run, keeping the group order
+            new_groups = numpy.unique(groups[~reuse], return_inverse=True)[1].reshape(-1)
+            group_count = int(new_groups.max()) + 1 if len(new_groups) else 0
+            profile = load_street_profile(profile_path)
+            columns = generate_street_chunks(group_count, int(seed), rand_comp_str, profile, workers)
+            # Broadcast each group's values to its member rows
+            columns = OrderedDict((field_name, column[new_groups]) for field_name, column in columns.items())
+            if reuse.any():
+                arc_print("Reusing the values of existing group members for {0} rows.".format(
+                        str(int(reuse.sum()))), True)
+                for index, field_name in enumerate(target_names):
+                    column = numpy.empty(len(oids), dtype=object)
+                    column[~reuse] = columns[field_name]
+                    column[reuse] = [member_values[group][index] for group in groups[reuse].tolist()]
+                    columns[field_name] = column
+            arc_print("Generated {0} columns for {1} groups of {2} rows, writing them in one pass.".format(
+                    str(len(columns)), str(group_count), str(len(oids))), True)
+            written = write_columns(in_features, field_names, columns, oids, where_clause,
+                                    update_mode == update_fill_missing)
+            if update_mode == update_changed_only:
+                existing = set(hashes) if not filter_query else set(read_street_groups(in_features)[0].tolist())
+                manifest = dict((oid, digest) for oid, digest in manifest.items() if oid in existing)
+                manifest.update((oid, hashes[oid]) for oid in oids.tolist())
+                save_street_manifest(manifest_path, settings, manifest)
+            arc_print("Wrote default street parameter values to {0} rows.".format(str(written)), True)
+        if street_rules:
+            arc_print("Deriving street parameters from street rules.", True)
+            written = apply_street_rules(in_features, street_rules, field_names, filter_query)
+            arc_print("Wrote derived street parameter values to {0} rows.".format(str(written)), True)
+        if recompute_derived:
+            arc_print("Recomputing the derived Complete Street fields of changed rows.", True)
+            written = recompute_derived_fields(in_features, field_names, filter_query)
+            arc_print("Wrote recomputed derived values to {0} rows.".format(str(written)), True)
 
     except arcpy.ExecuteError:
         print(arcpy.GetMessages(2))
@@ -580,5 +1377,16 @@ if __name__ == "__main__":
     add_cs_rule_attributes = arcpy.GetParameter(1)
     create_default_parameters = arcpy.GetParameter(2)
     create_random_attr = arcpy.GetParameter(3)
-    populate_street_parameters(in_feature_class, add_cs_rule_attributes, create_default_parameters, create_random_attr)
+    # Parameter 4 is the derived Output Feature of the toolbox, so the script arguments start at 5.
+    seed = core.optionalParameter(5, None)  # optional seed, for repeatable values
+    street_profile = core.optionalParameter(6, None, True)  # optional JSON street profile
+    workers = core.optionalParameter(7, 1)  # processes generating values
+    group_id = core.optionalParameter(8, None, True)  # streets sharing a value share a cross section
+    filter_query = core.optionalParameter(9, None, True)  # limits the streets populated
+    update_mode = core.optionalParameter(10, update_all, True)  # ALL, FILL_MISSING or CHANGED_ONLY
+    street_rules = core.optionalParameter(11, None, True)  # rules text or rules file
+    recompute_derived = core.optionalParameter(12, False)  # keep derived widths consistent with their components
+    populate_street_parameters(in_feature_class, group_id, filter_query, add_cs_rule_attributes,
+                               create_default_parameters, create_random_attr, seed, street_profile, workers,
+                               update_mode, street_rules, recompute_derived)
 
@@ -0,0 +1,246 @@
+# --------------------------------
+# Name: PrepareCEAssociations.py
+# Purpose: This scripting tool writes any combination of the street, lot, and block associations of the
+# PrepareCE*Associations tools for one input in a single pass: the input is read once, the anchor point is computed
+# once, and every requested output is written from the same stream of rows.
+# Current Owner: David Wasserman
+# Last Modified: 10/18/2026
+# Copyright:   (c) Co-Adaptive- David Wasserman
+# ArcGIS Version:   10.3
+# Python Version:   2.7
+# License
+# Copyright 2015 David J. Wasserman
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# --------------------------------
+# Import Modules
+import arcpy
+import CEAssociationsCore as core
+
+# Function Definitions
+def funcReport(function=None,reportBool=False):
+    """This decorator function is designed to be used as a wrapper with other functions to enable basic try and except
+     reporting (if function fails it will report the name of the function that failed and its arguments. If a report
+      boolean is true the function will report inputs and outputs of a function.-David Wasserman"""
+    def funcReport_Decorator(function):
+        def funcWrapper(*args, **kwargs):
+            try:
+                funcResult = function(*args, **kwargs)
+                if reportBool:
+                    print("Function:{0}".format(str(function.__name__)))
+                    print("     Input(s):{0}".format(str(args)))
+                    print("     Ouput(s):{0}".format(str(funcResult)))
+                return funcResult
+            except Exception as e:
+                print("{0} - function failed -|- Function arguments were:{1}.".format(str(function.__name__), str(args)))
+                print(e.args[0])
+        return funcWrapper
+    if not function:  # User passed in a bool argument
+        def waiting_for_function(function):
+            return funcReport_Decorator(function)
+        return waiting_for_function
+    else:
+        return funcReport_Decorator(function)
+
+
+def arcToolReport(function=None, arcToolMessageBool=False, arcProgressorBool=False):
+    """This decorator function is designed to be used as a wrapper with other GIS functions to enable basic try and except
+     reporting (if function fails it will report the name of the function that failed and its arguments. If a report
+      boolean is true the function will report inputs and outputs of a function.-David Wasserman"""
+    def arcToolReport_Decorator(function):
+        def funcWrapper(*args, **kwargs):
+            try:
+                funcResult = function(*args, **kwargs)
+                if arcToolMessageBool:
+                    arcpy.AddMessage("Function:{0}".format(str(function.__name__)))
+                    arcpy.AddMessage("     Input(s):{0}".format(str(args)))
+                    arcpy.AddMessage("     Ouput(s):{0}".format(str(funcResult)))
+                if arcProgressorBool:
+                    arcpy.SetProgressorLabel("Function:{0}".format(str(function.__name__)))
+                    arcpy.SetProgressorLabel("     Input(s):{0}".format(str(args)))
+                    arcpy.SetProgressorLabel("     Ouput(s):{0}".format(str(funcResult)))
+                return funcResult
+            except Exception as e:
+                arcpy.AddMessage(
+                    "{0} - function failed -|- Function arguments were:{1}.".format(str(function.__name__), str(args)))
+                print("{0} - function failed -|- Function arguments were:{1}.".format(str(function.__name__), str(args)))
+                print(e.args[0])
+        return funcWrapper
+    if not function:  # User passed in a bool argument
+        def waiting_for_function(function):
+            return  arcToolReport_Decorator(function)
+        return waiting_for_function
+    else:
+        return arcToolReport_Decorator(function)
+
+@arcToolReport
+def arc_print(string, progressor_Bool=False):
+    """ This function is used to simplify using arcpy reporting for tool creation,if progressor bool is true it will
+    create a tool label."""
+    casted_string = str(string)
+    if progressor_Bool:
+        arcpy.SetProgressorLabel(casted_string)
+        arcpy.AddMessage(casted_string)
+        print(casted_string)
+    else:
+        arcpy.AddMessage(casted_string)
+        print(casted_string)
+
+
+@arcToolReport
+def FieldExist(featureclass, fieldname):
+    """ Check if a field in a feature class field exists and return true it does, false if not."""
+    fieldList = arcpy.ListFields(featureclass, fieldname)
+    fieldCount = len(fieldList)
+    if (fieldCount >= 1) and fieldname.strip():  # If there is one or more of this field return true
+        return True
+    else:
+        return False
+
+
+# Main Function
+@arcToolReport
+def do_analysis(inFeatureClass, streetFeatureClass=None, streetLength=0, streetLengthField=None, lotFeatureClass=None,
+                lotArea=0, lotAreaField=None, blockFeatureClass=None, blockLength=0, blockLengthField=None,
+                blockWidth=0, referenceFeatureClass=None, directWebMercator=False, anchorXY=None, sizeTolerance=0,
+                chunkSize=50000, intermediateMode="MEMORY", spillThreshold=core.memorySpillRows, bulkLoad=False,
+                gridLayout=False, gridGap=0, workers=1, slimOutput=False, joinView=False):
+    """This function will create the street, lot, and block associations requested (any output left empty is
+    skipped) in one location based on the incoming reference centroid, for the purpose of being used for data driven
+    design applications in CityEngine. Each output is built like the matching PrepareCE*Associations tool and has
+    its own size field and size value, but the input is only read once and the anchor is only computed once.
+    Intermediates are kept in memory unless the largest would hold more than spillThreshold rows, or are written
+    to the scratch geodatabase or next to the first output, depending on intermediateMode. With bulkLoad, spatial
+    index maintenance is deferred until every row is inserted. Insert throughput is reported either way. If
+    gridLayout is true, each output is packed into a non-overlapping grid around the anchor, gridGap apart, and
+    the grid row, column, and offset of each feature are written. With more than one worker (and no grid layout or
+    slim output), the input is split into OID ranges built in a pool of worker processes, and the results of each
+    output are merged in order and projected once. If slimOutput is true, each output only holds geometry and
+    UniqueFeatID (and CEStreetName for blocks), the input attributes are written once to a separate table per
+    output keyed by it, and joinView saves a layer file joining each output to its table. Every output is written
+    by the same engine as the matching PrepareCE*Associations tool."""
+    try:
+        arcpy.env.overwriteOutput = True
+        arc_print("Gathering feature information.", True)
+        desc = arcpy.Describe(inFeatureClass)
+        arc_print("The shape type is {0}, and the current spatial reference is: {1}".format(
+                str(desc.shapeType), str(desc.spatialReference.name)), True)
+        outputs = []
+        for outFeatureClass, kind, size, sizeField in [(streetFeatureClass, "street", streetLength, streetLengthField),
+                                                       (lotFeatureClass, "lot", lotArea, lotAreaField),
+                                                       (blockFeatureClass, "block", blockLength, blockLengthField)]:
+            if not outFeatureClass or outFeatureClass == "#":
+                continue
+            if arcpy.Exists(outFeatureClass):
+                arc_print("Deleting existing {0} output feature.".format(kind), True)
+                arcpy.Delete_management(outFeatureClass)
+            if sizeField and FieldExist(inFeatureClass, sizeField):
+                arc_print("Using size field {0} to create {1} geometries.".format(sizeField, kind), True)
+            else:
+                arc_print("Using size input value to create same sized {0} geometries.".format(kind), True)
+                sizeField = None
+            outputs.append(core.AssociationOutput(outFeatureClass, kind, sizeField, size, blockWidth, sizeTolerance,
+                                                  slimOutput))
+        if not outputs:
+            arc_print("No street, lot, or block output was set. Check arguments.", True)
+            arcpy.AddError("No street, lot, or block output was set. Check arguments.")
+            return
+        # Get the anchor point every output geometry is built on (for pointGeo)
+        if anchorXY is not None:
+            arc_print("Using the explicit anchor coordinate.", True)
+        elif arcpy.Exists(referenceFeatureClass) and referenceFeatureClass != "#":
+            arc_print("Calculating the mean center of the reference feature class.", True)
+        else:
+            arc_print("Calculating the mean center of the input feature class.", True)
+        pointGeo = core.anchorPoint(inFeatureClass, referenceFeatureClass, anchorXY)
+        if pointGeo is None:
+            arc_print("No feature geometries were found to calculate a mean center from. Check arguments.", True)
+            arcpy.AddError("No feature geometries were found to calculate a mean center from. Check arguments.")
+            return
+        tempWorkspace = None
+        if not directWebMercator:
+            largestOutput = max(len(output.partNames or [None]) for output in outputs) * core.rowCount(inFeatureClass)
+            tempWorkspace = core.intermediateWorkspace(intermediateMode, outputs[0].outFeatureClass, largestOutput,
+                                                       spillThreshold)
+            arc_print("Writing intermediates to the {0} workspace.".format(tempWorkspace), True)
+        arc_print("Writing the {0} outputs from a single scan of the input.".format(
+                ", ".join(output.kind for output in outputs)), True)
+        insertTimer = core.InsertTimer()
+        parallel = int(workers or 1) > 1 and not (slimOutput or gridLayout)
+        if slimOutput:
+            arc_print("Writing geometry and keys to slim feature classes and attributes to separate tables.", True)
+        if parallel:
+            arc_print("Building the outputs in {0} worker processes.".format(str(workers)), True)
+            counts = core.writePartitionedOutputs(inFeatureClass, outputs, pointGeo, workers, directWebMercator,
+                                                  chunkSize, tempWorkspace, insertTimer)
+        else:
+            if int(workers or 1) > 1:
+                arc_print("Slim and grid layout runs are written by a single process.", True)
+            counts = core.writeAssociationOutputs(inFeatureClass, outputs, pointGeo, directWebMercator, chunkSize,
+                                                  tempWorkspace, bulkLoad, insertTimer,
+                                                  gridGap if gridLayout else None)
+        arc_print(insertTimer.report(), True)
+        for output, count in zip(outputs, counts):
+            # Each worker interns its own templates, so the shared interners are only used by a single process run.
+            arc_print("Wrote {0} input features to the {1} output. {2}".format(
+                    str(count), output.kind, "" if parallel else output.interner.report()), True)
+            if output.rejects.written:
+                arcpy.AddWarning("{0} input features had sizes that were rejected for the {1} output, see {2}.".format(
+                        str(output.rejects.written), output.kind, output.rejects.tablePath))
+            if output.attributeTable:
+                arc_print("Attributes of the {0} output were written to {1}, keyed by {2}.".format(
+                        output.kind, output.attributeTable, core.slimKeyField), True)
+                if joinView:
+                    arc_print("Saved a join view of the {0} output and its attributes to {1}.".format(
+                            output.kind, core.createJoinView(output.outFeatureClass, output.attributeTable)), True)
+        peakMemory = core.peakMemoryMB()
+        if peakMemory is not None:
+            arc_print("Peak process memory was {0:.1f} MB.".format(peakMemory), True)
+    except arcpy.ExecuteError:
+        print(arcpy.GetMessages(2))
+    except Exception as e:
+        print(e.args[0])
+
+
+# End do_analysis function
+# Main Script
+if __name__ == "__main__":
+    # Define Inputs
+    inFeatureClass = arcpy.GetParameterAsText(0)
+    streetFeatureClass = arcpy.GetParameterAsText(1)  # optional street output
+    streetLength = arcpy.GetParameter(2)  # Units of current feature class
+    streetLengthField = arcpy.GetParameterAsText(3)
+    lotFeatureClass = arcpy.GetParameterAsText(4)  # optional lot output
+    lotArea = arcpy.GetParameter(5)
+    lotAreaField = arcpy.GetParameterAsText(6)
+    blockFeatureClass = arcpy.GetParameterAsText(7)  # optional block output
+    blockLength = arcpy.GetParameter(8)
+    blockLengthField = arcpy.GetParameterAsText(9)
+    blockWidth = arcpy.GetParameter(10)
+    referenceFeatureClassCentroid = arcpy.GetParameterAsText(11)  # optional reference FC to get centroid from
+    directWebMercator = core.optionalParameter(12, False)  # Project only the centroid and write output in one pass
+    anchorCoordinate = core.parseAnchorCoordinate(core.optionalParameter(13, None, True))  # optional explicit X Y
+    sizeTolerance = core.optionalParameter(14, 0)  # Snap sizes to this step so more features share a template
+    chunkSize = core.optionalParameter(15, 50000)  # Input rows held in memory at once
+    intermediateMode = core.optionalParameter(16, "MEMORY", True)  # MEMORY, SCRATCH, or OUTPUT
+    spillThreshold = core.optionalParameter(17, core.memorySpillRows)  # Rows kept in memory before spilling
+    bulkLoad = core.optionalParameter(18, False)  # Defer spatial index maintenance until all rows are inserted
+    gridLayout = core.optionalParameter(19, False)  # Pack features into a grid instead of stacking them
+    gridGap = core.optionalParameter(20, 0)  # Space between packed features, in input units
+    workers = core.optionalParameter(21, 1)  # Worker processes building OID ranges of the input
+    slimOutput = core.optionalParameter(22, False)  # Key-only geometry plus a separate attribute table per output
+    joinView = core.optionalParameter(23, False)  # Save a layer file joining each slim output to its attributes
+    do_analysis(inFeatureClass, streetFeatureClass, streetLength, streetLengthField, lotFeatureClass, lotArea,
+                lotAreaField, blockFeatureClass, blockLength, blockLengthField, blockWidth,
+                referenceFeatureClassCentroid, directWebMercator, anchorCoordinate, sizeTolerance, chunkSize,
+                intermediateMode, spillThreshold, bulkLoad, gridLayout, gridGap, workers, slimOutput, joinView)
@@ -23,7 +23,8 @@
 # limitations under the License.
 # --------------------------------
 # Import Modules
-import os, arcpy, copy
+import arcpy, numpy
+import CEAssociationsCore as core
 
 
 # Function Definitions
@@ -94,41 +95,6 @@ def arcToolReport(function=None, arcToolMessageBool=False, arcProgressorBool=Fal
         return arcToolReport_Decorator(function)
 
 
-def getFIndex(field_names, field_name):
-    """Will get the index for a  arcpy da.cursor based on a list of field names as an input.
-    Assumes string will match if all the field names are made lower case."""
-    try:
-        return [str(i).lower() for i in field_names].index(str(field_name).lower())
-        # Make iter items lower case to get right time field index.
-    except:
-        print("Couldn't retrieve index for {0}, check arguments.".format(str(field_name)))
-        return None
-
-
-def getFields(featureClass, excludedTolkens=["OID", "Geometry"], excludedFields=["shape_area", "shape_length"]):
-    """Get all field names from an incoming feature class defaulting to excluding tolkens and shape area & length.
-    Inputs: Feature class, excluding tokens list, excluded fields list.
-    Outputs: List of field names from input feature class. """
-    try:
-        try: # If  A feature Class split to game name
-            fcName = os.path.split(featureClass)[1]
-        except: # If a Feature Layer, just print the Layer Name
-            fcName = featureClass
-        field_list = [f.name for f in arcpy.ListFields(featureClass) if f.type not in excludedTolkens
-                      and f.name.lower() not in excludedFields]
-        arc_print("The field list for {0} is:{1}".format(str(fcName), str(field_list)), True)
-        return field_list
-    except:
-        arc_print(
-                "Could not get fields for the following input {0}, returned an empty list.".format(
-                        str(featureClass)),
-                True)
-        arcpy.AddWarning(
-                "Could not get fields for the following input {0}, returned an empty list.".format(
-                        str(featureClass)))
-        field_list = []
-        return field_list
-
 @arcToolReport
 def arc_print(string, progressor_Bool=False):
     """ This function is used to simplify using arcpy reporting for tool creation,if progressor bool is true it will
@@ -154,158 +120,31 @@ def FieldExist(featureclass, fieldname):
         return False
 
 
-@arcToolReport()
-def AddNewField(in_table, field_name, field_type, field_precision="#", field_scale="#", field_length="#",
-                field_alias="#", field_is_nullable="#", field_is_required="#", field_domain="#"):
-    """Add a field to a table only if it does not already exist. Checking first is faster than
-    calling AddField unconditionally.
-
-    Parameters
-    ----------
-    in_table : str
-        Path to the input table or feature class.
-    field_name : str
-        Name of the field to add.
-    field_type : str
-        ArcGIS field type string (e.g. "DOUBLE", "TEXT", "LONG").
-    field_precision : str or int, optional
-        Number of digits for numeric fields. Defaults to "#".
-    field_scale : str or int, optional
-        Number of decimal places for numeric fields. Defaults to "#".
-    field_length : str or int, optional
-        Maximum character length for text fields. Defaults to "#".
-    field_alias : str, optional
-        Alias displayed in ArcGIS. Defaults to "#".
-    field_is_nullable : str, optional
-        Whether the field allows NULL values. Defaults to "#".
-    field_is_required : str, optional
-        Whether the field is required by the schema. Defaults to "#".
-    field_domain : str, optional
-        Name of a domain to assign to the field. Defaults to "#".
-    """
-    if FieldExist(in_table, field_name):
-        print(field_name + " Exists")
-        arcpy.AddMessage(field_name + " Exists")
-    else:
-        print("Adding " + field_name)
-        arcpy.AddMessage("Adding " + field_name)
-        arcpy.AddField_management(in_table, field_name, field_type, field_precision, field_scale,
-                                  field_length,
-                                  field_alias,
-                                  field_is_nullable, field_is_required, field_domain)
-
-
-@arcToolReport
-def CreateMainStreetBlockCEGeometry(pointObj, translationDistance, sideBlockWidth=50):
-    """ Create a dictionary of polyline objects consisting of a simple line based on the location of a passed point
-     This function in the future will be used to create a center street with two side blocks for the purpose
-     of lot creation in CityEngine."""
-    firstPt = pointObj.getPart(0)
-    secondPt = pointObj.getPart(0)
-    secondPt.Y += translationDistance
-    leftTopCornerPt = pointObj.getPart(0)
-    leftTopCornerPt.Y += translationDistance
-    leftTopCornerPt.X += -sideBlockWidth
-    rightTopCornerPt = pointObj.getPart(0)
-    rightTopCornerPt.Y += translationDistance
-    rightTopCornerPt.X += sideBlockWidth
-    leftBottomCornerPt = pointObj.getPart(0)
-    leftBottomCornerPt.X += -sideBlockWidth
-    rightBottomCornerPt = pointObj.getPart(0)
-    rightBottomCornerPt.X += sideBlockWidth
-    mainArray = arcpy.Array()
-    mainArray.add(firstPt)
-    mainArray.add(secondPt)
-    MainStreet = arcpy.Polyline(mainArray)
-    leftMainArray = arcpy.Array()
-    leftMainArray.add(leftBottomCornerPt)
-    leftMainArray.add(leftTopCornerPt)
-    leftMainStreet = arcpy.Polyline(leftMainArray)
-    rightMainArray = arcpy.Array()
-    rightMainArray.add(rightBottomCornerPt)
-    rightMainArray.add(rightTopCornerPt)
-    rightMainStreet = arcpy.Polyline(rightMainArray)
-    botLeftSideArray = arcpy.Array()
-    botLeftSideArray.add(firstPt)
-    botLeftSideArray.add(leftBottomCornerPt)
-    botLeftSideStreet = arcpy.Polyline(botLeftSideArray)
-    botRightSideArray = arcpy.Array()
-    botRightSideArray.add(firstPt)
-    botRightSideArray.add(rightBottomCornerPt)
-    botRightSideStreet = arcpy.Polyline(botRightSideArray)
-    topLeftSideArray = arcpy.Array()
-    topLeftSideArray.add(secondPt)
-    topLeftSideArray.add(leftTopCornerPt)
-    topLeftSideStreet = arcpy.Polyline(topLeftSideArray)
-    topRightSideArray = arcpy.Array()
-    topRightSideArray.add(secondPt)
-    topRightSideArray.add(rightTopCornerPt)
-    topRightSideStreet = arcpy.Polyline(topRightSideArray)
-    return {"MainStreet": MainStreet, "LeftMainStreet": leftMainStreet, "RightMainStreet": rightMainStreet,
-            "BottomLeftSideSt": botLeftSideStreet, "BottomRightSideSt": botRightSideStreet,
-            "TopLeftSideSt": topLeftSideStreet, "TopRightSideSt": topRightSideStreet}
-
-
-def copyAlteredRow(row, fieldList, replacementDict):
-    """Copy a row from a cursor based on a past list of fields in field list. If replacement dictionary has a key,
-    replace the row value copied with the replacement."""
-    try:
-        newRow = []
-        keyList = replacementDict.keys()
-        for field in fieldList:
-            try:
-                if field in keyList:
-                    newRow.append(replacementDict[field])
-                else:
-                    newRow.append(row[getFIndex(fieldList, field)])
-            except:
-                arc_print("Could not replace field {0} with its accepted value. Check field names for match.".format(
-                        str(field)), True)
-                newRow.append(None)  # Append a null value where it cannot find a value to the list.
-        return newRow
-    except:
-        arc_print("Could not get row fields for the following input {0}, returned an empty list.".format(str(row)), True)
-        arcpy.AddWarning(
-                "Could not get row fields for the following input {0}, returned an empty list.".format(str(row)))
-        newRow = []
-        return newRow
-
-
-@arcToolReport
-def lineLength(row, Field, constantLen, fNames):
-    """Returns the appropriate value type  based on the options selected:
-    retrieved form field or uses a constant"""
-    if Field and getFIndex(fNames, str(Field)):
-        return abs(row[getFIndex(fNames, Field)])
-    else:
-        return abs(constantLen)
-
-
 # Main Function
 @arcToolReport
-def do_analysis(inFeatureClass, outFeatureClass, lengthNum, lengthField, blockWidthValue, referenceFeatureClass):
+def do_analysis(inFeatureClass, outFeatureClass, lengthNum, lengthField, blockWidthValue, referenceFeatureClass,
+                directWebMercator=False, anchorXY=None, sizeTolerance=0, chunkSize=50000,
+                slimOutput=False, joinView=False, intermediateMode="MEMORY", spillThreshold=core.memorySpillRows,
+                bulkLoad=False, gridLayout=False, gridGap=0, incremental=False, workers=1):
     """This function will create blocks in one location based on the incoming reference centroid for the
-    purpose of being used for data driven design applications in CityEngine."""
+    purpose of being used for data driven design applications in CityEngine. Only the attribute columns of the
+    input are read, never its geometry. If directWebMercator is true, only the centroid is projected and the output
+    is written in Web Mercator in one pass, skipping the temporary feature class and the full Project_management
+    pass. Input rows are streamed in chunks of chunkSize rows and each chunk's block geometries are written before
+    the next chunk is read, so memory stays bounded. If slimOutput is true, the output only holds geometry,
+    UniqueFeatID, and CEStreetName, the input attributes are written once per input row to a separate table keyed
+    by UniqueFeatID, and joinView saves a layer file joining the two. The temporary block feature class is kept in
+    memory unless it would hold more than spillThreshold rows, or is written to the scratch geodatabase or next to
+    the output, depending on intermediateMode. With bulkLoad, spatial index maintenance is deferred until every row
+    is inserted. Insert throughput is reported either way. If gridLayout is true, blocks are packed into a
+    non-overlapping grid around the anchor, gridGap apart, and their grid row, column, and offset are written. If
+    incremental is true, a manifest of per row hashes is kept next to the output and a rerun only rebuilds the
+    blocks of input rows that are new or changed since the last run, updating them in place and deleting the blocks
+    of rows gone from the input, so output OIDs stay stable. UniqueFeatID is then the source OID, and the anchor of
+    the last run is reused unless an explicit anchor is given. With more than one worker, the input is split into
+    OID ranges built in a pool of worker processes, and their results are merged in order and projected once."""
     # try:
-    # Delete Existing Output
     arcpy.env.overwriteOutput = True
-    if arcpy.Exists(outFeatureClass):
-        arc_print("Deleting existing output feature.", True)
-        arcpy.Delete_management(outFeatureClass)
-    workspace = os.path.dirname(outFeatureClass)
-    tempOutName = arcpy.ValidateTableName("TempBlockFC_1", workspace)
-    tempOutFeature = os.path.join(workspace, tempOutName)
-    # Add New Fields
-    arc_print("Adding new fields for old object IDs and geometry name.", True)
-    OldObjectIDName = "UniqueFeatID"
-    GeometryName = "CEStreetName"
-    AddNewField(inFeatureClass, OldObjectIDName, "LONG")
-    AddNewField(inFeatureClass, GeometryName, "TEXT")
-    # Create feature class to get outputFC
-    arc_print("Making a new output feature class using the input as a template", True)
-    OutPut = arcpy.CreateFeatureclass_management(workspace, tempOutName, "POLYLINE", template=inFeatureClass,
-                                                 spatial_reference=inFeatureClass)
-
     arc_print("Gathering feature information.", True)
     # Get feature description and spatial reference information for tool use
     desc = arcpy.Describe(inFeatureClass)
@@ -315,65 +154,132 @@ def do_analysis(inFeatureClass, outFeatureClass, lengthNum, lengthField, blockWi
     arc_print(
             "The shape type is {0}, and the current spatial reference is: {1}".format(str(shpType), str(srName)),
             True)
-    # Get mean center of feature class (for pointGeo)
-    if arcpy.Exists(referenceFeatureClass) and referenceFeatureClass != "#":
+    if desc.shapeType != "Polyline":
+        arc_print("Input geometry is not a polyline. Check arguments.", True)
+        arcpy.AddError("Input geometry is not a polyline. Check arguments.")
+        return
+    sizeField = lengthField if lengthField and FieldExist(inFeatureClass, lengthField) else None
+    incrementalRun = None
+    if incremental:
+        arc_print("Hashing the input rows to compare them with the manifest of the last run.", True)
+        incrementalRun = core.IncrementalRun(inFeatureClass, outFeatureClass, sizeField)
+        if anchorXY is None and incrementalRun.anchorXY is not None:
+            arc_print("Reusing the anchor of the last run.", True)
+            anchorXY = incrementalRun.anchorXY
+    # Get the anchor point every output geometry is built on (for pointGeo)
+    if anchorXY is not None:
+        arc_print("Using the explicit anchor coordinate.", True)
+    elif arcpy.Exists(referenceFeatureClass) and referenceFeatureClass != "#":
         arc_print("Calculating the mean center of the reference feature class.", True)
-        meanCenter = arcpy.MeanCenter_stats(referenceFeatureClass)
     else:
-        arc_print("Calculating the mean center of the copied feature.", True)
-        meanCenter = arcpy.MeanCenter_stats(inFeatureClass)
-
-    fieldNames = getFields(inFeatureClass)
-    arc_print("Getting point geometry from copied center.", True)
-    pointGeo = copy.deepcopy(arcpy.da.SearchCursor(meanCenter, ["SHAPE@"]).next()[0])  # Only one center, so one recor
-
-    # Check if the optional Street Length/ Lot Area field is used.
-    idsAndFieldSearchNames = ["SHAPE@"] + fieldNames
-    arc_print("The search cursor's fields and tags are:{0}".format(str(idsAndFieldSearchNames)), True)
-    records = []
-    with arcpy.da.SearchCursor(inFeatureClass, idsAndFieldSearchNames) as cursorSearch:
-        arc_print("Loading input feature classes rows into a new record list.", True)
-        for search_row in cursorSearch:
-            records.append(search_row)
-    arc_print("Inserting new rows and geometries to new feature class.", True)
-    count = 0
-    with arcpy.da.InsertCursor(tempOutFeature, idsAndFieldSearchNames) as cursorInsert:
-        if desc.shapeType == "Polyline":
-            for row in records:
-                # Use two try statements, one time to try to catch the error
-                count += 1
-                try:
-                    arc_print("A creating geometry dictionary for feature iteration: {0}.".format(str(count)))
-                    geoDict = CreateMainStreetBlockCEGeometry(pointGeo, lineLength(row, lengthField, lengthNum,
-                                                                                   idsAndFieldSearchNames),
-                                                              blockWidthValue)
-                    # print geoDict
-                    for key in geoDict.keys():
-                        try:
-                            rowList = copyAlteredRow(row, idsAndFieldSearchNames,
-                                                     {"SHAPE@": geoDict[key], OldObjectIDName: count,
-                                                      GeometryName: str(key)})
-                            cursorInsert.insertRow(rowList)
-                        except:
-                            arcpy.AddWarning("Passed line at iteration {0}.".format(str(count)))
-                            pass
-                except:
-                    arcpy.GetMessage(2)
-                    arc_print("Failed on iteration {0}.".format(str(count)), True)
-                    pass
-        else:
-            arc_print("Input geometry is not a polyline. Check arguments.", True)
-            arcpy.AddError("Input geometry is not a polyline. Check arguments.")
-
-    arc_print("Projecting data into Web Mercator Auxiliary Sphere (a CityEngine compatible projection).", True)
-    webMercatorAux = arcpy.SpatialReference(3857)
-    arcpy.Project_management(OutPut, outFeatureClass, webMercatorAux)
-    arc_print("Cleaning up intermediates.", True)
-    arcpy.Delete_management(meanCenter)
-    arcpy.Delete_management(OutPut)
-    arcpy.DeleteField_management(inFeatureClass, OldObjectIDName)
-    arcpy.DeleteField_management(inFeatureClass, GeometryName)
-    del SpatialRef, desc, cursorSearch, webMercatorAux, cursorInsert
+        arc_print("Calculating the mean center of the input feature class.", True)
+    pointGeo = core.anchorPoint(inFeatureClass, referenceFeatureClass, anchorXY)
+    if pointGeo is None:
+        arc_print("No feature geometries were found to calculate a mean center from. Check arguments.", True)
+        arcpy.AddError("No feature geometries were found to calculate a mean center from. Check arguments.")
+        return
+
+    updateOnly = False
+    if incrementalRun is not None:
+        if slimOutput or gridLayout:
+            arc_print("Slim and grid layout outputs are rebuilt on every incremental run.", True)
+        updateOnly = incrementalRun.plan(["block", lengthNum, lengthField, blockWidthValue, directWebMercator,
+                                          sizeTolerance], core.anchorCoordinates(pointGeo), slimOutput or gridLayout)
+        arc_print(incrementalRun.report(), True)
+        if updateOnly and not (incrementalRun.changed or incrementalRun.deleted):
+            arc_print("The output is up to date.", True)
+            return
+    # Delete Existing Output, unless it is updated in place
+    if not updateOnly and arcpy.Exists(outFeatureClass):
+        arc_print("Deleting existing output feature.", True)
+        arcpy.Delete_management(outFeatureClass)
+    # An incremental update builds the blocks of the new and changed rows only, into a staging feature class merged
+    # into the output afterwards.
+    sourceFeatures, targetFeatureClass = inFeatureClass, outFeatureClass
+    if updateOnly:
+        if not incrementalRun.changed:
+            arc_print("No rows are new or changed, only deleting blocks.", True)
+            updated, inserted, deleted = incrementalRun.merge(None, "CEStreetName")
+            incrementalRun.rejects()  # Drops the rejects of the deleted rows
+            arc_print("Deleted {0} output rows.".format(str(deleted)), True)
+            arc_print("Writing the row hash manifest to {0}.".format(incrementalRun.tablePath), True)
+            incrementalRun.save()
+            return
+        sourceFeatures = incrementalRun.source()
+        targetFeatureClass = core.scratchFeatureClass("TempCEStaging", core.intermediateWorkspace(
+                intermediateMode, outFeatureClass, len(incrementalRun.changed) * len(core.blockPartNames),
+                spillThreshold))
+    parallel = int(workers or 1) > 1 and incrementalRun is None and not (slimOutput or gridLayout)
+    if int(workers or 1) > 1 and not parallel:
+        arc_print("Slim, grid layout, and incremental runs are written by a single process.", True)
+    # The rows of an update are only part of the input, so its rejects replace theirs in the existing table.
+    # Incremental outputs are keyed by source OID, so the UniqueFeatID of a rebuilt block does not change.
+    output = core.AssociationOutput(targetFeatureClass, "block", sizeField, lengthNum, blockWidthValue, sizeTolerance,
+                                    slimOutput, True, incrementalRun is not None,
+                                    incrementalRun.rejects() if updateOnly else None)
+    insertTimer = core.InsertTimer()
+    if parallel:
+        arc_print("Building blocks in {0} worker processes.".format(str(workers)), True)
+        tempWorkspace = None if directWebMercator else core.intermediateWorkspace(
+                intermediateMode, outFeatureClass, core.rowCount(inFeatureClass) * len(core.blockPartNames),
+                spillThreshold)
+        core.writePartitionedOutputs(inFeatureClass, [output], pointGeo, workers, directWebMercator, chunkSize,
+                                     tempWorkspace, insertTimer)
+        arc_print(insertTimer.report(), True)
+        if output.rejects.written:
+            arcpy.AddWarning("{0} rows were rejected and written to {1} instead of the output.".format(
+                    str(output.rejects.written), output.rejects.tablePath))
+        return
+    tempWorkspace = None
+    if directWebMercator:
+        arc_print("Projecting the centroid into Web Mercator Auxiliary Sphere to write the output directly.", True)
+    else:
+        tempWorkspace = core.intermediateWorkspace(intermediateMode, outFeatureClass,
+                                                   core.rowCount(sourceFeatures) * len(core.blockPartNames),
+                                                   spillThreshold)
+        arc_print("Writing intermediates to the {0} workspace and projecting them into Web Mercator Auxiliary "
+                  "Sphere (a CityEngine compatible projection).".format(tempWorkspace), True)
+    if slimOutput:
+        arc_print("Using a slim output schema with a separate attribute table.", True)
+    if bulkLoad:
+        arc_print("Bulk loading: spatial index maintenance is deferred until all rows are inserted.", True)
+    if gridLayout:
+        arc_print("Packing blocks into a grid layout with a gap of {0}.".format(str(gridGap)), True)
+    # Only attributes are read. The source geometry is never used, since every block shape is built by the kernel.
+    arc_print("Streaming input rows in chunks of {0} and inserting {1} block geometries per row.".format(
+            str(chunkSize), str(len(core.blockPartNames))), True)
+    core.writeAssociationOutputs(sourceFeatures, [output], pointGeo, directWebMercator, chunkSize, tempWorkspace,
+                                 bulkLoad, insertTimer, gridGap if gridLayout else None)
+    arc_print("Inserted block geometries for {0} input rows.".format(str(output.written)), True)
+    arc_print(insertTimer.report(), True)
+    validation = output.validation()
+    repaired = int(numpy.count_nonzero(validation.valid & (validation.codes > 0)))
+    arc_print("Size validation: {0} rows repaired, {1} rows rejected.".format(str(repaired),
+                                                                              str(output.rejects.written)), True)
+    if output.rejects.written and output.rejects.tablePath:
+        arcpy.AddWarning("Rejected rows were written to {0} instead of the output.".format(output.rejects.tablePath))
+    elif output.rejects.written:
+        arcpy.AddWarning("Rejected rows were left out of the output.")
+    arc_print(output.interner.report(), True)
+    if updateOnly:
+        arc_print("Merging the rebuilt blocks into the existing output.", True)
+        updated, inserted, deleted = incrementalRun.merge(targetFeatureClass, "CEStreetName")
+        arc_print("Updated {0}, inserted {1}, and deleted {2} output rows.".format(str(updated), str(inserted),
+                                                                               str(deleted)), True)
+        arcpy.Delete_management(targetFeatureClass)
+    if incrementalRun is not None:
+        arc_print("Writing the row hash manifest to {0}.".format(incrementalRun.tablePath), True)
+        incrementalRun.save()
+    if slimOutput:
+        arc_print("Attributes were written to {0}, keyed by {1}.".format(output.attributeTable, core.slimKeyField),
+                  True)
+        if joinView:
+            arc_print("Saved a join view of the output and its attributes to {0}.".format(
+                    core.createJoinView(outFeatureClass, output.attributeTable)), True)
+    peakMemory = core.peakMemoryMB()
+    if peakMemory is not None:
+        arc_print("Peak process memory was {0:.1f} MB.".format(peakMemory), True)
+    del SpatialRef, desc
 
     # except arcpy.ExecuteError:
     #     print(arcpy.GetMessages(2))
@@ -391,5 +297,20 @@ if __name__ == "__main__":
     SizeField = arcpy.GetParameterAsText(3)  # CR: more descriptive
     BlockWidth = arcpy.GetParameter(4)
     referenceFeatureClassCentroid = arcpy.GetParameterAsText(5)  # optional reference FC to get centroid from
+    directWebMercator = core.optionalParameter(6, False)  # Project only the centroid and write output in one pass
+    anchorCoordinate = core.parseAnchorCoordinate(core.optionalParameter(7, None, True))  # optional explicit X Y
+    sizeTolerance = core.optionalParameter(8, 0)  # Snap sizes to this step so more features share a template
+    chunkSize = core.optionalParameter(9, 50000)  # Input rows held in memory at once
+    slimOutput = core.optionalParameter(10, False)  # Key-only geometry plus a separate attribute table
+    joinView = core.optionalParameter(11, False)  # Save a layer file joining the slim output to its attributes
+    intermediateMode = core.optionalParameter(12, "MEMORY", True)  # MEMORY, SCRATCH, or OUTPUT
+    spillThreshold = core.optionalParameter(13, core.memorySpillRows)  # Rows kept in memory before spilling
+    bulkLoad = core.optionalParameter(14, False)  # Defer spatial index maintenance until all rows are inserted
+    gridLayout = core.optionalParameter(15, False)  # Pack blocks into a grid instead of stacking them
+    gridGap = core.optionalParameter(16, 0)  # Space between packed blocks, in input units
+    incremental = core.optionalParameter(17, False)  # Only rebuild rows changed since the last run
+    workers = core.optionalParameter(18, 1)  # Worker processes building OID ranges of the input
     do_analysis(inFeatureClass, outFeatureClass, StreetLength_LotArea, SizeField, BlockWidth,
-                referenceFeatureClassCentroid)
+                referenceFeatureClassCentroid, directWebMercator, anchorCoordinate, sizeTolerance, chunkSize,
+                slimOutput, joinView, intermediateMode, spillThreshold, bulkLoad,
+                gridLayout, gridGap, incremental, workers)
@@ -23,7 +23,8 @@
 # limitations under the License.
 # --------------------------------
 # Import Modules
-import os, arcpy, copy
+import arcpy
+import CEAssociationsCore as core
 
 
 # Function Definitions
@@ -108,17 +109,6 @@ def arc_print(string, progressor_Bool=False):
         print(casted_string)
 
 
-def getFIndex(field_names, field_name):
-    """Will get the index for a  arcpy da.cursor based on a list of field names as an input.
-    Assumes string will match if all the field names are made lower case."""
-    try:
-        return [str(i).lower() for i in field_names].index(str(field_name).lower())
-        # Make iter items lower case to get right time field index.
-    except:
-        print("Couldn't retrieve index for {0}, check arguments.".format(str(field_name)))
-        return None
-
-
 @arcToolReport
 def FieldExist(featureclass, fieldname):
     """ Check if a field in a feature class field exists and return true it does, false if not."""
@@ -130,225 +120,162 @@ def FieldExist(featureclass, fieldname):
         return False
 
 
-@arcToolReport
-def AddNewField(in_table, field_name, field_type, field_precision="#", field_scale="#", field_length="#",
-                field_alias="#", field_is_nullable="#", field_is_required="#", field_domain="#"):
-    """Add a field to a table only if it does not already exist. Checking first is faster than
-    calling AddField unconditionally.
-
-    Parameters
-    ----------
-    in_table : str
-        Path to the input table or feature class.
-    field_name : str
-        Name of the field to add.
-    field_type : str
-        ArcGIS field type string (e.g. "DOUBLE", "TEXT", "LONG").
-    field_precision : str or int, optional
-        Number of digits for numeric fields. Defaults to "#".
-    field_scale : str or int, optional
-        Number of decimal places for numeric fields. Defaults to "#".
-    field_length : str or int, optional
-        Maximum character length for text fields. Defaults to "#".
-    field_alias : str, optional
-        Alias displayed in ArcGIS. Defaults to "#".
-    field_is_nullable : str, optional
-        Whether the field allows NULL values. Defaults to "#".
-    field_is_required : str, optional
-        Whether the field is required by the schema. Defaults to "#".
-    field_domain : str, optional
-        Name of a domain to assign to the field. Defaults to "#".
-    """
-    if FieldExist(in_table, field_name):
-        print(field_name + " Exists")
-        arcpy.AddMessage(field_name + " Exists")
-    else:
-        print("Adding " + field_name)
-        arcpy.AddMessage("Adding " + field_name)
-        arcpy.AddField_management(in_table, field_name, field_type, field_precision, field_scale,
-                                  field_length,
-                                  field_alias,
-                                  field_is_nullable, field_is_required, field_domain)
-
-
-@arcToolReport
-def CreateMainStreetCEGeometry(pointObj, translationDistance, nodalShift=0):
-    """Create a two-vertex polyline representing a standardized street segment.
-
-    The line runs north (positive Y) from pointObj by translationDistance. An optional
-    nodalShift offsets both endpoints horizontally, which can be used to laterally stagger
-    parallel street representations.
-
-    Parameters
-    ----------
-    pointObj : arcpy.PointGeometry
-        Origin point for the street segment.
-    translationDistance : float
-        Length of the street segment in coordinate system units.
-    nodalShift : float, optional
-        Horizontal (X) offset applied to both endpoints (default 0).
-
-    Returns
-    -------
-    arcpy.Polyline
-        A two-vertex polyline representing the street segment.
-    """
-    firstPt = pointObj.getPart(0)
-    firstPt.X += nodalShift
-    secondPt = pointObj.getPart(0)
-    secondPt.Y += translationDistance
-    secondPt.X += nodalShift
-    array = arcpy.Array()
-    array.add(firstPt)
-    array.add(secondPt)
-    MainStreet = arcpy.Polyline(array)
-    return MainStreet  # CR: return arcpy.Polyline(arcpy.Array(pointObj))
-
-
-# TODO: Integrate block generation into tool. Not a priority.
-@arcToolReport
-def CreateMainStreetBlockCEGeometry(pointObj, translationDistance, sideBlockWidth=50):
-    """ Create a dictionary of polyline objects consisting of a simple line based on the location of a passed point
-     This function in the future will be used to create a center street with two side blocks for the purpose
-     of lot creation in CityEngine."""
-    firstPt = pointObj.getPart(0)
-    secondPt = pointObj.getPart(0)
-    secondPt.Y += translationDistance
-    leftTopCornerPt = pointObj.getPart(0)
-    leftTopCornerPt.Y += translationDistance
-    leftTopCornerPt.X += -sideBlockWidth
-    rightTopCornerPt = pointObj.getPart(0)
-    rightTopCornerPt.Y += translationDistance
-    rightTopCornerPt.X += sideBlockWidth
-    leftBottomCornerPt = pointObj.getPart(0)
-    leftBottomCornerPt.X += -sideBlockWidth
-    rightBottomCornerPt = pointObj.getPart(0)
-    rightBottomCornerPt.X += sideBlockWidth
-    mainArray = arcpy.Array()
-    mainArray.add(firstPt)
-    mainArray.add(secondPt)
-    MainStreet = arcpy.Polyline(mainArray)
-    leftMainArray = arcpy.Array()
-    leftMainArray.add(leftBottomCornerPt)
-    leftMainArray.add(leftTopCornerPt)
-    leftMainStreet = arcpy.Polyline(leftMainArray)
-    rightMainArray = arcpy.Array()
-    rightMainArray.add(rightBottomCornerPt)
-    rightMainArray.add(rightTopCornerPt)
-    rightMainStreet = arcpy.Polyline(rightMainArray)
-    botLeftSideArray = arcpy.Array()
-    botLeftSideArray.add(firstPt)
-    botLeftSideArray.add(leftBottomCornerPt)
-    botLeftSideStreet = arcpy.Polyline(botLeftSideArray)
-    botRightSideArray = arcpy.Array()
-    botRightSideArray.add(firstPt)
-    botRightSideArray.add(rightBottomCornerPt)
-    botRightSideStreet = arcpy.Polyline(botRightSideArray)
-    topLeftSideArray = arcpy.Array()
-    topLeftSideArray.add(secondPt)
-    topLeftSideArray.add(leftTopCornerPt)
-    topLeftSideStreet = arcpy.Polyline(topLeftSideArray)
-    topRightSideArray = arcpy.Array()
-    topRightSideArray.add(secondPt)
-    topRightSideArray.add(rightTopCornerPt)
-    topRightSideStreet = arcpy.Polyline(topRightSideArray)
-    return {"MainStreet": MainStreet, "LeftMainStreet": leftMainStreet, "RightMainStreet": rightMainStreet,
-            "BottomLeftSideSt": botLeftSideStreet, "BottomRightSideSt": botRightSideStreet,
-            "TopLeftSideSt": topLeftSideStreet, "TopRightSideSt": topRightSideStreet}
-
-
-@arcToolReport
-def handleFailedStreetUpdate(cursor, row, pointGeo, Length):
-    """To deal with update cursor instability/script errors, this function will try update the row update
-    a second time. If it fails, it will delete the row in question. """
-    try:
-        row[0] = CreateMainStreetCEGeometry(pointGeo, abs(Length))
-        cursor.updateRow(row)
-        arcpy.AddWarning(
-                "Nested Try statement triggered at OID {0}. Updated Geometry, but QAQC suggested.".format(
-                        str(row[1])))
-    except:
-        arcpy.AddWarning("Passed and deleted line at OID {0}.".format(str(row[1])))
-        cursor.deleteRow()
-
-
-@arcToolReport
-def lineLength(row, Field, constantLen, fNames):
-    """Returns the appropriate value type  based on the options selected:
-    retrieved form field or uses a constant"""
-    if Field and getFIndex(fNames, str(Field)):
-        return abs(row[getFIndex(fNames, Field)])
-    else:
-        return abs(constantLen)
+def reportValidation(validation, rejectTable):
+    """Report the size validation pre-pass, warning if any rows were rejected."""
+    arc_print("Size validation: {0}".format(validation.report()), True)
+    if not validation.valid.all():
+        if rejectTable:
+            arcpy.AddWarning("Rejected rows were written to {0} instead of the output.".format(rejectTable))
+        else:
+            arcpy.AddWarning("Rejected rows were left out of the output.")
 
 
 # Main Function
 @arcToolReport
-def do_analysis(inFeatureClass, outFeatureClass, Length, Field, referenceFeatureClass):
+def do_analysis(inFeatureClass, outFeatureClass, Length, Field, referenceFeatureClass, directWebMercator=False,
+                anchorXY=None, sizeTolerance=0, slimOutput=False, joinView=False,
+                intermediateMode="MEMORY", spillThreshold=core.memorySpillRows, bulkLoad=False,
+                gridLayout=False, gridGap=0, incremental=False, workers=1):
     """This function will create streets in one location based on the incoming reference centroid for the
-    purpose of being used for data driven design applications in CityEngine."""
+    purpose of being used for data driven design applications in CityEngine. Only the attributes and size field of
+    the input are read, and the output shapes are inserted into a fresh schema rather than copied from the source
+    and overwritten. If directWebMercator is true, only the centroid is projected and the output is written in Web
+    Mercator in one pass, skipping the temporary feature class and the full Project_management pass. If slimOutput
+    is true, the output only holds geometry and a UniqueFeatID key, the input attributes are written once to a
+    separate table keyed by it, and joinView saves a layer file joining the two. Intermediates are kept in memory
+    unless the input has more than spillThreshold rows, or are written to the scratch geodatabase or next to the
+    output, depending on intermediateMode. With bulkLoad, spatial index maintenance is deferred until every row is
+    inserted. Insert throughput is reported either way. If gridLayout is true, features are packed into a
+    non-overlapping grid around the anchor, gridGap apart, and their grid row, column, and offset are written. If
+    incremental is true, a manifest of per row hashes is kept next to the output and a rerun only rebuilds the
+    rows that are new or changed since the last run, updating them in place and deleting rows gone from the input,
+    so output OIDs stay stable. The anchor of the last run is reused unless an explicit anchor is given. With more
+    than one worker, the input is split into OID ranges built in a pool of worker processes, and their results are
+    merged in order and projected once."""
     try:
-        # Delete Existing Output
         arcpy.env.overwriteOutput = True
-        if arcpy.Exists(outFeatureClass):
-            arc_print("Deleting existing output feature.", True)
-            arcpy.Delete_management(outFeatureClass)
-        # Copy/Project feature class to get outputFC
-        arc_print("Making a copy of input feature class for output.", True)
-        OutPut = arcpy.CopyFeatures_management(inFeatureClass)
         arc_print("Gathering feature information.", True)
         # Get feature description and spatial reference information for tool use
-        desc = arcpy.Describe(OutPut)
+        desc = arcpy.Describe(inFeatureClass)
         SpatialRef = desc.spatialReference
         shpType = desc.shapeType
         srName = SpatialRef.name
         arc_print(
                 "The shape type is {0}, and the current spatial reference is: {1}".format(str(shpType), str(srName)),
                 True)
-        # Get mean center of feature class (for pointGeo)
-        if arcpy.Exists(referenceFeatureClass) and referenceFeatureClass != "#":
-            arc_print("Calculating the mean center of the reference feature class.", True)
-            meanCenter = arcpy.MeanCenter_stats(referenceFeatureClass)
-        else:
-            arc_print("Calculating the mean center of the copied feature.", True)
-            meanCenter = arcpy.MeanCenter_stats(inFeatureClass)
-
-        arc_print("Getting point geometry from copied center.", True)
-        pointGeo = copy.deepcopy(
-                arcpy.da.SearchCursor(meanCenter, ["SHAPE@"]).next()[0])  # Only one center, so one record
+        if desc.shapeType != "Polyline":
+            arc_print("Input geometry is not a polyline. Check arguments.", True)
+            arcpy.AddError("Input geometry is not a polyline. Check arguments.")
+            return
         # Check if the optional Street Length/ Lot Area field is used.
-        if Field and FieldExist(OutPut, Field):
+        if Field and FieldExist(inFeatureClass, Field):
             arc_print("Using size field to create output geometries.", True)
-            cursorFields = ["SHAPE@", "OID@", Field]
+            sizeField = Field
         else:
             arc_print("Using size input value to create same sized output geometries.", True)
-            cursorFields = ["SHAPE@", "OID@"]
+            sizeField = None
+        incrementalRun = None
+        if incremental:
+            arc_print("Hashing the input rows to compare them with the manifest of the last run.", True)
+            incrementalRun = core.IncrementalRun(inFeatureClass, outFeatureClass, sizeField)
+            if anchorXY is None and incrementalRun.anchorXY is not None:
+                arc_print("Reusing the anchor of the last run.", True)
+                anchorXY = incrementalRun.anchorXY
+        # Get the anchor point every output geometry is built on (for pointGeo)
+        if anchorXY is not None:
+            arc_print("Using the explicit anchor coordinate.", True)
+        elif arcpy.Exists(referenceFeatureClass) and referenceFeatureClass != "#":
+            arc_print("Calculating the mean center of the reference feature class.", True)
+        else:
+            arc_print("Calculating the mean center of the input feature class.", True)
+        pointGeo = core.anchorPoint(inFeatureClass, referenceFeatureClass, anchorXY)
+        if pointGeo is None:
+            arc_print("No feature geometries were found to calculate a mean center from. Check arguments.", True)
+            arcpy.AddError("No feature geometries were found to calculate a mean center from. Check arguments.")
+            return
+        updateOnly = False
+        if incrementalRun is not None:
+            if slimOutput or gridLayout:
+                arc_print("Slim and grid layout outputs are rebuilt on every incremental run.", True)
+            updateOnly = incrementalRun.plan(["street", Length, sizeField, directWebMercator, sizeTolerance],
+                                             core.anchorCoordinates(pointGeo), slimOutput or gridLayout)
+            arc_print(incrementalRun.report(), True)
+            if updateOnly and not (incrementalRun.changed or incrementalRun.deleted):
+                arc_print("The output is up to date.", True)
+                return
+        # Delete Existing Output, unless it is updated in place
+        if not updateOnly and arcpy.Exists(outFeatureClass):
+            arc_print("Deleting existing output feature.", True)
+            arcpy.Delete_management(outFeatureClass)
 
-        with arcpy.da.UpdateCursor(OutPut, cursorFields) as cursor:
-            arc_print("Replacing existing input geometry.", True)
-            count = 1
-            if desc.shapeType == "Polyline":
-                for row in cursor:
-                    # Use two try statements, one time to try to catch the error
-                    count += 1
-                    try:
-                        print("A Line at OID: {0}.".format(str(row[1])))
-                        row[0] = CreateMainStreetCEGeometry(pointGeo, lineLength(row, Field, Length, cursorFields))
-                        cursor.updateRow(row)
-                    except:
-                        handleFailedStreetUpdate(cursor, row, pointGeo, lineLength(row, Field, Length, cursorFields))
+        insertTimer = core.InsertTimer()
+        if gridLayout:
+            arc_print("Packing features into a grid layout with a gap of {0}.".format(str(gridGap)), True)
+        # An incremental update builds only the new and changed rows, into a staging feature class merged into the
+        # output afterwards.
+        sourceFeatures, targetFeatureClass = inFeatureClass, outFeatureClass
+        if updateOnly:
+            sourceFeatures = incrementalRun.source() if incrementalRun.changed else None
+            targetFeatureClass = core.scratchFeatureClass("TempCEStaging", core.intermediateWorkspace(
+                    intermediateMode, outFeatureClass, len(incrementalRun.changed), spillThreshold))
+        parallel = int(workers or 1) > 1 and incrementalRun is None and not (slimOutput or gridLayout)
+        if int(workers or 1) > 1 and not parallel:
+            arc_print("Slim, grid layout, and incremental runs are written by a single process.", True)
+        # The rows of an update are only part of the input, so its rejects replace theirs in the existing table.
+        output = core.AssociationOutput(targetFeatureClass, "street", sizeField, Length, tolerance=sizeTolerance,
+                                        slim=slimOutput, sourceKey=incrementalRun is not None,
+                                        rejects=incrementalRun.rejects() if updateOnly else None)
+        # Only attribute columns and the size field are read. The source geometry is never copied, since every
+        # output shape is built by the kernel and inserted into a fresh schema.
+        if sourceFeatures is None:
+            arc_print("No rows are new or changed, only deleting rows.", True)
+        elif parallel:
+            arc_print("Building streets in {0} worker processes.".format(str(workers)), True)
+            tempWorkspace = None if directWebMercator else core.intermediateWorkspace(
+                    intermediateMode, outFeatureClass, core.rowCount(inFeatureClass), spillThreshold)
+            core.writePartitionedOutputs(inFeatureClass, [output], pointGeo, workers, directWebMercator,
+                                         tempWorkspace=tempWorkspace, insertTimer=insertTimer)
+            arc_print(insertTimer.report(), True)
+            if output.rejects.written:
+                arcpy.AddWarning("{0} rows were rejected and written to {1} instead of the output.".format(
+                        str(output.rejects.written), output.rejects.tablePath))
+        else:
+            tempWorkspace = None
+            if directWebMercator:
+                arc_print("Projecting the centroid into Web Mercator Auxiliary Sphere and writing the output directly.",
+                          True)
             else:
-                arc_print("Input geometry is not a polyline. Check arguments.", True)
-                arcpy.AddError("Input geometry is not a polyline. Check arguments.")
-
-            arc_print("Projecting data into Web Mercator Auxiliary Sphere (a CityEngine compatible projection).", True)
-            webMercatorAux = arcpy.SpatialReference(3857)
-            arcpy.Project_management(OutPut, outFeatureClass, webMercatorAux)  # No preserve shape, keeps 2 vertices
-            arc_print("Cleaning up intermediates.", True)
-            arcpy.Delete_management(meanCenter)
-            arcpy.Delete_management(OutPut)
-            del SpatialRef, desc, cursor, webMercatorAux
-
+                tempWorkspace = core.intermediateWorkspace(intermediateMode, outFeatureClass,
+                                                           core.rowCount(sourceFeatures), spillThreshold)
+                arc_print("Writing intermediates to the {0} workspace and projecting them into Web Mercator "
+                          "Auxiliary Sphere (a CityEngine compatible projection).".format(tempWorkspace), True)
+            if slimOutput:
+                arc_print("Writing geometry and keys to a slim feature class and attributes to a separate table.",
+                          True)
+            arc_print("Building all street geometries with the batched geometry kernel.", True)
+            core.writeAssociationOutputs(sourceFeatures, [output], pointGeo, directWebMercator,
+                                         tempWorkspace=tempWorkspace, bulkLoad=bulkLoad, insertTimer=insertTimer,
+                                         gridGap=gridGap if gridLayout else None)
+            reportValidation(output.validation(), output.rejects.tablePath)
+            arc_print(insertTimer.report(), True)
+            arc_print(output.interner.report(), True)
+        if updateOnly:
+            arc_print("Merging the rebuilt rows into the existing output.", True)
+            updated, inserted, deleted = incrementalRun.merge(targetFeatureClass if sourceFeatures else None)
+            arc_print("Updated {0}, inserted {1}, and deleted {2} output rows.".format(str(updated), str(inserted),
+                                                                                   str(deleted)), True)
+            if sourceFeatures is not None:
+                arcpy.Delete_management(targetFeatureClass)
+        if incrementalRun is not None:
+            arc_print("Writing the row hash manifest to {0}.".format(incrementalRun.tablePath), True)
+            incrementalRun.save()
+        if slimOutput:
+            arc_print("Attributes were written to {0}, keyed by {1}.".format(output.attributeTable,
+                                                                             core.slimKeyField), True)
+            if joinView:
+                arc_print("Saved a join view of the output and its attributes to {0}.".format(
+                        core.createJoinView(outFeatureClass, output.attributeTable)), True)
+        del SpatialRef, desc
     except arcpy.ExecuteError:
         print(arcpy.GetMessages(2))
     except Exception as e:
@@ -364,4 +291,18 @@ if __name__ == "__main__":
     StreetLength_LotArea = arcpy.GetParameter(2)  # Units of current feature class
     SizeField = arcpy.GetParameterAsText(3)  # Field is used to get size of output sanitized geometries.
     referenceFeatureClassCentroid = arcpy.GetParameterAsText(4)  # optional reference FC to get centroid from
-    do_analysis(inFeatureClass, outFeatureClass, StreetLength_LotArea, SizeField, referenceFeatureClassCentroid)
+    directWebMercator = core.optionalParameter(5, False)  # Project only the centroid and write output in one pass
+    anchorCoordinate = core.parseAnchorCoordinate(core.optionalParameter(6, None, True))  # optional explicit X Y
+    sizeTolerance = core.optionalParameter(7, 0)  # Snap sizes to this step so more features share a template
+    slimOutput = core.optionalParameter(8, False)  # Key-only geometry plus a separate attribute table
+    joinView = core.optionalParameter(9, False)  # Save a layer file joining the slim output to its attributes
+    intermediateMode = core.optionalParameter(10, "MEMORY", True)  # MEMORY, SCRATCH, or OUTPUT
+    spillThreshold = core.optionalParameter(11, core.memorySpillRows)  # Rows kept in memory before spilling
+    bulkLoad = core.optionalParameter(12, False)  # Defer spatial index maintenance until all rows are inserted
+    gridLayout = core.optionalParameter(13, False)  # Pack features into a grid instead of stacking them
+    gridGap = core.optionalParameter(14, 0)  # Space between packed features, in input units
+    incremental = core.optionalParameter(15, False)  # Only rebuild rows changed since the last run
+    workers = core.optionalParameter(16, 1)  # Worker processes building OID ranges of the input
+    do_analysis(inFeatureClass, outFeatureClass, StreetLength_LotArea, SizeField, referenceFeatureClassCentroid,
+                directWebMercator, anchorCoordinate, sizeTolerance, slimOutput, joinView,
+                intermediateMode, spillThreshold, bulkLoad, gridLayout, gridGap, incremental, workers)
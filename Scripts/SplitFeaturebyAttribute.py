@@ -27,6 +27,8 @@
 import arcpy
 import os
 import numpy
+from collections import OrderedDict
+import CEAssociationsCore as core
 
 
 
@@ -194,9 +196,101 @@ def constructSQLEqualityQuery(fieldName, value, dataSource, equalityOperator="="
             return "{0} {1} {2}".format(arcpy.AddFieldDelimiters(dataSource, fieldName), equalityOperator, str(value))
 
 
+def unique_table_name(value, outWorkSpace, usedNames):
+    """Return a valid feature class name for a target field value that no earlier value of the run was given.
+    Values that validate to the same name (such as "A-B" and "A_B") get a numeric suffix, so each value is
+    written to its own output. usedNames holds the lower case names given so far and is updated."""
+    baseName = arcpy.ValidateTableName(value, outWorkSpace)
+    name, suffix = baseName, 0
+    while name.lower() in usedNames:
+        suffix += 1
+        name = arcpy.ValidateTableName("{0}_{1}".format(baseName, suffix), outWorkSpace)
+    usedNames.add(name.lower())
+    return name
+
+
+def bulk_split(inFeatureClass, outWorkSpace, explodeID, insertTimer, chunkSize=50000, maxOpenCursors=32):
+    """Split a feature class in a single read of the input, routing each feature to the insert cursor of the
+    output for its target field value.
+
+    The input is read in chunks of chunkSize rows, and the rows of each chunk are grouped by output before they
+    are inserted, so each output's cursor is used once per chunk. At most maxOpenCursors insert cursors are open at
+    a time; the least recently used one is closed when another output needs a cursor. Each output is created from
+    the input schema with its spatial index removed, and the index is rebuilt once per output after every feature
+    is loaded, instead of being maintained on every insert.
+
+    Parameters
+    ----------
+    inFeatureClass : str
+        Path to the input feature class to split.
+    outWorkSpace : str
+        Path to the output workspace for result feature classes.
+    explodeID : str
+        Name of the field whose unique values define the split.
+    insertTimer : CEAssociationsCore.InsertTimer
+        Timer the read and insert loop is added to.
+    chunkSize : int, optional
+        Input rows held in memory at once (default 50000).
+    maxOpenCursors : int, optional
+        Largest number of insert cursors, and output locks, held at once (default 32).
+
+    Returns
+    -------
+    list
+        Paths of the feature classes written.
+    """
+    desc = arcpy.Describe(inFeatureClass)
+    fieldNames = core.attributeFields(inFeatureClass)
+    insertFields = ["SHAPE@"] + fieldNames
+    lowerNames = [name.lower() for name in insertFields]
+    if explodeID.lower() in lowerNames:
+        valueIndex, searchFields = lowerNames.index(explodeID.lower()), insertFields
+    else:
+        valueIndex, searchFields = len(insertFields), insertFields + [explodeID]
+    insertWidth = len(insertFields)
+    outputs = {}  # Target field value as text: [output path, spatial index deferred]
+    cursors = OrderedDict()  # Open insert cursors by target field value, least recently used first
+    usedNames = set()
+    rows = 0
+    insertTimer.start()
+    try:
+        with arcpy.da.SearchCursor(inFeatureClass, searchFields) as searchCursor:
+            for records in core.iterChunks(searchCursor, chunkSize):
+                groups = OrderedDict()
+                for row in records:
+                    groups.setdefault(str(row[valueIndex]), []).append(row[:insertWidth])
+                for value, groupRows in groups.items():
+                    if value not in outputs:
+                        outName = unique_table_name(value, outWorkSpace, usedNames)
+                        outExplodeFC = os.path.join(outWorkSpace, outName)
+                        arcpy.CreateFeatureclass_management(outWorkSpace, outName, desc.shapeType.upper(),
+                                                            inFeatureClass, "SAME_AS_TEMPLATE", "SAME_AS_TEMPLATE",
+                                                            desc.spatialReference)
+                        outputs[value] = [outExplodeFC, core.deferSpatialIndex(outExplodeFC)]
+                        arc_print("Created feature class {0} for unique ID: {1}.".format(outName, value), True)
+                    cursor = cursors.pop(value, None)
+                    if cursor is None:
+                        if len(cursors) >= maxOpenCursors:
+                            cursors.popitem(last=False)  # Dropping the cursor releases its lock
+                        cursor = arcpy.da.InsertCursor(outputs[value][0], insertFields)
+                    cursors[value] = cursor
+                    for row in groupRows:
+                        cursor.insertRow(row)
+                    rows += len(groupRows)
+    finally:
+        # Release the insert cursors, and their locks, before the spatial indexes are rebuilt.
+        cursor = None
+        cursors.clear()
+    insertTimer.stop(rows)
+    for outExplodeFC, deferred in outputs.values():
+        if deferred:
+            core.rebuildSpatialIndex(outExplodeFC)
+    return sorted(output[0] for output in outputs.values())
+
+
 # Main Function Definition
 @arcToolReport
-def do_analysis(inFeatureClass, outWorkSpace, explodeID, compactBool=True):
+def do_analysis(inFeatureClass, outWorkSpace, explodeID, compactBool=True, bulkLoad=False):
     """Split a feature class into multiple feature classes, one per unique value of a target field.
 
     A temporary text field (ExplodeID) is added to the input, populated with the string
@@ -213,6 +307,9 @@ def do_analysis(inFeatureClass, outWorkSpace, explodeID, compactBool=True):
         Name of the field whose unique values define the split.
     compactBool : bool, optional
         If True, compact the output workspace after splitting (default True).
+    bulkLoad : bool, optional
+        If True, read the input once with bulk_split instead of running one selection per unique value. The
+        input is not modified and the spatial index of each output is built once (default False).
     """
     try:
         if arcpy.Exists(outWorkSpace):
@@ -220,6 +317,17 @@ def do_analysis(inFeatureClass, outWorkSpace, explodeID, compactBool=True):
             arcpy.env.overwriteOutput = True
             arc_print("The current work space is: {0}.".format(outWorkSpace), True)
             workSpaceTail = os.path.split(outWorkSpace)[1]
+            insertTimer = core.InsertTimer()
+            if bulkLoad:
+                arc_print("Bulk loading: reading the input once and routing each feature to its output.", True)
+                written = bulk_split(inFeatureClass, outWorkSpace, explodeID, insertTimer)
+                arc_print("Created {0} feature classes in {1}.".format(str(len(written)), workSpaceTail), True)
+                arc_print(insertTimer.report(), True)
+                if compactBool:
+                    arc_print("Compacting workspace.", True)
+                    arcpy.Compact_management(outWorkSpace)
+                arc_print("Tool execution complete.", True)
+                return
             newExplodeField = arcpy.ValidateFieldName("ExplodeID", outWorkSpace)
             arc_print("Adding a text explode ID to cast the target field as text.", True)
             add_new_field(inFeatureClass, newExplodeField, "TEXT")
@@ -231,6 +339,7 @@ def do_analysis(inFeatureClass, outWorkSpace, explodeID, compactBool=True):
             arc_print(
                     "Using explode field's unique values to generate new feature classes in {0}.".format(
                             str(workSpaceTail)))
+            insertTimer.start()
             for newFeatureClassName in explodeList:
                 try:
                     arc_print("Determining name and constructing query for new feature class.", True)
@@ -247,6 +356,8 @@ def do_analysis(inFeatureClass, outWorkSpace, explodeID, compactBool=True):
                             "The unique value ID {0}, could not be extracted. Check arguments of tool.".format(
                                     str(newFCName)))
                     pass
+            insertTimer.stop(core.rowCount(inFeatureClass))
+            arc_print(insertTimer.report(), True)
             if compactBool:
                 arc_print("Compacting workspace.", True)
                 arcpy.Compact_management(outWorkSpace)
@@ -268,4 +379,6 @@ if __name__ == "__main__":
     outWorkSpace = arcpy.GetParameterAsText(1)
     uniqueField = arcpy.GetParameterAsText(2)
     compactWorkspace = arcpy.GetParameter(3)
-    do_analysis(inFeatureClass, outWorkSpace, uniqueField, compactWorkspace)
+    # Parameter 4 is the derived output workspace of the toolbox, so the script arguments start at 5.
+    bulkLoad = core.optionalParameter(5, False)  # Read the input once and defer spatial index maintenance
+    do_analysis(inFeatureClass, outWorkSpace, uniqueField, compactWorkspace, bulkLoad)